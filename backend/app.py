@@ -1,6 +1,6 @@
 import os
-import io
 import json
+import atexit
 import logging
 import base64
 import sys
@@ -9,19 +9,45 @@ import subprocess
 import re
 import datetime
 import urllib.parse
-
-# Gemini and Flask
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold, GenerateContentResponse
-from flask import Flask, request, jsonify, Response, stream_with_context
+import time
+import math
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Flask
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 
-# Environment, Media, Audio
+# Environment
 from dotenv import load_dotenv
-from PIL import Image, UnidentifiedImageError
-import sounddevice as sd
-import vosk
-import numpy as np
+
+# Local modules
+from command_router import CommandRouter
+from name_index import NameIndex
+from response_cache import ResponseCache, make_cache_key
+from notes_store import NotesStore
+from registry_store import JournaledStore
+from context_builder import ContextBuilder, estimate_tokens, truncate_to_tokens
+import clipboard_pipeline
+import stream_protocol
+from stream_protocol import StreamEvent
+from session_store import SessionStore
+from single_flight import SingleFlight
+from local_answers import default_local_answers
+from gemini_client import GeminiClient, CircuitBreaker, PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_BACKGROUND
+from warmup import Warmup, lazy_import
+import metrics
+
+# Gemini, Media, Audio: slow to import, so loaded on first use (normally by the warm-up threads)
+genai = lazy_import("google.generativeai")
+PIL = lazy_import("PIL")
+sd = lazy_import("sounddevice")
+vosk = lazy_import("vosk")
+np = lazy_import("numpy")
+audio_frontend = lazy_import("audio_frontend")
+audio_capture = lazy_import("audio_capture")
+image_prep = lazy_import("image_prep")
 
 # --- Configuration ---
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -33,11 +59,77 @@ SYSTEM_PROMPT = "You are Zenith, a helpful and friendly desktop AI assistant. Re
 
 # --- File Paths & Data Storage ---
 BASE_DIR = os.path.dirname(__file__)
-KNOWN_APPS_FILE = os.path.join(BASE_DIR, "known_apps.json")
-KNOWN_WEBSITES_FILE = os.path.join(BASE_DIR, "known_websites.json")
-NOTES_FILE = os.path.join(BASE_DIR, "notes.txt")
+DATA_DIR = os.getenv("ZENITH_DATA_DIR", BASE_DIR) # Registries, notes and cache files (e.g. a scratch directory for benchmarks)
+KNOWN_APPS_FILE = os.path.join(DATA_DIR, "known_apps.json")
+KNOWN_WEBSITES_FILE = os.path.join(DATA_DIR, "known_websites.json")
+NOTES_FILE = os.path.join(DATA_DIR, "notes.txt")
+NOTES_DB_FILE = os.path.join(DATA_DIR, os.getenv("ZENITH_NOTES_DB", "notes.db")) # Search index over notes.txt; rebuilt if deleted
+NOTES_FSYNC = os.getenv("ZENITH_NOTES_FSYNC", "1") != "0" # fsync notes.txt after each batch of notes
+NOTE_SEARCH_RESULTS = 5  # notes listed in a chat answer to "what did I note about ..."
+NOTES_PAGE_MAX = 100     # max page size of /notes/search
 known_apps = {}
 known_websites = {}
+name_index = NameIndex() # Fuzzy lookup over known_apps/known_websites; keep in sync when they change
+
+# --- Gemini Client Settings ---
+GEMINI_MAX_CONCURRENT = int(os.getenv("ZENITH_GEMINI_MAX_CONCURRENT", "8")) # upstream calls at once; the rest queue by priority
+GEMINI_QUEUE_TIMEOUT = 30.0 # seconds a call waits for a slot before failing
+GEMINI_CALL_TIMEOUT = float(os.getenv("ZENITH_GEMINI_TIMEOUT", "60")) # seconds, whole call
+GEMINI_FIRST_CHUNK_TIMEOUT = float(os.getenv("ZENITH_GEMINI_FIRST_CHUNK_TIMEOUT", "20")) # seconds until a stream's first text, retries included
+GEMINI_RETRIES = int(os.getenv("ZENITH_GEMINI_RETRIES", "2")) # retries of transient errors (before any text was sent)
+GEMINI_HEDGE_AFTER = int(os.getenv("ZENITH_GEMINI_HEDGE_MS", "0")) / 1000 # send a second identical request if the first is this slow; 0 = never
+GEMINI_BREAKER_FAILURES = 5    # consecutive transient failures that open the circuit breaker
+GEMINI_BREAKER_RESET = 30.0    # seconds of failing fast before trying Gemini again
+
+# --- Voice Capture Settings ---
+LISTEN_MAX_DURATION = 8.0       # seconds, hard cap for a single utterance
+LISTEN_NO_SPEECH_TIMEOUT = 4.0  # seconds to wait for the user to start talking
+LISTEN_SILENCE_TIMEOUT = 0.8    # seconds of trailing silence that ends the utterance
+LISTEN_BLOCK_MS = 100           # audio block size fed to the recognizer
+VAD_ENERGY_THRESHOLD = 400      # int16 RMS above which a block counts as speech
+LISTEN_PREROLL = 0.5            # seconds of audio from before the request to decode (catches first syllables)
+CAPTURE_BUFFER_SECONDS = 10.0   # ring buffer size of the persistent capture stream
+CAPTURE_IDLE_TIMEOUT = float(os.getenv("ZENITH_MIC_IDLE_TIMEOUT", "600")) # release the mic after this long unused
+RECOGNIZER_POOL_SIZE = 2
+
+# --- Conversation Context Settings ---
+HISTORY_TOKEN_BUDGET = int(os.getenv("ZENITH_HISTORY_TOKEN_BUDGET", "2000")) # estimated tokens of history sent per request
+HISTORY_SUMMARY_TOKENS = 300 # part of the budget kept for the summary of turns that no longer fit
+HISTORY_SUMMARIES = os.getenv("ZENITH_HISTORY_SUMMARIES", "1") != "0" # summarize dropped turns (extra background Gemini calls)
+SUMMARY_INPUT_MESSAGE_TOKENS = 500 # per-message cap when feeding dropped turns to the summarizer
+MAX_CONVERSATION_SESSIONS = int(os.getenv("ZENITH_MAX_SESSIONS", "64")) # server-side copies of chat histories (LRU)
+SESSION_MAX_MESSAGES = 200 # messages kept per session; older ones are only covered by the summary
+
+# --- Clipboard Analysis Settings ---
+CLIPBOARD_MAP_REDUCE_TOKENS = int(os.getenv("ZENITH_CLIPBOARD_MAP_REDUCE_TOKENS", "6000")) # larger texts are summarized in chunks first
+CLIPBOARD_CHUNK_TOKENS = 3000 # target chunk size for the map stage
+CLIPBOARD_MAX_CHUNKS = 24     # chunks grow beyond the target size rather than exceed this count
+CLIPBOARD_MAP_WORKERS = int(os.getenv("ZENITH_CLIPBOARD_WORKERS", "4")) # concurrent chunk summaries, shared by all requests
+
+# --- Batch Settings ---
+BATCH_MAX_ITEMS = 20 # queries per /batch request
+BATCH_WORKERS = int(os.getenv("ZENITH_BATCH_WORKERS", "4")) # /batch queries answered at once, shared by all requests
+
+# --- Streaming Settings ---
+# Framed (NDJSON/SSE) streams batch answer text up to this many characters or milliseconds; 0 chars = no batching
+STREAM_COALESCE_CHARS = int(os.getenv("ZENITH_STREAM_COALESCE_CHARS", "200"))
+STREAM_COALESCE_DELAY = int(os.getenv("ZENITH_STREAM_COALESCE_MS", "50")) / 1000
+SINGLE_FLIGHT = os.getenv("ZENITH_SINGLE_FLIGHT", "1") != "0" # identical concurrent requests share one Gemini stream
+
+# --- Response Cache Settings ---
+RESPONSE_CACHE_SIZE = int(os.getenv("ZENITH_RESPONSE_CACHE_SIZE", "256"))  # answers kept in memory
+RESPONSE_CACHE_TTL = int(os.getenv("ZENITH_RESPONSE_CACHE_TTL", "3600"))   # seconds
+RESPONSE_CACHE_DB = os.getenv("ZENITH_RESPONSE_CACHE_DB")                   # SQLite file name; unset = memory only
+
+# --- Image Analysis Settings ---
+IMAGE_MAX_EDGE = int(os.getenv("ZENITH_IMAGE_MAX_EDGE", "1024"))  # longest edge sent to Gemini, in pixels
+IMAGE_JPEG_QUALITY = 85
+IMAGE_HASH_DISTANCE = 6 # max differing dHash bits for two frames to share a cached answer
+
+# --- Startup Settings ---
+# "background": serve at once and load Gemini/Vosk on background threads; "eager": load before serving
+STARTUP_MODE = os.getenv("ZENITH_STARTUP_MODE", "background")
+WARMUP_WAIT_TIMEOUT = 30.0 # seconds a request waits for a component that is still loading
 
 # --- Site Search Templates ---
 SITE_SEARCH_TEMPLATES = {
@@ -50,6 +142,11 @@ SITE_SEARCH_TEMPLATES = {
     "github": "https://github.com/search?q={query}",
     "stack overflow": "https://stackoverflow.com/search?q={query}"
 }
+# Compiled once; call command_router.rebuild(SITE_SEARCH_TEMPLATES) if the templates change
+command_router = CommandRouter(SITE_SEARCH_TEMPLATES)
+# Questions answered on the spot after the router, without Gemini: time/date, time zones, math, units, "what apps do you know"
+LOCAL_ANSWERS = os.getenv("ZENITH_LOCAL_ANSWERS", "1") != "0"
+local_answers = default_local_answers(lambda: (known_apps, known_websites))
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s-%(levelname)s-%(message)s')
@@ -58,48 +155,38 @@ logger = logging.getLogger(__name__)
 # --- Essential Pre-checks ---
 if not API_KEY:
     logger.critical("CRITICAL: GEMINI_API_KEY not found in .env file.")
-    sys.exit("Exiting: API Key missing.")
+    # The server refuses to start without it (see __main__); importing the module (benchmarks) still works
 if not os.path.exists(VOSK_MODEL_PATH):
     logger.error(f"CRITICAL: Vosk model not found at expected path: {VOSK_MODEL_PATH}")
     # Allow startup but log the error prominently
     # sys.exit("Exiting: Vosk model missing.")
 
-# --- Load/Save Utilities ---
-def load_json_data(filepath, default={}):
-    """Loads data from a JSON file, ensuring lowercase keys."""
-    try:
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return {str(k).lower(): v for k, v in data.items()} # Ensure key is string
-        else:
-            logger.info(f"{os.path.basename(filepath)} not found. Creating.")
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(default, f)
-            return default
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON Decode Error loading {os.path.basename(filepath)}: {e}", exc_info=True)
-        return default
-    except Exception as e:
-        logger.error(f"Error loading {os.path.basename(filepath)}: {e}", exc_info=True)
-        return default
-
-def save_json_data(filepath, data):
-    """Saves data to a JSON file with lowercase keys."""
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump({str(k).lower(): v for k, v in data.items()}, f, indent=4)
-        logger.info(f"Saved data to {os.path.basename(filepath)}.")
-    except Exception as e:
-        logger.error(f"Error saving {os.path.basename(filepath)}: {e}", exc_info=True)
+# --- Registry Persistence ---
+# known_apps/known_websites: JSON snapshot + append-only journal, written in the background
+apps_store = JournaledStore(KNOWN_APPS_FILE)
+websites_store = JournaledStore(KNOWN_WEBSITES_FILE)
+atexit.register(apps_store.close)
+atexit.register(websites_store.close)
 
 # --- Note Taking Utility ---
 def add_note(note_text):
+    """Saves a timestamped note to the notes file (and the notes search index)."""
+    if warmup.wait('notes', WARMUP_WAIT_TIMEOUT):
+        with metrics.timed(PERSISTENCE_SECONDS, 'note_save', store='notes', op='add'):
+            saved = notes_store.add(note_text)
+        if not saved:
+            logger.error("Notes store failed to save the note.")
+            return False
+        logger.info(f"Note added: {note_text[:50]}...")
+        return True
+    return append_note_to_file(note_text) # Index unavailable: plain append, indexed on next start
+
+def append_note_to_file(note_text):
     """Appends a timestamped note to the notes file."""
     try:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         # Use 'a' mode which creates the file if it doesn't exist
-        with open(NOTES_FILE, 'a', encoding='utf-8') as f:
+        with metrics.timed(PERSISTENCE_SECONDS, 'note_save', store='notes', op='append'), open(NOTES_FILE, 'a', encoding='utf-8') as f:
             f.write(f"[{timestamp}] {note_text.strip()}\n")
         logger.info(f"Note added: {note_text[:50]}...")
         return True
@@ -110,14 +197,77 @@ def add_note(note_text):
         logger.error(f"Unexpected error writing notes: {e}", exc_info=True)
         return False
 
+# --- Response Cache Setup ---
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    db_path=os.path.join(DATA_DIR, RESPONSE_CACHE_DB) if RESPONSE_CACHE_DB else None
+)
+
+image_hash_index = None # Created by the imaging warm-up (needs PIL)
+
+in_flight = SingleFlight() # Gemini streams shared by identical concurrent requests
+
+clipboard_executor = ThreadPoolExecutor(max_workers=CLIPBOARD_MAP_WORKERS, thread_name_prefix="clipboard-map")
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+# App launches and browser opens run one at a time on this thread, whichever request or batch item asks for them
+launcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="launcher")
+
+# --- Metrics ---
+# Exposed at /metrics; send "X-Zenith-Profile: 1" to get a Server-Timing breakdown of a request's stages
+HTTP_REQUESTS = metrics.registry.counter('zenith_http_requests_total', "HTTP requests by route and status.", ('route', 'status'))
+HTTP_SECONDS = metrics.registry.histogram('zenith_http_request_seconds', "Time until the response starts (streams continue after).", ('route',))
+STAGE_SECONDS = metrics.registry.histogram('zenith_stage_seconds', "Time spent in request preparation stages.", ('stage',))
+COMMAND_ROUTES = metrics.registry.counter('zenith_command_routes_total', "Queries by command router outcome ('none' = not a command).", ('kind',))
+LOCAL_ANSWER_COUNT = metrics.registry.counter('zenith_local_answers_total', "Queries answered locally instead of by Gemini, by intent.", ('intent',))
+APP_LAUNCH_SECONDS = metrics.registry.histogram('zenith_app_launch_seconds', "Time to start a known application.", ('outcome',))
+BATCH_ITEMS = metrics.registry.counter('zenith_batch_items_total', "/batch queries by result status.", ('status',))
+GEMINI_TTFT_SECONDS = metrics.registry.histogram('zenith_gemini_ttft_seconds', "Time from starting a Gemini job to its first text.", ('kind',))
+GEMINI_STREAM_SECONDS = metrics.registry.histogram('zenith_gemini_stream_seconds', "Duration of Gemini streams.", ('kind',))
+GEMINI_STREAMS = metrics.registry.counter('zenith_gemini_streams_total', "Gemini streams by outcome.", ('kind', 'outcome'))
+SPEECH_RTF = metrics.registry.histogram('zenith_speech_decode_rtf', "Vosk decode time divided by audio duration (real-time factor).",
+                                        buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0))
+SPEECH_SECONDS = metrics.registry.histogram('zenith_speech_utterance_seconds', "Time from listen request to final transcript.")
+PERSISTENCE_SECONDS = metrics.registry.histogram('zenith_persistence_seconds', "Time spent writing or querying persisted data.", ('store', 'op'))
+metrics.registry.callback('zenith_response_cache_lookups_total', "Response cache lookups by result.", 'counter',
+                          lambda: {"hit": response_cache.hits, "miss": response_cache.misses}, labelname='result')
+metrics.registry.callback('zenith_context_tokens_saved_total', "Estimated history tokens not sent thanks to context packing.", 'counter',
+                          lambda: context_builder.tokens_saved)
+metrics.registry.callback('zenith_gemini_shared_streams_total', "Gemini streams started, and identical requests that joined one instead.", 'counter',
+                          lambda: {"started": in_flight.started, "joined": in_flight.joined}, labelname='role')
+
+def stage(name):
+    """Times a request preparation stage (metrics and, when profiling, the Server-Timing header)."""
+    return metrics.timed(STAGE_SECONDS, name, stage=name)
+
 # --- Flask App Setup ---
 app = Flask(__name__)
 CORS(app, origins=["null", "file://"], supports_credentials=True)
 logger.info("Flask app initialized with CORS.")
 
+@app.before_request
+def start_request_metrics():
+    g.request_started_at = time.perf_counter()
+    g.profile_token = metrics.start_profile() if metrics.profile_requested(request.headers) else None
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started_at
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(route=route, status=str(response.status_code))
+    HTTP_SECONDS.observe(elapsed, route=route)
+    if g.profile_token is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(metrics.finish_profile(g.profile_token), elapsed)
+    return response
+
 # --- Gemini AI Setup ---
 gemini_model = None
-try:
+
+def init_gemini():
+    global gemini_model
+    if not API_KEY:
+        raise RuntimeError("GEMINI_API_KEY not set. AI features disabled.")
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
     genai.configure(api_key=API_KEY)
     gemini_model = genai.GenerativeModel(
         'gemini-2.0-flash',
@@ -129,32 +279,113 @@ try:
         }
     )
     logger.info("Gemini model 'gemini-2.0-flash' initialized successfully.")
-except Exception as e:
-    logger.error(f"Fatal error initializing Gemini: {e}", exc_info=True)
-    # Application might not function correctly without the model. Consider how to handle this.
+
+# Retries, deadlines, hedging, circuit breaker and priority queue around every Gemini call
+gemini_client = GeminiClient(
+    lambda: gemini_model,
+    max_concurrent=GEMINI_MAX_CONCURRENT,
+    queue_timeout=GEMINI_QUEUE_TIMEOUT,
+    call_timeout=GEMINI_CALL_TIMEOUT,
+    first_chunk_timeout=GEMINI_FIRST_CHUNK_TIMEOUT,
+    retries=GEMINI_RETRIES,
+    hedge_after=GEMINI_HEDGE_AFTER,
+    breaker=CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET)
+)
 
 # --- Vosk STT Setup ---
 vosk_model = None
 samplerate = None
-try:
-    if os.path.exists(VOSK_MODEL_PATH):
-        vosk_model = vosk.Model(VOSK_MODEL_PATH)
-        samplerate = 16000 # Default
-        try:
-            device_info = sd.query_devices(kind='input')
-            # Ensure device_info is a dict and has the key
-            if isinstance(device_info, dict) and 'default_samplerate' in device_info:
-                samplerate = int(device_info['default_samplerate'])
-            else:
-                logger.warning(f"Could not get default samplerate from device info: {device_info}. Using {samplerate} Hz.")
-        except Exception as sd_err:
-            logger.warning(f"Sounddevice query failed: {sd_err}. Using {samplerate} Hz.")
-        logger.info(f"Vosk model loaded. Samplerate: {samplerate} Hz")
-    else:
-        logger.warning("Vosk model file path does not exist. Voice input disabled.")
-except Exception as e:
-    logger.error(f"Error initializing Vosk: {e}", exc_info=True)
-    vosk_model = None # Ensure it's None if init fails
+capture_service = None
+recognizer_pool = None
+
+def init_vosk():
+    global vosk_model, samplerate, capture_service, recognizer_pool
+    if not os.path.exists(VOSK_MODEL_PATH):
+        raise FileNotFoundError(f"Vosk model not found at {VOSK_MODEL_PATH}. Voice input disabled.")
+    model = vosk.Model(VOSK_MODEL_PATH)
+    rate = 16000 # Default
+    try:
+        device_info = sd.query_devices(kind='input')
+        # Ensure device_info is a dict and has the key
+        if isinstance(device_info, dict) and 'default_samplerate' in device_info:
+            rate = int(device_info['default_samplerate'])
+        else:
+            logger.warning(f"Could not get default samplerate from device info: {device_info}. Using {rate} Hz.")
+    except Exception as sd_err:
+        logger.warning(f"Sounddevice query failed: {sd_err}. Using {rate} Hz.")
+    logger.info(f"Vosk model loaded. Capture samplerate: {rate} Hz, decoding at {audio_frontend.MODEL_SAMPLERATE} Hz")
+    recognizer_pool = audio_capture.RecognizerPool(model, audio_frontend.MODEL_SAMPLERATE, size=RECOGNIZER_POOL_SIZE)
+    capture_service = audio_capture.CaptureService(rate, buffer_seconds=CAPTURE_BUFFER_SECONDS, idle_timeout=CAPTURE_IDLE_TIMEOUT)
+    vosk_model, samplerate = model, rate # Published last: /listen checks vosk_model
+    if os.getenv("ZENITH_MIC_PREWARM") == "1": # Open the microphone now so even the first request has pre-roll
+        try: capture_service.start()
+        except Exception as cap_err: logger.warning(f"Could not pre-start audio capture: {cap_err}")
+
+# --- Notes Store Setup ---
+notes_store = None
+
+def init_notes():
+    global notes_store
+    notes_store = NotesStore(NOTES_FILE, NOTES_DB_FILE, fsync=NOTES_FSYNC) # Indexes notes added since the last run
+
+# --- Image Analysis Setup ---
+def init_imaging():
+    global image_hash_index
+    image_hash_index = image_prep.PerceptualHashIndex(max_distance=IMAGE_HASH_DISTANCE)
+
+# --- Warm-up ---
+# Slow components load on background threads once the server starts (see start_warmup)
+warmup = Warmup()
+warmup.register('gemini', init_gemini)
+warmup.register('vosk', init_vosk)
+warmup.register('imaging', init_imaging)
+warmup.register('notes', init_notes)
+
+def gemini_available():
+    """True once the Gemini model is set up; waits for it while it is still warming up."""
+    return warmup.wait('gemini', WARMUP_WAIT_TIMEOUT) and gemini_model is not None
+
+def voice_available():
+    return warmup.wait('vosk', WARMUP_WAIT_TIMEOUT) and capture_service is not None
+
+
+# --- Conversation Context ---
+def summarize_history(previous_summary, messages):
+    """Summarizes dropped chat turns (on top of the previous summary) with Gemini. Runs on a background thread."""
+    if not gemini_available():
+        return None
+    transcript = "\n".join(f"{'User' if role == 'user' else 'Zenith'}: {truncate_to_tokens(text, SUMMARY_INPUT_MESSAGE_TOKENS)}"
+                           for role, text in messages)
+    earlier = f"Summary so far:\n{previous_summary}\n\n" if previous_summary else ""
+    prompt = (f"{earlier}Conversation to add:\n{transcript}\n\n"
+              f"Write a concise summary (under {HISTORY_SUMMARY_TOKENS * 3 // 4} words) of the conversation between the user and "
+              "the assistant Zenith, merging it with the summary so far. Keep names, numbers, decisions and open questions.")
+    return gemini_client.generate(prompt, PRIORITY_BACKGROUND).text
+
+context_builder = ContextBuilder(
+    budget_tokens=HISTORY_TOKEN_BUDGET,
+    summary_tokens=HISTORY_SUMMARY_TOKENS,
+    summarize=summarize_history if HISTORY_SUMMARIES else None
+)
+session_store = SessionStore(max_sessions=MAX_CONVERSATION_SESSIONS, max_messages=SESSION_MAX_MESSAGES)
+
+def resolve_history(data):
+    """Chat history for a request. With a conversation_id, the request's history is applied to the
+       server-side session (see session_store). Returns None if the session cannot take a delta.
+    """
+    chat_history = data.get('history', [])
+    conversation_id = data.get('conversation_id')
+    if not conversation_id:
+        return chat_history # Stateless client: history is the full context window
+    try:
+        offset = int(data.get('history_offset', 0))
+    except (TypeError, ValueError):
+        return None
+    return session_store.sync(str(conversation_id), offset, chat_history, delta=bool(data.get('history_delta')))
+
+def session_reset_response():
+    logger.info("Conversation session unknown or out of sync; asking the client for full history.")
+    return jsonify({"status": "session_reset", "error": "Conversation session expired. Resend the full history."}), 409
 
 
 # --- Helper Functions ---
@@ -164,6 +395,19 @@ def make_error_response(message, status_code, details=None):
         response_data["details"] = str(details)
     return jsonify(response_data), status_code
 
+def gemini_unavailable_response():
+    """503 response if Gemini is not set up or is failing (circuit breaker open), else None."""
+    if not gemini_available():
+        logger.error("Gemini model not initialized, cannot process query.")
+        return make_error_response("AI model unavailable", 503) # 503 Service Unavailable
+    retry_after = gemini_client.breaker.retry_after()
+    if retry_after:
+        logger.warning("Gemini circuit breaker open; rejecting request.")
+        response, status_code = make_error_response("AI service temporarily unavailable, please try again shortly.", 503)
+        response.headers["Retry-After"] = str(math.ceil(retry_after))
+        return response, status_code
+    return None
+
 def is_likely_url(text):
     text_lower = text.lower()
     # More robust check for domain.tld patterns + standard http/https/www
@@ -175,214 +419,559 @@ def is_likely_url(text):
     return False
 
 def format_history_for_gemini(chat_history):
-    """Formats the last N messages for Gemini context, handling roles."""
-    history_context = []
-    # Consider last CONTEXT_MESSAGE_COUNT messages (defined earlier)
-    recent_messages = chat_history[-(2 * 4):] # Example: Last 4 turns (8 messages)
-    for msg in recent_messages:
-        role = "user" if msg.get('sender') == 'user' else "model"
-        content = msg.get('content', '')
-        # Ensure content is not empty and is a string before adding
-        if isinstance(content, str) and content.strip():
-             # Simple text content expected by Gemini API history
-             history_context.append({'role': role, 'parts': [{'text': content}]})
-        # elif isinstance(content, list): # Future: Handle potential complex content types if needed
-        #      history_context.append({'role': role, 'parts': content}) # Assuming content is already formatted parts list
+    """Packs chat history into the token budget for Gemini context, handling roles."""
+    history_context, stats = context_builder.build(chat_history)
+    if stats.tokens_full > stats.tokens_sent:
+        logger.info(f"History: {stats.messages_sent}/{stats.messages_received} messages, ~{stats.tokens_sent} tokens "
+                    f"(saved ~{stats.tokens_full - stats.tokens_sent}, summary: {stats.summary})")
     return history_context
 
 
 # --- Internal Command Handling Logic ---
+def run_launch(fn, *args, **kwargs):
+    """Runs a side effect (starting a process, opening the browser) on the launcher thread and waits for it."""
+    return launcher.submit(fn, *args, **kwargs).result() # Exceptions are re-raised here
+
+def launch_known_app(app_key, display_name):
+    """Launches an app from known_apps. Stale paths are removed and the path is requested again."""
+    app_path = known_apps[app_key]
+    logger.info(f"   Attempting known app: '{app_key}' at '{app_path}'")
+    started_at, outcome = time.perf_counter(), 'error'
+    try:
+        run_launch(subprocess.Popen, [app_path]) # Non-blocking
+        outcome = 'ok'
+        return jsonify({"status": "handled", "response": f"Launching {display_name}."})
+    except FileNotFoundError:
+        outcome = 'not_found'
+        logger.error(f"   App path not found: {app_path}. Removing entry.")
+        apps_store.delete(app_key)
+        name_index.remove(app_key, 'app')
+        return jsonify({"status": "app_not_found", "app_name": display_name, "error_hint": "The saved path seems incorrect. Please provide it again."})
+    except PermissionError as e:
+        logger.error(f"   Permission denied launching {app_path}: {e}")
+        return make_error_response(f"Permission denied to launch {display_name}.", 403)
+    except Exception as e:
+        logger.error(f"   Failed to launch app {app_path}: {e}", exc_info=True)
+        return make_error_response(f"Sorry, couldn't launch {display_name}.", 500)
+    finally:
+        APP_LAUNCH_SECONDS.observe(time.perf_counter() - started_at, outcome=outcome)
+
+def open_known_website(site_key, display_name):
+    """Opens a website from known_websites in the default browser."""
+    logger.info(f"   Opening known website: '{site_key}'")
+    try:
+        run_launch(webbrowser.open, known_websites[site_key], new=2)
+        return jsonify({"status": "handled", "response": f"Opening {display_name}."})
+    except Exception as e:
+        logger.error(f"   Error opening known website {site_key}: {e}", exc_info=True)
+        return make_error_response("Error opening website", 500)
+
 def handle_internal_command(query):
     """Checks if the query matches an internal command and executes it.
        Returns a Flask JSON response if handled, otherwise None.
     """
-    query_lower = query.lower()
-    target = "" # Define target here for wider scope
+    route = command_router.route(query)
+    COMMAND_ROUTES.inc(kind=route.kind if route else 'none')
+    if route is None:
+        # If query didn't match any known command structure
+        return None
 
     # 1. Note/Remember Command
-    if query_lower.startswith(("note:", "remember:")):
-        prefix_len = 5 if query_lower.startswith("note:") else 9
-        note_content = query[prefix_len:].strip()
+    if route.kind == 'note':
+        note_content = route.target
         if not note_content: return make_error_response("Note cannot be empty.", 400)
         logger.info(f"CMD: 'note' content processing.")
         if add_note(note_content): return jsonify({"status": "handled", "response": "Okay, I've noted that down."})
         else: return make_error_response("Failed to save note. Please check file permissions.", 500)
 
-    # 2. Open/Search Commands (requires more complex logic)
-    elif query_lower.startswith(("open ", "search ", "google ", "find ")):
-        # Extract potential target/search query after the command word
+    # 2. Note Queries ("what did I note about X", "show my notes")
+    if route.kind == 'note_search':
+        logger.info(f"CMD: note search for '{route.target}'")
+        if not warmup.wait('notes', WARMUP_WAIT_TIMEOUT):
+            return make_error_response("Notes search is unavailable.", 503)
+        with metrics.timed(PERSISTENCE_SECONDS, 'note_search', store='notes', op='search'):
+            total, notes = notes_store.search(route.target, limit=NOTE_SEARCH_RESULTS)
+        if not notes:
+            answer = f"I couldn't find any notes about '{route.target}'." if route.target else "You haven't taken any notes yet."
+        else:
+            heading = f"Notes about '{route.target}'" if route.target else "Your most recent notes"
+            lines = [f"- **{note.created_at or 'undated'}**: {note.text}" for note in notes]
+            more = f"\n\n*({total - len(notes)} more not shown)*" if total > len(notes) else ""
+            answer = f"{heading}:\n" + "\n".join(lines) + more
+        return jsonify({"status": "handled", "response": answer})
+
+    # 3. Open/Search Commands
+    if route.kind == 'invalid':
+        return make_error_response("Please specify what to open or search for.", 400)
+
+    target = route.target
+    target_lower = target.lower()
+    logger.info(f"CMD: '{route.verb}' target: '{target}'")
+
+    # A. Specific Site Search Patterns (e.g., "search youtube cats")
+    if route.kind == 'site_search':
+        site_key, search_query = route.site, route.search_query
+        logger.info(f"-> Site Search Pattern Matched: Site='{site_key}', Query='{search_query}'")
         try:
-            first_space_index = query.find(" ")
-            if first_space_index == -1: # Should not happen if starts with "cmd " but check anyway
-                return make_error_response("Invalid command format.", 400)
-            target = query[first_space_index + 1:].strip()
-            if not target: return make_error_response("Please specify what to open or search for.", 400)
-        except Exception:
-            return make_error_response("Error parsing command.", 400)
-
-        target_lower = target.lower()
-        logger.info(f"CMD: '{query_lower.split()[0]}' target: '{target}'")
-
-        # A. Check for Specific Site Search Patterns (e.g., "search youtube cats")
-        for site_key, url_template in SITE_SEARCH_TEMPLATES.items():
-            patterns_to_check = [
-                f"open {site_key} ",
-                f"search {site_key} for ",
-                f"search {site_key} "
-            ]
-            if site_key == "google": # Allow just "google cats"
-                 patterns_to_check.append("google ")
-
-            for pattern in patterns_to_check:
-                 if query_lower.startswith(pattern):
-                    search_query = query[len(pattern):].strip()
-                    if search_query:
-                        logger.info(f"-> Site Search Pattern Matched: Site='{site_key}', Query='{search_query}'")
-                        try:
-                            encoded_query = urllib.parse.quote_plus(search_query)
-                            search_url = url_template.format(query=encoded_query)
-                            webbrowser.open(search_url, new=2)
-                            return jsonify({"status": "handled", "response": f"Searching {site_key} for '{search_query}'..."})
-                        except Exception as e:
-                            logger.error(f"Error performing site search on {site_key}: {e}", exc_info=True)
-                            return make_error_response(f"Error searching {site_key}", 500)
-                    else:
-                        # Allow opening base site, e.g. "open youtube"
-                         if query_lower == f"open {site_key}" and site_key in known_websites:
-                              try:
-                                   logger.info(f"-> Opening Known Site Base: '{site_key}'")
-                                   webbrowser.open(known_websites[site_key], new=2)
-                                   return jsonify({"status":"handled", "response": f"Opening {site_key}."})
-                              except Exception as e:
-                                   logger.error(f"Error opening known site {site_key}: {e}", exc_info=True)
-                                   return make_error_response("Error opening known website", 500)
-
-
-        # B. Handle General 'open' Commands (Apps, Sites, URLs) if not a site search
-        if query_lower.startswith("open "):
-            logger.info(f"-> Processing as general 'open' command...")
-            # Known Apps
-            if target_lower in known_apps:
-                app_path = known_apps[target_lower]
-                logger.info(f"   Attempting known app: '{target_lower}' at '{app_path}'")
-                try:
-                    subprocess.Popen([app_path]) # Non-blocking
-                    return jsonify({"status": "handled", "response": f"Launching {target}."})
-                except FileNotFoundError:
-                    logger.error(f"   App path not found: {app_path}. Removing entry.")
-                    if target_lower in known_apps: del known_apps[target_lower]
-                    save_json_data(KNOWN_APPS_FILE, known_apps)
-                    return jsonify({"status": "app_not_found", "app_name": target, "error_hint": "The saved path seems incorrect. Please provide it again."})
-                except PermissionError as e:
-                    logger.error(f"   Permission denied launching {app_path}: {e}")
-                    return make_error_response(f"Permission denied to launch {target}.", 403)
-                except Exception as e:
-                    logger.error(f"   Failed to launch app {app_path}: {e}", exc_info=True)
-                    return make_error_response(f"Sorry, couldn't launch {target}.", 500)
-            # Known Websites (Directly)
-            elif target_lower in known_websites:
-                logger.info(f"   Opening known website: '{target_lower}'")
-                try:
-                    webbrowser.open(known_websites[target_lower], new=2)
-                    return jsonify({"status": "handled", "response": f"Opening {target}."})
-                except Exception as e:
-                    logger.error(f"   Error opening known website {target_lower}: {e}", exc_info=True)
-                    return make_error_response("Error opening website", 500)
-            # General URL
-            elif is_likely_url(target):
-                logger.info(f"   Opening general URL: '{target}'")
-                try:
-                    url = target if target_lower.startswith("http") else "https://" + target
-                    webbrowser.open(url, new=2)
-                    return jsonify({"status": "handled", "response": f"Opening {target}."})
-                except Exception as e:
-                    logger.error(f"   Error opening general URL {target}: {e}", exc_info=True)
-                    return make_error_response("Error opening URL", 500)
-            # Unknown App
-            else:
-                logger.info(f"   App not found: '{target}'. Requesting path.")
-                return jsonify({"status": "app_not_found", "app_name": target})
-
-        # C. Handle generic web search ("search ...", "google ...") if no specific actions matched
-        elif query_lower.startswith(("search ", "google ", "find ", "look up ")):
-             # We already assigned `target` earlier if command word was found
-             logger.info(f"CMD: Generic web search for: '{target}'")
-             try:
-                 encoded_query = urllib.parse.quote_plus(target)
-                 search_url = SITE_SEARCH_TEMPLATES["google"].format(query=encoded_query) # Default to google
-                 webbrowser.open(search_url, new=2)
-                 return jsonify({"status": "handled", "response": f"Searching the web for '{target}'..."})
-             except Exception as e:
-                 logger.error(f"Error performing generic web search: {e}", exc_info=True)
-                 return make_error_response("Error performing web search", 500)
-
-
-    # If query didn't match any known command structure
+            encoded_query = urllib.parse.quote_plus(search_query)
+            search_url = SITE_SEARCH_TEMPLATES[site_key].format(query=encoded_query)
+            run_launch(webbrowser.open, search_url, new=2)
+            return jsonify({"status": "handled", "response": f"Searching {site_key} for '{search_query}'..."})
+        except Exception as e:
+            logger.error(f"Error performing site search on {site_key}: {e}", exc_info=True)
+            return make_error_response(f"Error searching {site_key}", 500)
+
+    # B. General 'open' Commands (Apps, Sites, URLs)
+    if route.kind == 'open':
+        logger.info(f"-> Processing as general 'open' command...")
+        # Known Apps
+        if target_lower in known_apps:
+            return launch_known_app(target_lower, target)
+        # Known Websites (Directly)
+        elif target_lower in known_websites:
+            return open_known_website(target_lower, target)
+        # General URL
+        elif is_likely_url(target):
+            logger.info(f"   Opening general URL: '{target}'")
+            try:
+                url = target if target_lower.startswith("http") else "https://" + target
+                run_launch(webbrowser.open, url, new=2)
+                return jsonify({"status": "handled", "response": f"Opening {target}."})
+            except Exception as e:
+                logger.error(f"   Error opening general URL {target}: {e}", exc_info=True)
+                return make_error_response("Error opening URL", 500)
+        # Fuzzy Match (typos, "note pad", partial names)
+        match = name_index.best(target)
+        if match:
+            logger.info(f"   Fuzzy match: '{target}' -> {match.kind} '{match.name}' (score {match.score})")
+            if match.kind == 'app':
+                return launch_known_app(match.name, match.name)
+            return open_known_website(match.name, match.name)
+        # Unknown App
+        logger.info(f"   App not found: '{target}'. Requesting path.")
+        not_found = {"status": "app_not_found", "app_name": target}
+        suggestions = [m.name for m in name_index.lookup(target, limit=3)]
+        if suggestions:
+            not_found["suggestions"] = suggestions
+        return jsonify(not_found)
+
+    # C. Generic web search ("search ...", "google ...", "find ...")
+    logger.info(f"CMD: Generic web search for: '{target}'")
+    try:
+        encoded_query = urllib.parse.quote_plus(target)
+        search_url = SITE_SEARCH_TEMPLATES["google"].format(query=encoded_query) # Default to google
+        run_launch(webbrowser.open, search_url, new=2)
+        return jsonify({"status": "handled", "response": f"Searching the web for '{target}'..."})
+    except Exception as e:
+        logger.error(f"Error performing generic web search: {e}", exc_info=True)
+        return make_error_response("Error performing web search", 500)
+
+
+# --- Gemini Streaming ---
+# A GeminiJob is one streamed generation, independent of the server (Flask or ASGI) that runs it.
+# kind: 'ask' | 'clipboard' | 'image'; prompt is the message text, or the prompt parts for images.
+# chunks: pieces of a large clipboard text to summarize first; the prompt is then built from their summaries.
+# stream_format: None (plain text) | 'ndjson' | 'sse', see stream_protocol; started_at: request arrival (perf_counter).
+GeminiJob = namedtuple('GeminiJob', ['kind', 'history', 'prompt', 'cache_key', 'use_cache', 'chunks', 'stream_format', 'started_at'],
+                       defaults=(None, None, None))
+
+# In-band stream error lines per job kind: (blocked by safety filter, generation failed)
+JOB_PRIORITIES = {'ask': PRIORITY_INTERACTIVE, 'image': PRIORITY_INTERACTIVE, 'clipboard': PRIORITY_BULK}
+
+GEMINI_STREAM_ERRORS = {
+    'ask': ("ERROR: Content blocked by safety filter ({reason})\n", "ERROR: An error occurred while contacting the AI: {error}\n"),
+    'clipboard': ("ERROR: Blocked({reason})\n", "ERROR: AI processing error\n"),
+    'image': ("ERROR: Content blocked by safety filter ({reason})\n", "ERROR: An error occurred during image analysis\n"),
+}
+STREAM_MIMETYPE = 'text/plain; charset=utf-8'
+
+def chunk_block_reason(chunk):
+    """Returns the safety block reason of a stream chunk, or None."""
+    # Check for block reason *before* accessing text; text is usually still available when blocked
+    if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+        return chunk.prompt_feedback.block_reason.name
     return None
 
+def job_contents(job):
+    """What a job sends to generate_content: the image prompt parts, or the chat history plus the user's message."""
+    if job.kind == 'image':
+        return job.prompt
+    return job.history + [{'role': 'user', 'parts': [{'text': job.prompt}]}]
 
-# --- API Endpoints ---
-@app.route('/')
-def index():
-    return "Zenith Assistant Backend v1.5"
+def generate_gemini_events(job):
+    """Streams a Gemini job as stream_protocol events."""
+    return observe_gemini_events(job.kind, gemini_job_events(job))
 
-@app.route('/ping')
-def ping():
-    # Basic check to see if the server is responsive
-    return jsonify({"status": "ok"})
+def observe_gemini_events(kind, events):
+    """Passes a job's events through, recording time to first text, duration and outcome."""
+    started_at, first_text, outcome = time.perf_counter(), True, 'disconnected'
+    try:
+        for event in events:
+            if event.type == 'delta' and first_text:
+                GEMINI_TTFT_SECONDS.observe(time.perf_counter() - started_at, kind=kind)
+                first_text = False
+            elif event.type in ('blocked', 'error'):
+                outcome = event.type
+            yield event
+        if outcome == 'disconnected':
+            outcome = 'ok'
+    finally:
+        events.close() # Stops the Gemini stream too if the client went away
+        GEMINI_STREAMS.inc(kind=kind, outcome=outcome)
+        GEMINI_STREAM_SECONDS.observe(time.perf_counter() - started_at, kind=kind)
+
+def gemini_job_events(job):
+    try:
+        if job.chunks:
+            summaries = None
+            for event, value in clipboard_pipeline.map_chunks(clipboard_executor, summarize_clipboard_chunk, job.chunks):
+                if event == 'progress':
+                    yield StreamEvent('progress', (value, len(job.chunks)))
+                else:
+                    summaries = value
+            if all(summary == clipboard_pipeline.FAILED_SUMMARY for summary in summaries):
+                yield StreamEvent('error', "no part of the text could be summarized")
+                return
+            job = job._replace(prompt=clipboard_pipeline.reduce_prompt(summaries, sum(len(chunk) for chunk in job.chunks)), chunks=None)
+        stream = gemini_client.stream(job_contents(job), JOB_PRIORITIES[job.kind])
+        usage = None
+        for chunk in stream:
+            reason = chunk_block_reason(chunk)
+            if reason:
+                logger.warning(f"Gemini content generation blocked ({job.kind}). Reason: {reason}")
+                yield StreamEvent('blocked', reason)
+                return # Stop generation if blocked
+            usage = stream_protocol.usage_event(getattr(chunk, 'usage_metadata', None)) or usage
+            if chunk.text:
+                yield StreamEvent('delta', chunk.text)
+                if chunk.text.endswith("\n\n"):
+                    yield StreamEvent('flush', None) # A finished markdown block; don't hold it back
+        if usage:
+            yield usage
+    except GeneratorExit:
+        logger.info(f"Client disconnected; stopped Gemini generation ({job.kind}).")
+        raise
+    except Exception as e:
+        logger.error(f"Error during Gemini streaming generation ({job.kind}): {e}", exc_info=True)
+        yield StreamEvent('error', str(e))
 
-@app.route('/ask_stream', methods=['POST'])
-def ask_stream():
-    data = request.get_json()
+def shared_gemini_events(job):
+    """A job's events, shared with identical requests streaming at the same time (see single_flight).
+       The answer is stored in the cache once, by the stream itself, if the job that started it uses the cache.
+    """
+    def start():
+        events = generate_gemini_events(job)
+        return response_cache.record_events(job.cache_key, events) if job.use_cache else events
+    return in_flight.follow(job.cache_key, start) if SINGLE_FLIGHT else start()
+
+def summarize_clipboard_chunk(prompt):
+    """Map step of the clipboard pipeline: one non-streamed summary, or None if it failed."""
+    try:
+        response = gemini_client.generate(prompt, PRIORITY_BULK)
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            logger.warning(f"Clipboard chunk summary blocked. Reason: {response.prompt_feedback.block_reason.name}")
+            return None
+        return response.text
+    except Exception as e:
+        logger.error(f"Error summarizing clipboard chunk: {e}")
+        return None
+
+def framed_stream_response(body, stream_format, cache_status):
+    """Response for an NDJSON/SSE body from stream_protocol.frame."""
+    headers = {"X-Zenith-Cache": cache_status, **(stream_protocol.SSE_HEADERS if stream_format == 'sse' else {})}
+    return Response(body, mimetype=stream_protocol.MIMETYPES[stream_format], headers=headers)
+
+def cached_stream_response(cache_key, use_cache, stream_format=None, started_at=None):
+    """Replays a cached answer as a streaming response, or returns None on a miss."""
+    cached_lines = response_cache.get(cache_key) if use_cache else None
+    if cached_lines is None:
+        return None
+    logger.info("Serving cached response.")
+    if stream_format:
+        events = stream_protocol.coalesce(stream_protocol.cached_events(cached_lines), STREAM_COALESCE_CHARS, STREAM_COALESCE_DELAY)
+        return framed_stream_response(stream_protocol.frame(events, stream_format, started_at, cache="hit"), stream_format, "hit")
+    return Response(response_cache.replay(cached_lines), mimetype=STREAM_MIMETYPE, headers={"X-Zenith-Cache": "hit"})
+
+def stream_gemini_response(job):
+    """Flask streaming response for a job; the answer is stored in the cache once it completes cleanly."""
+    events = shared_gemini_events(job)
+    if job.stream_format:
+        events = stream_protocol.coalesce(events, STREAM_COALESCE_CHARS, STREAM_COALESCE_DELAY)
+        return framed_stream_response(stream_with_context(stream_protocol.frame(events, job.stream_format, job.started_at)), job.stream_format, "miss")
+    lines = stream_protocol.legacy_lines(events, *GEMINI_STREAM_ERRORS[job.kind])
+    return Response(stream_with_context(lines), mimetype=STREAM_MIMETYPE, headers={"X-Zenith-Cache": "miss"})
+
+
+# --- Request Preparation ---
+# Each prepare_* function validates a request body and answers it if no Gemini call is needed.
+# They return (response, None), or (None, GeminiJob) to be streamed by the caller.
+def prepare_ask_stream(data):
+    started_at, stream_format = time.perf_counter(), stream_protocol.requested_format(data)
     query = data.get('query', '').strip()
-    chat_history = data.get('history', []) # Get history from frontend request
 
     if not query:
-        return make_error_response("Empty query received.", 400)
+        return make_error_response("Empty query received.", 400), None
+    with stage('history'):
+        chat_history = resolve_history(data) # From the request, or the conversation session it continues
+    if chat_history is None:
+        return session_reset_response(), None
 
     logger.info(f"/ask_stream Query: '{query[:100]}...' (History: {len(chat_history)} items)")
 
     # Attempt to handle command internally first
-    internal_response = handle_internal_command(query)
+    with stage('command'):
+        internal_response = handle_internal_command(query)
     if internal_response:
         logger.info("Request handled internally.")
-        return internal_response # Return JSON response
+        return internal_response, None # Return JSON response
+
+    # Deterministic questions (time, math, units...) are answered locally, in microseconds
+    if LOCAL_ANSWERS:
+        with stage('local'):
+            local_answer = local_answers.answer(query)
+        if local_answer:
+            intent, answer = local_answer
+            LOCAL_ANSWER_COUNT.inc(intent=intent)
+            logger.info(f"Answered locally ({intent}).")
+            return jsonify({"status": "handled", "response": answer}), None
+
+    with stage('context'):
+        gemini_history = format_history_for_gemini(chat_history)
+    use_cache = not data.get('no_cache')
+    cache_key = make_cache_key("ask", query, gemini_history)
+    with stage('cache'):
+        cached_response = cached_stream_response(cache_key, use_cache, stream_format, started_at)
+    if cached_response is not None:
+        return cached_response, None
 
     # --- If not handled internally, proceed with Gemini ---
     logger.info("Forwarding query to Gemini API.")
-    if not gemini_model:
-        logger.error("Gemini model not initialized, cannot process query.")
-        return make_error_response("AI model unavailable", 503) # 503 Service Unavailable
+    unavailable_response = gemini_unavailable_response()
+    if unavailable_response:
+        return unavailable_response, None
+    return None, GeminiJob('ask', gemini_history, query, cache_key, use_cache, stream_format=stream_format, started_at=started_at)
 
-    gemini_history = format_history_for_gemini(chat_history)
+def prepare_process_clipboard(data):
+    started_at, stream_format = time.perf_counter(), stream_protocol.requested_format(data)
+    clipboard_text = data.get('text', '').strip()
+    if not clipboard_text: return make_error_response("Clipboard text is empty.", 400), None
+    with stage('history'):
+        chat_history = resolve_history(data)
+    if chat_history is None: return session_reset_response(), None
 
-    def generate_chunks():
-        """Generator function for streaming Gemini responses."""
-        try:
-            # Start a chat session with history
-            chat_session = gemini_model.start_chat(history=gemini_history)
-            # Send the user's query
-            stream = chat_session.send_message(query, stream=True)
-
-            for chunk in stream:
-                # Handle potential errors or blocked content within the stream
-                # Note: Check for block reason *before* accessing text if possible API change
-                # As of early 2024, text is usually available even if blocked, check prompt_feedback
-                if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
-                    reason = chunk.prompt_feedback.block_reason.name
-                    logger.warning(f"Gemini content generation blocked. Reason: {reason}")
-                    yield f"ERROR: Content blocked by safety filter ({reason})\n"
-                    return # Stop generation if blocked
-
-                if chunk.text:
-                    yield chunk.text + "\n" # Send text chunk, newline delimited
+    logger.info(f"Processing clipboard text (length: {len(clipboard_text)})...")
+    chunks = None
+    if estimate_tokens(clipboard_text) > CLIPBOARD_MAP_REDUCE_TOKENS:
+        chunk_tokens = max(CLIPBOARD_CHUNK_TOKENS, estimate_tokens(clipboard_text) // CLIPBOARD_MAX_CHUNKS + 1)
+        with stage('split'):
+            chunks = clipboard_pipeline.split_text(clipboard_text, chunk_tokens)
+        logger.info(f"Large clipboard text: summarizing {len(chunks)} chunks before answering.")
+    clipboard_query = None if chunks else f"Analyze the following text from the clipboard:\n\n'''\n{clipboard_text}\n'''\n\nWhat is this about? Summarize it or explain any key points."
+    with stage('context'):
+        gemini_history = format_history_for_gemini(chat_history)
+    use_cache = not data.get('no_cache')
+    cache_key = make_cache_key("clipboard", clipboard_text, gemini_history)
+    with stage('cache'):
+        cached_response = cached_stream_response(cache_key, use_cache, stream_format, started_at)
+    if cached_response is not None:
+        return cached_response, None
+    unavailable_response = gemini_unavailable_response()
+    if unavailable_response: return unavailable_response, None
+    return None, GeminiJob('clipboard', gemini_history, clipboard_query, cache_key, use_cache, chunks, stream_format, started_at)
+
+def prepare_analyze_image(data):
+    started_at, stream_format = time.perf_counter(), stream_protocol.requested_format(data)
+    query = data.get('query', "Describe this image."); image_data_uri = data.get('image_data');
+    if not image_data_uri: return make_error_response("No image data provided", 400), None
+    logger.info(f"Image analysis request. Query: {query[:50]}...")
+    try:
+        with stage('image_prep'):
+            image_data = image_prep.decode_data_uri(image_data_uri)
+            image, jpeg_bytes = image_prep.prepare_image(image_data, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_JPEG_QUALITY)
+        logger.info(f"Image prepared: {len(image_data)} -> {len(jpeg_bytes)} bytes, {image.size[0]}x{image.size[1]}")
+    except PIL.UnidentifiedImageError:
+        logger.error("Cannot identify image format from provided data.")
+        return make_error_response("Invalid image format", 400), None
+    except (ValueError, TypeError, base64.binascii.Error) as decode_err:
+         logger.error(f"Image data decoding error: {decode_err}", exc_info=True)
+         return make_error_response("Invalid image data format", 400), None
+    except Exception as e:
+        logger.error(f"Error preparing image: {e}", exc_info=True)
+        return make_error_response("An error occurred during image analysis", 500), None
+
+    # Near-identical frames (same scene, sensor noise) share a canonical hash and so a cache entry
+    if not warmup.wait('imaging', WARMUP_WAIT_TIMEOUT) or image_hash_index is None:
+        return make_error_response("Image analysis is unavailable.", 503), None
+    with stage('image_hash'):
+        image_hash = image_hash_index.canonical(image_prep.perceptual_hash(image))
+    use_cache = not data.get('no_cache')
+    cache_key = make_cache_key("image", query, [f"{image_hash:016x}"])
+    with stage('cache'):
+        cached_response = cached_stream_response(cache_key, use_cache, stream_format, started_at)
+    if cached_response is not None:
+        return cached_response, None
+    unavailable_response = gemini_unavailable_response()
+    if unavailable_response: return unavailable_response, None
+
+    # Keep image prompt simple - text query + image. History is complex with images.
+    prompt_parts = [ f"{SYSTEM_PROMPT}\n\nUser: {query}", {"mime_type": "image/jpeg", "data": jpeg_bytes} ]
+    return None, GeminiJob('image', None, prompt_parts, cache_key, use_cache, stream_format=stream_format, started_at=started_at)
+
+
+# --- Batch ---
+# /batch answers several queries of one request ("open notepad; open youtube; search github flask") on batch_executor,
+# each one exactly like /ask_stream, and streams one NDJSON result line per query as soon as it is done:
+#   {"type": "result", "index": 1, "query": "open youtube", "status": "handled", "response": "Opening youtube."}
+#   {"type": "done", "items": 3, "errors": 0, "duration_ms": 812.4}
+# Results arrive in completion order; "index" is the query's position in the request.
+BATCH_SEPARATORS = re.compile(r"[;\n]")
+
+def batch_queries(data):
+    """The queries of a /batch request: the 'queries' list, or 'text' split at semicolons and line breaks.
+       Returns None if 'queries' is not a list of non-empty strings.
+    """
+    queries = data.get('queries')
+    if queries is None:
+        text = data.get('text') or ''
+        return [query.strip() for query in BATCH_SEPARATORS.split(text if isinstance(text, str) else '') if query.strip()]
+    if not isinstance(queries, list) or not all(isinstance(query, str) and query.strip() for query in queries):
+        return None
+    return [query.strip() for query in queries]
+
+def batch_answer_result(events, cancelled, cache_status):
+    """Collects a streamed answer into one result. Stops reading (and the Gemini stream) if the client went away."""
+    text, error = [], None
+    for event in events:
+        if cancelled.is_set():
+            break
+        if event.type == 'delta':
+            text.append(event.data)
+        elif event.type == 'blocked':
+            error = f"Content blocked by safety filter ({event.data})"
+        elif event.type == 'error':
+            error = f"An error occurred while contacting the AI: {event.data}"
+    if error:
+        return {"status": "error", "error": error}
+    return {"status": "handled", "response": "".join(text), "cache": cache_status}
+
+def run_batch_item(query, chat_history, use_cache, cancelled):
+    """Answers one /batch query (command, local answer, cache or Gemini). Returns its result dict."""
+    if cancelled.is_set():
+        return {"status": "cancelled"}
+    with app.app_context():
+        response, job = prepare_ask_stream({'query': query, 'history': chat_history, 'no_cache': not use_cache})
+        if job is not None:
+            return batch_answer_result(shared_gemini_events(job), cancelled, "miss")
+        response = app.make_response(response)
+        if response.headers.get("X-Zenith-Cache") == "hit": # Cached answer, replayed as plain text lines
+            return batch_answer_result(stream_protocol.cached_events(response.response), cancelled, "hit")
+        result = response.get_json(silent=True) or {}
+        if response.status_code >= 400:
+            return {"status": "error", "error": result.get("error", "Request failed."), "code": response.status_code}
+        return result
 
-        except Exception as e:
-            logger.error(f"Error during Gemini streaming generation: {e}", exc_info=True)
-            yield f"ERROR: An error occurred while contacting the AI: {str(e)}\n"
 
-    # Return the streaming response
-    return Response(stream_with_context(generate_chunks()), mimetype='text/plain; charset=utf-8')
+# --- API Endpoints ---
+@app.route('/')
+def index():
+    return "Zenith Assistant Backend v1.5"
+
+@app.route('/ping')
+def ping():
+    # Basic check to see if the server is responsive
+    return jsonify({"status": "ok"})
+
+@app.route('/ready')
+def ready():
+    """Warm-up state of each component; 503 until all of them have finished loading (or failed)."""
+    settled = warmup.settled
+    return jsonify({"ready": settled, "mode": STARTUP_MODE, "components": warmup.status()}), 200 if settled else 503
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the Gemini response cache."""
+    return jsonify(response_cache.stats())
+
+@app.route('/notes/search')
+def search_notes():
+    """Full-text note search: ?q=words&limit=20&offset=0. An empty q lists notes newest first."""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), NOTES_PAGE_MAX)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return make_error_response("'limit' and 'offset' must be integers.", 400)
+    if not warmup.wait('notes', WARMUP_WAIT_TIMEOUT):
+        return make_error_response("Notes search is unavailable.", 503)
+    with metrics.timed(PERSISTENCE_SECONDS, 'note_search', store='notes', op='search'):
+        total, notes = notes_store.search(query, limit=limit, offset=offset)
+    return jsonify({
+        "query": query, "total": total, "offset": offset, "limit": limit,
+        "notes": [note._asdict() for note in notes],
+    })
+
+@app.route('/context/stats')
+def context_stats():
+    """Prompt tokens sent/saved by history packing, summary cache and conversation session counters."""
+    stats = context_builder.stats()
+    stats["sessions"] = session_store.stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Counters and latency histograms in the Prometheus text format."""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/ask_stream', methods=['POST'])
+def ask_stream():
+    response, job = prepare_ask_stream(request.get_json())
+    return response if job is None else stream_gemini_response(job)
+
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Runs several queries or commands at once ({"queries": [...]} or {"text": "a; b"}) and streams
+       each result as it completes. Launches still happen one at a time, on the launcher thread.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = batch_queries(data)
+    if queries is None:
+        return make_error_response("'queries' must be a list of non-empty strings.", 400)
+    if not queries:
+        return make_error_response("No queries received.", 400)
+    if len(queries) > BATCH_MAX_ITEMS:
+        return make_error_response(f"Too many queries in one batch (at most {BATCH_MAX_ITEMS}).", 400)
+    chat_history = resolve_history(data) # Shared by all items, which do not see each other's answers
+    if chat_history is None:
+        return session_reset_response()
+
+    logger.info(f"/batch: {len(queries)} queries")
+    started_at, cancelled = time.perf_counter(), threading.Event()
+    use_cache = not data.get('no_cache')
+    futures = {batch_executor.submit(run_batch_item, query, chat_history, use_cache, cancelled): index
+               for index, query in enumerate(queries)}
+
+    def generate():
+        errors = 0
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Batch item {index} failed: {e}", exc_info=True)
+                    result = {"status": "error", "error": "Internal error."}
+                errors += result.get("status") == "error"
+                BATCH_ITEMS.inc(status=result.get("status", "unknown"))
+                yield json.dumps({"type": "result", "index": index, "query": queries[index], **result}) + "\n"
+            yield json.dumps({"type": "done", "items": len(queries), "errors": errors,
+                              "duration_ms": round((time.perf_counter() - started_at) * 1000, 1)}) + "\n"
+        finally:
+            cancelled.set() # Client gone (or all done): queued items are skipped, running answers stop
+            for future in futures:
+                future.cancel()
+
+    return Response(generate(), mimetype=stream_protocol.MIMETYPES['ndjson'])
 
 
 @app.route('/add_app', methods=['POST'])
@@ -413,8 +1002,8 @@ def add_app():
         logger.warning(f"Path '{app_path}' might not be directly executable on Windows.")
 
     try:
-        known_apps[app_name_lower] = app_path
-        save_json_data(KNOWN_APPS_FILE, known_apps) # Use the save utility
+        apps_store.set(app_name_lower, app_path) # Journaled in the background
+        name_index.add(app_name_lower, 'app')
         logger.info(f"Application '{app_name}' path saved successfully.")
         return jsonify({"status": "success", "response": f"Okay, I've learned the path for '{app_name}'. You can now ask me to open it."})
     except Exception as e:
@@ -425,124 +1014,178 @@ def add_app():
 @app.route('/process_clipboard', methods=['POST'])
 def process_clipboard():
     """Receives clipboard text and history, sends to Gemini for analysis."""
-    data = request.get_json()
-    clipboard_text = data.get('text', '').strip()
-    chat_history = data.get('history', [])
-    if not clipboard_text: return make_error_response("Clipboard text is empty.", 400)
-    if not gemini_model: return make_error_response("AI model unavailable", 503)
+    response, job = prepare_process_clipboard(request.get_json())
+    return response if job is None else stream_gemini_response(job)
 
-    logger.info(f"Processing clipboard text (length: {len(clipboard_text)})...")
-    clipboard_query = f"Analyze the following text from the clipboard:\n\n'''\n{clipboard_text}\n'''\n\nWhat is this about? Summarize it or explain any key points."
-    gemini_history = format_history_for_gemini(chat_history)
 
-    def generate_chunks():
-        """Streams Gemini response for clipboard analysis."""
-        try:
-            chat_session = gemini_model.start_chat(history=gemini_history)
-            stream = chat_session.send_message(clipboard_query, stream=True)
-            for chunk in stream:
-                if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
-                    reason = chunk.prompt_feedback.block_reason.name; yield f"ERROR: Blocked({reason})\n"; return
-                if chunk.text: yield chunk.text + "\n"
-        except Exception as e: logger.error(f"Clipboard processing error: {e}"); yield f"ERROR: AI processing error\n"
+@app.route('/analyze_image', methods=['POST'])
+def analyze_image():
+    """Analyzes an image with an optional query, no history context for simplicity.
+       The image is downscaled before upload and the answer is streamed like /ask_stream.
+    """
+    response, job = prepare_analyze_image(request.get_json())
+    return response if job is None else stream_gemini_response(job)
 
-    return Response(stream_with_context(generate_chunks()), mimetype='text/plain; charset=utf-8')
 
+# --- Speech Recognition Helpers ---
+def is_speech_block(block):
+    """Energy-based voice activity check on a raw int16 audio block."""
+    samples = np.frombuffer(block, dtype=np.int16)
+    if samples.size == 0:
+        return False
+    rms = np.sqrt(np.mean(samples.astype(np.float32) ** 2))
+    return rms >= VAD_ENERGY_THRESHOLD
 
-@app.route('/analyze_image', methods=['POST'])
-def analyze_image():
-    """Analyzes an image with an optional query, no history context for simplicity."""
-    if not gemini_model: return make_error_response("AI model unavailable", 503)
-    data = request.get_json(); query = data.get('query', "Describe this image."); image_data_uri = data.get('image_data');
-    if not image_data_uri: return make_error_response("No image data provided", 400)
-    logger.info(f"Image analysis request. Query: {query[:50]}...")
-    try:
-        header, encoded = image_data_uri.split(",", 1); image_data = base64.b64decode(encoded); image = Image.open(io.BytesIO(image_data))
-        # Keep image prompt simple - text query + image. History is complex with images.
-        prompt_parts = [ f"{SYSTEM_PROMPT}\n\nUser: {query}", image ]
-        # Use generate_content directly for image analysis
-        response = gemini_model.generate_content(prompt_parts)
-        if response.prompt_feedback and response.prompt_feedback.block_reason:
-            reason = response.prompt_feedback.block_reason.name; logger.warning(f"Image analysis blocked: {reason}")
-            return make_error_response("Content blocked by safety filter", 400, details=reason)
-        # Resolve the response before returning JSON
-        response.resolve() # Ensure generation is complete
-        return jsonify({"response": response.text})
-    except UnidentifiedImageError:
-        logger.error("Cannot identify image format from provided data.")
-        return make_error_response("Invalid image format", 400)
-    except (ValueError, TypeError, base64.binascii.Error) as decode_err:
-         logger.error(f"Image data decoding error: {decode_err}", exc_info=True)
-         return make_error_response("Invalid image data format", 400)
-    except Exception as e:
-        logger.error(f"Error during image analysis: {e}", exc_info=True)
-        return make_error_response("An error occurred during image analysis", 500)
+def recognize_speech_stream():
+    """Decodes audio from the persistent capture stream and yields ('partial' | 'final', text) events.
+       Decoding starts LISTEN_PREROLL seconds in the past. Stops at end-of-speech (trailing silence
+       or a Vosk endpoint), or after LISTEN_MAX_DURATION.
+    """
+    capture_service.start() # No-op when the stream is already running
+    # Capture at the device rate, decode at the model rate
+    front_end = audio_frontend.AudioFrontEnd(samplerate, audio_frontend.MODEL_SAMPLERATE)
+    segments = [] # Finalized text segments (Vosk may split on short pauses)
+    last_partial = ""
+
+    blocksize = int(samplerate * LISTEN_BLOCK_MS / 1000)
+    cursor = capture_service.cursor(preroll=LISTEN_PREROLL)
+    started_at = time.monotonic()
+    audio_time = 0.0 # Seconds of audio consumed; VAD timing follows the audio clock
+    decode_time = 0.0 # Seconds spent in the front end and the recognizer, for the real-time factor
+    last_voice_at = None # Audio time of the most recent speech block
+
+    with recognizer_pool.acquire() as recognizer:
+        while True:
+            if max(audio_time, time.monotonic() - started_at) >= LISTEN_MAX_DURATION:
+                logger.info("Max listen duration reached.")
+                break
+            block, cursor = capture_service.read(cursor, blocksize, timeout=LISTEN_BLOCK_MS / 1000 * 5)
+            if not block:
+                if not capture_service.running:
+                    raise sd.PortAudioError("Audio capture stream stopped unexpectedly.")
+                continue
+            audio_time += len(block) / 2 / samplerate # int16 mono: 2 bytes per sample
+
+            if is_speech_block(block):
+                last_voice_at = audio_time
+
+            decode_started_at = time.perf_counter()
+            endpoint = recognizer.AcceptWaveform(front_end.process(block))
+            decode_time += time.perf_counter() - decode_started_at
+            if endpoint:
+                # Vosk detected an utterance endpoint
+                text = json.loads(recognizer.Result()).get('text', '')
+                if text:
+                    segments.append(text)
+                    if last_voice_at is not None:
+                        break
+            else:
+                partial = json.loads(recognizer.PartialResult()).get('partial', '')
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    yield 'partial', " ".join(segments + [partial])
+
+            if last_voice_at is None and audio_time >= LISTEN_NO_SPEECH_TIMEOUT:
+                logger.info("No speech detected before timeout.")
+                break
+            if last_voice_at is not None and audio_time - last_voice_at >= LISTEN_SILENCE_TIMEOUT:
+                logger.info("End of speech detected (silence).")
+                break
+
+        decode_started_at = time.perf_counter()
+        final_text = json.loads(recognizer.FinalResult()).get('text', '')
+        decode_time += time.perf_counter() - decode_started_at
+    capture_service.mark_consumed(cursor)
+    if audio_time:
+        SPEECH_RTF.observe(decode_time / audio_time)
+    metrics.record_stage('decode', decode_time)
+    SPEECH_SECONDS.observe(time.monotonic() - started_at)
+
+    if final_text:
+        segments.append(final_text)
+    transcript = " ".join(segments).strip()
+    logger.info(f"Transcription complete in {time.monotonic() - started_at:.2f}s: '{transcript}'")
+    yield 'final', transcript
+
+def describe_audio_error(pa_err):
+    if "Invalid device" in str(pa_err) or "No Default Input Device" in str(pa_err):
+        return "Microphone not found or PortAudio error."
+    return "Audio device error during recording."
 
 
 @app.route('/listen', methods=['POST'])
 def listen_for_speech():
-    """Listens for speech using Vosk and returns the transcript."""
-    if not vosk_model or not samplerate:
+    """Listens for speech using Vosk and returns the transcript.
+       With {"stream": true} the response is NDJSON: {"partial": ...} lines followed by {"transcript": ...}.
+    """
+    if not voice_available():
         logger.error("Voice recognition components not ready.")
         return make_error_response("Voice recognition components unavailable", 503)
 
-    listen_duration = 5 # seconds
-    logger.info(f"Listening for speech ({listen_duration}s) at {samplerate} Hz...")
-    recognizer = vosk.KaldiRecognizer(vosk_model, samplerate)
-    recognizer.SetWords(False) # We don't need word timestamps usually
-    transcript = ""
-    audio_data = []
+    data = request.get_json(silent=True) or {}
+    logger.info(f"Listening for speech (max {LISTEN_MAX_DURATION}s) at {samplerate} Hz...")
+
+    if data.get('stream'):
+        def generate_events():
+            """Streams partial transcripts, then the final transcript, as NDJSON lines."""
+            try:
+                for kind, text in recognize_speech_stream():
+                    key = "transcript" if kind == 'final' else "partial"
+                    yield json.dumps({key: text}) + "\n"
+            except sd.PortAudioError as pa_err:
+                logger.error(f"PortAudioError: {pa_err}", exc_info=True)
+                yield json.dumps({"error": describe_audio_error(pa_err)}) + "\n"
+            except Exception as e:
+                logger.error(f"Unexpected error during speech recognition: {e}", exc_info=True)
+                yield json.dumps({"error": "Speech recognition failed due to an internal error."}) + "\n"
+
+        return Response(stream_with_context(generate_events()), mimetype='application/x-ndjson')
 
     try:
-        def audio_callback(indata, frames, time, status):
-            """This callback gets called by sounddevice for each audio buffer."""
-            if status:
-                logger.warning(f"Sounddevice status: {status}")
-            # Append audio data (ensure it's bytes)
-            audio_data.append(bytes(indata))
-
-        # Use InputStream context manager for clean resource handling
-        with sd.InputStream(callback=audio_callback, samplerate=samplerate, channels=1, dtype='int16', blocksize=8000):
-            sd.sleep(listen_duration * 1000) # Record for the specified duration
-
-        logger.info(f"Recording finished. Processing {len(audio_data)} audio chunks.")
-        if not audio_data:
-             logger.warning("No audio data was captured during listening period.")
-             return jsonify({"transcript": ""}) # Return empty if nothing recorded
-
-        # Process the entire recorded audio at once
-        full_audio = b"".join(audio_data)
-        if recognizer.AcceptWaveform(full_audio):
-            result = json.loads(recognizer.Result())
-            transcript = result.get('text', '')
-        else:
-            # Get final result even if AcceptWaveform returned false (common for short utterances)
-            final_result = json.loads(recognizer.FinalResult())
-            transcript = final_result.get('text', '')
-
-        logger.info(f"Transcription complete: '{transcript}'")
+        transcript = ""
+        for kind, text in recognize_speech_stream():
+            if kind == 'final':
+                transcript = text
         return jsonify({"transcript": transcript})
 
     except sd.PortAudioError as pa_err:
-        err_msg = "Microphone not found or PortAudio error." if "Invalid device" in str(pa_err) or "No Default Input Device" in str(pa_err) else "Audio device error during recording."
         logger.error(f"PortAudioError: {pa_err}", exc_info=True)
-        return make_error_response(err_msg, 500, details=str(pa_err))
+        return make_error_response(describe_audio_error(pa_err), 500, details=str(pa_err))
     except Exception as e:
         logger.error(f"Unexpected error during speech recognition: {e}", exc_info=True)
         return make_error_response("Speech recognition failed due to an internal error.", 500, details=str(e))
 
 
-# --- Main Execution ---
-if __name__ == '__main__':
-    print("--- Initializing Zenith Backend v1.5 ---")
-    # Load data on startup
-    known_apps = load_json_data(KNOWN_APPS_FILE, {})
-    known_websites = load_json_data(KNOWN_WEBSITES_FILE, {})
+# --- Startup ---
+def load_startup_data():
+    """Loads known apps/websites, builds the name index and ensures the notes file exists."""
+    global known_apps, known_websites
+    known_apps = apps_store.load() # Snapshot + journal replay; the stores keep these dicts up to date
+    known_websites = websites_store.load()
+    name_index.build(known_apps, known_websites)
+    logger.info(f"Name index built ({len(name_index)} apps/websites).")
     # Ensure notes file exists
     if not os.path.exists(NOTES_FILE):
         try: open(NOTES_FILE, 'a', encoding='utf-8').close(); logger.info("Created empty notes file.")
         except Exception as e: logger.error(f"Failed to create notes file on startup: {e}")
 
+def start_warmup():
+    """Loads Gemini, Vosk, imaging support and the notes index: in the background, or before returning in eager mode."""
+    background = STARTUP_MODE != "eager"
+    logger.info(f"Warming up components ({'background' if background else 'eager'} mode)...")
+    warmup.start(background=background)
+
+
+# --- Main Execution ---
+# Async serving mode (bounded concurrency, cancellation on client abort): python asgi_app.py
+if __name__ == '__main__':
+    if not API_KEY:
+        sys.exit("Exiting: API Key missing.")
+    print("--- Initializing Zenith Backend v1.5 ---")
+    # Load data on startup
+    load_startup_data()
+    start_warmup()
+
     logger.info("--- Starting Flask Server ---")
     # Use 127.0.0.1 for local access only; debug=False for stability
-    app.run(host='127.0.0.1', port=5111, debug=False)
\ No newline at end of file
+    app.run(host='127.0.0.1', port=5111, debug=False)
@@ -0,0 +1,369 @@
+"""Asyncio-native serving mode for the Zenith backend.
+
+    cd backend && python asgi_app.py
+
+Serves the same routes and response formats as `python app.py`, but the
+streaming endpoints (/ask_stream, /process_clipboard, /analyze_image, /listen)
+run as coroutines: a Gemini stream costs a coroutine instead of an OS thread.
+Each of these endpoints has its own concurrency limit, and a stream is
+cancelled upstream as soon as the client disconnects (e.g. the Stop button).
+All other routes are served by the Flask app through a WSGI bridge.
+
+Needs the optional packages: pip install uvicorn starlette a2wsgi
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import uvicorn
+    from a2wsgi import WSGIMiddleware
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import JSONResponse, Response, StreamingResponse
+    from starlette.routing import Route
+except ImportError as e:
+    sys.exit(f"Exiting: async mode needs optional packages (pip install uvicorn starlette a2wsgi): {e}")
+
+import app as zenith
+import clipboard_pipeline
+import metrics
+import stream_protocol
+from stream_protocol import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+# --- Concurrency Settings ---
+# Max in-flight requests per endpoint; further requests wait up to SLOT_WAIT_TIMEOUT, then get a 503
+ENDPOINT_CONCURRENCY = {
+    '/ask_stream': int(os.getenv("ZENITH_ASYNC_MAX_ASK", "32")),
+    '/process_clipboard': int(os.getenv("ZENITH_ASYNC_MAX_CLIPBOARD", "8")),
+    '/analyze_image': int(os.getenv("ZENITH_ASYNC_MAX_IMAGE", "8")),
+    '/listen': 1, # One microphone
+}
+SLOT_WAIT_TIMEOUT = 10.0 # seconds
+
+
+class ConcurrencyLimiter:
+    """Per-endpoint semaphores. Created lazily so they bind to the server's event loop."""
+
+    def __init__(self, limits, wait_timeout):
+        self.limits = limits
+        self.wait_timeout = wait_timeout
+        self._semaphores = {}
+        self.rejected = {path: 0 for path in limits}
+
+    async def acquire(self, path):
+        """Waits for a slot on `path`. Returns False (and counts a rejection) if none frees up in time."""
+        semaphore = self._semaphores.setdefault(path, asyncio.Semaphore(self.limits[path]))
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.wait_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected[path] += 1
+            logger.warning(f"{path}: concurrency limit ({self.limits[path]}) reached; rejecting request.")
+            return False
+
+    def release(self, path):
+        self._semaphores[path].release()
+
+
+limiter = ConcurrencyLimiter(ENDPOINT_CONCURRENCY, SLOT_WAIT_TIMEOUT)
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that frees its concurrency slot however the response ends,
+       including a disconnect before the body started streaming."""
+
+    def __init__(self, content, path, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot_path = path
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            limiter.release(self.slot_path)
+
+
+def busy_response():
+    return JSONResponse({"error": "Server busy, please try again shortly."}, status_code=503)
+
+
+def to_starlette_response(flask_response):
+    """Converts a (fully buffered) Flask response into a Starlette response."""
+    headers = {key: value for key, value in flask_response.headers.items() if key.lower() != 'content-length'}
+    return Response(flask_response.get_data(), status_code=flask_response.status_code, headers=headers)
+
+
+_clipboard_map_semaphore = None # Created lazily so it binds to the server's event loop
+
+
+async def asummarize_clipboard_chunk(prompt):
+    """Async counterpart of app.summarize_clipboard_chunk."""
+    try:
+        response = await zenith.gemini_client.agenerate(prompt, zenith.PRIORITY_BULK)
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            logger.warning(f"Clipboard chunk summary blocked. Reason: {response.prompt_feedback.block_reason.name}")
+            return None
+        return response.text
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error summarizing clipboard chunk: {e}")
+        return None
+
+
+def agenerate_gemini_events(job):
+    """Async counterpart of app.generate_gemini_events: same events, but awaits the Gemini stream."""
+    return aobserve_gemini_events(job.kind, agemini_job_events(job))
+
+
+async def aobserve_gemini_events(kind, events):
+    """Async counterpart of app.observe_gemini_events."""
+    started_at, first_text, outcome = time.perf_counter(), True, 'disconnected'
+    try:
+        async for event in events:
+            if event.type == 'delta' and first_text:
+                zenith.GEMINI_TTFT_SECONDS.observe(time.perf_counter() - started_at, kind=kind)
+                first_text = False
+            elif event.type in ('blocked', 'error'):
+                outcome = event.type
+            yield event
+        if outcome == 'disconnected':
+            outcome = 'ok'
+    finally:
+        await events.aclose()
+        zenith.GEMINI_STREAMS.inc(kind=kind, outcome=outcome)
+        zenith.GEMINI_STREAM_SECONDS.observe(time.perf_counter() - started_at, kind=kind)
+
+
+async def agemini_job_events(job):
+    global _clipboard_map_semaphore
+    try:
+        if job.chunks:
+            if _clipboard_map_semaphore is None:
+                _clipboard_map_semaphore = asyncio.Semaphore(zenith.CLIPBOARD_MAP_WORKERS)
+            summaries = None
+            async for event, value in clipboard_pipeline.amap_chunks(_clipboard_map_semaphore, asummarize_clipboard_chunk, job.chunks):
+                if event == 'progress':
+                    yield StreamEvent('progress', (value, len(job.chunks)))
+                else:
+                    summaries = value
+            if all(summary == clipboard_pipeline.FAILED_SUMMARY for summary in summaries):
+                yield StreamEvent('error', "no part of the text could be summarized")
+                return
+            job = job._replace(prompt=clipboard_pipeline.reduce_prompt(summaries, sum(len(chunk) for chunk in job.chunks)), chunks=None)
+        stream = zenith.gemini_client.astream(zenith.job_contents(job), zenith.JOB_PRIORITIES[job.kind])
+        usage = None
+        async for chunk in stream:
+            reason = zenith.chunk_block_reason(chunk)
+            if reason:
+                logger.warning(f"Gemini content generation blocked ({job.kind}). Reason: {reason}")
+                yield StreamEvent('blocked', reason)
+                return
+            usage = stream_protocol.usage_event(getattr(chunk, 'usage_metadata', None)) or usage
+            if chunk.text:
+                yield StreamEvent('delta', chunk.text)
+                if chunk.text.endswith("\n\n"):
+                    yield StreamEvent('flush', None)
+        if usage:
+            yield usage
+    except asyncio.CancelledError:
+        # Client went away: cancelling the awaiting task cancels the upstream call too
+        logger.info(f"Client disconnected; cancelled Gemini generation ({job.kind}).")
+        raise
+    except Exception as e:
+        logger.error(f"Error during Gemini streaming generation ({job.kind}): {e}", exc_info=True)
+        yield StreamEvent('error', str(e))
+
+
+def ashared_gemini_events(job):
+    """Async counterpart of app.shared_gemini_events."""
+    def start():
+        events = agenerate_gemini_events(job)
+        return zenith.response_cache.arecord_events(job.cache_key, events) if job.use_cache else events
+    return zenith.in_flight.afollow(job.cache_key, start) if zenith.SINGLE_FLIGHT else start()
+
+
+async def read_json(request):
+    body = await request.body()
+    if not body:
+        return {}
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def make_gemini_endpoint(path, prepare):
+    """Builds an async endpoint around one of app.py's prepare_* functions."""
+
+    async def endpoint(request):
+        data = await read_json(request)
+        if data is None:
+            return JSONResponse({"error": "Invalid JSON body."}, status_code=400)
+        if not await limiter.acquire(path):
+            return busy_response()
+        try:
+            def run_prepare():
+                # Shared validation, command handling and cache lookups; may launch apps, so off the loop
+                with zenith.app.app_context():
+                    response, job = prepare(data)
+                    return (to_starlette_response(zenith.app.make_response(response)) if job is None else None), job
+            response, job = await run_in_threadpool(run_prepare)
+        except BaseException:
+            limiter.release(path)
+            raise
+        if job is None:
+            limiter.release(path)
+            return response
+
+        events = ashared_gemini_events(job)
+        if job.stream_format:
+            events = stream_protocol.acoalesce(events, zenith.STREAM_COALESCE_CHARS, zenith.STREAM_COALESCE_DELAY)
+            headers = {"X-Zenith-Cache": "miss", **(stream_protocol.SSE_HEADERS if job.stream_format == 'sse' else {})}
+            return SlotStreamingResponse(stream_protocol.aframe(events, job.stream_format, job.started_at), path,
+                                         media_type=stream_protocol.MIMETYPES[job.stream_format], headers=headers)
+        lines = stream_protocol.alegacy_lines(events, *zenith.GEMINI_STREAM_ERRORS[job.kind])
+        return SlotStreamingResponse(lines, path, media_type=zenith.STREAM_MIMETYPE, headers={"X-Zenith-Cache": "miss"})
+
+    return endpoint
+
+
+async def arecognize_speech():
+    """Events of app.recognize_speech_stream, which runs on its own thread: opening the microphone,
+       waiting for audio and Vosk decoding all block, and must not stall other requests on the loop.
+    """
+    loop, events, stop = asyncio.get_running_loop(), asyncio.Queue(), threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(events.put_nowait, item)
+        except RuntimeError: # Loop closed (server shutting down)
+            pass
+
+    def recognize():
+        try:
+            for event in zenith.recognize_speech_stream():
+                put((event, None))
+                if stop.is_set():
+                    break # Closes the generator on this thread, which releases the pooled recognizer
+            put((None, None))
+        except Exception as e:
+            put((None, e))
+
+    threading.Thread(target=recognize, name="listen", daemon=True).start()
+    try:
+        while True:
+            event, error = await events.get()
+            if error is not None:
+                raise error
+            if event is None:
+                return
+            yield event
+    finally:
+        stop.set() # Client gone mid-utterance: the thread stops at its next event
+
+
+async def listen(request):
+    if not await run_in_threadpool(zenith.voice_available):
+        logger.error("Voice recognition components not ready.")
+        return JSONResponse({"error": "Voice recognition components unavailable"}, status_code=503)
+    data = await read_json(request) or {}
+    if not await limiter.acquire('/listen'):
+        return busy_response()
+    logger.info(f"Listening for speech (max {zenith.LISTEN_MAX_DURATION}s) at {zenith.samplerate} Hz...")
+
+    if data.get('stream'):
+        async def generate_events():
+            try:
+                async for kind, text in arecognize_speech():
+                    key = "transcript" if kind == 'final' else "partial"
+                    yield json.dumps({key: text}) + "\n"
+            except zenith.sd.PortAudioError as pa_err:
+                logger.error(f"PortAudioError: {pa_err}", exc_info=True)
+                yield json.dumps({"error": zenith.describe_audio_error(pa_err)}) + "\n"
+            except Exception as e:
+                logger.error(f"Unexpected error during speech recognition: {e}", exc_info=True)
+                yield json.dumps({"error": "Speech recognition failed due to an internal error."}) + "\n"
+
+        return SlotStreamingResponse(generate_events(), '/listen', media_type='application/x-ndjson')
+
+    try:
+        transcript = ""
+        async for kind, text in arecognize_speech():
+            if kind == 'final':
+                transcript = text
+        return JSONResponse({"transcript": transcript})
+    except zenith.sd.PortAudioError as pa_err:
+        logger.error(f"PortAudioError: {pa_err}", exc_info=True)
+        return JSONResponse({"error": zenith.describe_audio_error(pa_err), "details": str(pa_err)}, status_code=500)
+    except Exception as e:
+        logger.error(f"Unexpected error during speech recognition: {e}", exc_info=True)
+        return JSONResponse({"error": "Speech recognition failed due to an internal error.", "details": str(e)}, status_code=500)
+    finally:
+        limiter.release('/listen')
+
+
+def observed(path, endpoint):
+    """Records request metrics for a native async route (Flask routes have their own hooks),
+       plus a Server-Timing header when the request asks for a profile."""
+
+    async def observed_endpoint(request):
+        started_at = time.perf_counter()
+        profile_token = metrics.start_profile() if metrics.profile_requested(request.headers) else None
+        response = await endpoint(request)
+        elapsed = time.perf_counter() - started_at
+        zenith.HTTP_REQUESTS.inc(route=path, status=str(response.status_code))
+        zenith.HTTP_SECONDS.observe(elapsed, route=path)
+        if profile_token is not None:
+            response.headers["Server-Timing"] = metrics.server_timing(metrics.finish_profile(profile_token), elapsed)
+        return response
+
+    return observed_endpoint
+
+
+async def limiter_stats(request):
+    return JSONResponse({"limits": limiter.limits, "rejected": limiter.rejected})
+
+
+# --- ASGI App ---
+# Native async routes get their own CORS handling; everything else keeps Flask's (flask_cors)
+async_routes = Starlette(
+    routes=[
+        Route('/ask_stream', observed('/ask_stream', make_gemini_endpoint('/ask_stream', zenith.prepare_ask_stream)), methods=['POST']),
+        Route('/process_clipboard', observed('/process_clipboard', make_gemini_endpoint('/process_clipboard', zenith.prepare_process_clipboard)), methods=['POST']),
+        Route('/analyze_image', observed('/analyze_image', make_gemini_endpoint('/analyze_image', zenith.prepare_analyze_image)), methods=['POST']),
+        Route('/listen', observed('/listen', listen), methods=['POST']),
+        Route('/async/stats', limiter_stats),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["null", "file://"], allow_credentials=True,
+                           allow_methods=["*"], allow_headers=["*"])],
+)
+ASYNC_PATHS = {route.path for route in async_routes.routes}
+flask_routes = WSGIMiddleware(zenith.app)
+
+
+async def asgi_app(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] not in ASYNC_PATHS:
+        await flask_routes(scope, receive, send)
+    else:
+        await async_routes(scope, receive, send)
+
+
+if __name__ == '__main__':
+    if not zenith.API_KEY:
+        sys.exit("Exiting: API Key missing.")
+    print("--- Initializing Zenith Backend v1.5 (async mode) ---")
+    zenith.load_startup_data()
+    zenith.start_warmup()
+    logger.info("--- Starting ASGI Server ---")
+    # Use 127.0.0.1 for local access only
+    uvicorn.run(asgi_app, host='127.0.0.1', port=5111, log_level="info")
@@ -0,0 +1,167 @@
+"""Persistent microphone capture and warm Vosk recognizers.
+
+Opening an InputStream and building a KaldiRecognizer per /listen call adds
+device-open latency and clips the first syllables. Instead, one long-lived
+stream writes into a fixed-size ring buffer; each request reads from a cursor
+that starts a short pre-roll window in the past, and borrows a recognizer from
+a pool of pre-built ones that are reset between uses.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import vosk
+
+from warmup import lazy_import
+
+sd = lazy_import("sounddevice") # Only needed for the default (microphone) input stream
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureService:
+    """Long-lived int16 mono capture into a ring buffer.
+
+    Positions ("cursors") count samples since the service first started, so
+    readers can follow the stream independently. Memory is bounded by
+    `buffer_seconds` whatever the session length; a reader that falls further
+    behind than that skips ahead to the oldest retained sample.
+    """
+
+    def __init__(self, samplerate, buffer_seconds=10.0, block_ms=50, idle_timeout=None, stream_factory=None):
+        self.samplerate = int(samplerate)
+        self.stream_factory = stream_factory # sd.InputStream-compatible; e.g. a WAV file player for benchmarks
+        self.capacity = int(self.samplerate * buffer_seconds)
+        self.blocksize = int(self.samplerate * block_ms / 1000)
+        self.idle_timeout = idle_timeout # Seconds without readers before the microphone is released
+        self._ring = np.zeros(self.capacity, dtype=np.int16)
+        self._written = 0 # Total samples written since first start
+        self._consumed = 0 # End of the audio already handed to a finished request
+        self._last_used = time.monotonic()
+        self._stream = None
+        self._cond = threading.Condition()
+        self._watchdog = None
+
+    @property
+    def running(self):
+        return self._stream is not None
+
+    def start(self):
+        """Opens the input stream if it is not already running. Raises sd.PortAudioError on device errors."""
+        with self._cond:
+            self._last_used = time.monotonic()
+            if self._stream is not None:
+                return
+            stream_factory = self.stream_factory or sd.InputStream
+            stream = stream_factory(callback=self._audio_callback, samplerate=self.samplerate,
+                                    channels=1, dtype='int16', blocksize=self.blocksize)
+            stream.start()
+            self._stream = stream
+            # Audio from before this (re)start is gone; don't let pre-roll reach into the gap
+            self._consumed = self._written
+        logger.info(f"Audio capture started at {self.samplerate} Hz ({self.capacity / self.samplerate:.0f}s ring buffer).")
+        if self.idle_timeout and (self._watchdog is None or not self._watchdog.is_alive()):
+            self._watchdog = threading.Thread(target=self._idle_watchdog, name="capture-idle-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        with self._cond:
+            stream, self._stream = self._stream, None
+            self._cond.notify_all()
+        if stream is not None:
+            stream.stop()
+            stream.close()
+            logger.info("Audio capture stopped.")
+
+    def _idle_watchdog(self):
+        while self.running:
+            time.sleep(min(self.idle_timeout, 5.0))
+            if time.monotonic() - self._last_used >= self.idle_timeout:
+                logger.info("Audio capture idle; releasing microphone.")
+                self.stop()
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        """Called by sounddevice on its own thread for each captured block."""
+        if status:
+            logger.warning(f"Sounddevice status: {status}")
+        samples = indata[:, 0] if indata.ndim > 1 else indata
+        count = min(len(samples), self.capacity)
+        samples = samples[-count:]
+        with self._cond:
+            start = self._written % self.capacity
+            first = min(count, self.capacity - start)
+            self._ring[start:start + first] = samples[:first]
+            self._ring[:count - first] = samples[first:]
+            self._written += count
+            self._cond.notify_all()
+
+    def cursor(self, preroll=0.0):
+        """Returns a read position `preroll` seconds in the past, clamped to unread, retained audio."""
+        with self._cond:
+            self._last_used = time.monotonic()
+            oldest = max(0, self._written - self.capacity)
+            return max(self._written - int(preroll * self.samplerate), oldest, self._consumed)
+
+    def mark_consumed(self, cursor):
+        """Records that audio up to `cursor` belongs to a finished request (excluded from later pre-rolls)."""
+        with self._cond:
+            self._consumed = max(self._consumed, cursor)
+
+    def read(self, cursor, max_samples, timeout):
+        """Waits up to `timeout` for audio after `cursor`. Returns (int16 bytes, new cursor); bytes may be empty."""
+        with self._cond:
+            self._last_used = time.monotonic()
+            if self._written <= cursor and self._stream is not None:
+                self._cond.wait(timeout)
+            oldest = max(0, self._written - self.capacity)
+            if cursor < oldest:
+                logger.warning(f"Capture reader fell behind; skipping {oldest - cursor} samples.")
+                cursor = oldest
+            end = min(self._written, cursor + max_samples)
+            if end <= cursor:
+                return b"", cursor
+            start, stop = cursor % self.capacity, end % self.capacity
+            if start < stop:
+                chunk = self._ring[start:stop].tobytes()
+            else:
+                chunk = self._ring[start:].tobytes() + self._ring[:stop].tobytes()
+        return chunk, end
+
+
+class RecognizerPool:
+    """Pool of warmed-up KaldiRecognizers that are reset and reused between requests."""
+
+    def __init__(self, model, samplerate, size=2):
+        self.model = model
+        self.samplerate = samplerate
+        self.size = size
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(self._create())
+        logger.info(f"Recognizer pool ready ({size} warm recognizers at {samplerate} Hz).")
+
+    def _create(self):
+        recognizer = vosk.KaldiRecognizer(self.model, self.samplerate)
+        recognizer.SetWords(False) # We don't need word timestamps usually
+        # Push a little silence through so the decoder graph is paged in before first use
+        recognizer.AcceptWaveform(bytes(int(self.samplerate * 0.2) * 2))
+        recognizer.Reset()
+        return recognizer
+
+    @contextmanager
+    def acquire(self):
+        """Yields a ready recognizer; one is created on demand if the pool is exhausted."""
+        try:
+            recognizer = self._idle.get_nowait()
+        except queue.Empty:
+            logger.info("Recognizer pool exhausted; creating an extra recognizer.")
+            recognizer = self._create()
+        try:
+            yield recognizer
+        finally:
+            recognizer.Reset()
+            if self._idle.qsize() < self.size:
+                self._idle.put(recognizer)
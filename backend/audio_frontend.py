@@ -0,0 +1,94 @@
+"""Audio front-end for the Vosk recognizer.
+
+Microphones usually capture at 44.1/48 kHz while the small Vosk models are
+trained on 16 kHz audio. Decoding at the device rate makes the recognizer do
+~3x the work for no accuracy gain, so captured blocks are low-pass filtered,
+resampled and level-normalized here (vectorized NumPy) before decoding.
+"""
+import numpy as np
+
+MODEL_SAMPLERATE = 16000 # Rate the bundled small Vosk models are trained on
+FILTER_TAPS = 63 # Anti-aliasing FIR length (odd, so the filter is symmetric)
+
+
+def design_lowpass(cutoff, num_taps=FILTER_TAPS):
+    """Windowed-sinc low-pass FIR. `cutoff` is a fraction of the input Nyquist rate (0-1]."""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = cutoff * np.sinc(cutoff * n) * np.hamming(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class AudioFrontEnd:
+    """Streaming resampler + normalizer for mono int16 audio blocks.
+
+    Filter history and the fractional read position are carried between
+    blocks, so feeding a stream block by block gives the same output as
+    processing it in one piece. Create one instance per audio stream.
+    """
+
+    def __init__(self, input_rate, output_rate=MODEL_SAMPLERATE, normalize=True,
+                 target_peak=0.5, max_gain=4.0, noise_floor=0.02):
+        self.input_rate = int(input_rate)
+        self.output_rate = int(output_rate)
+        self.normalize = normalize
+        self.target_peak = target_peak
+        self.max_gain = max_gain
+        self.noise_floor = noise_floor
+        self.step = self.input_rate / self.output_rate # Input samples advanced per output sample
+        self.passthrough = self.input_rate == self.output_rate
+        # Cut just below the lower of the two Nyquist rates
+        self.taps = design_lowpass(0.9 * min(1.0, self.output_rate / self.input_rate))
+        self.reset()
+
+    def reset(self):
+        """Clears all per-stream state so the instance can be reused for a new stream."""
+        self._history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+        self._last = np.float32(0.0) # Last filtered sample of the previous block
+        self._pos = 1.0 # Next output position, relative to `_last` at index 0
+        self._dc = 0.0
+        self._envelope = self.noise_floor
+        self._gain = 1.0
+
+    def resample(self, samples):
+        """Resamples float32 samples in [-1, 1] from input_rate to output_rate."""
+        if self.passthrough or samples.size == 0:
+            return samples
+        buffered = np.concatenate((self._history, samples))
+        filtered = np.convolve(buffered, self.taps, mode='valid').astype(np.float32)
+        self._history = buffered[-(len(self.taps) - 1):]
+
+        frame = np.concatenate(([self._last], filtered))
+        last_index = len(frame) - 1
+        if self._pos > last_index:
+            count = 0
+        else:
+            count = int((last_index - self._pos) // self.step) + 1
+        positions = self._pos + self.step * np.arange(count)
+        output = np.interp(positions, np.arange(len(frame)), frame).astype(np.float32)
+
+        self._pos = self._pos + count * self.step - last_index
+        self._last = frame[-1]
+        return output
+
+    def apply_gain(self, samples):
+        """Removes DC offset and applies a slow, bounded automatic gain."""
+        if samples.size == 0:
+            return samples
+        self._dc = 0.95 * self._dc + 0.05 * float(samples.mean())
+        samples = samples - self._dc
+        peak = float(np.abs(samples).max())
+        # Fast attack, slow release, never below the noise floor (avoids boosting silence)
+        self._envelope = max(peak, self._envelope * 0.97, self.noise_floor)
+        target_gain = min(self.max_gain, self.target_peak / self._envelope)
+        # Ramp between block gains to avoid audible steps
+        gains = np.linspace(self._gain, target_gain, samples.size, dtype=np.float32)
+        self._gain = target_gain
+        return samples * gains
+
+    def process(self, block):
+        """Converts a raw int16 block (bytes or array) at input_rate to int16 bytes at output_rate."""
+        samples = np.frombuffer(block, dtype=np.int16).astype(np.float32) / 32768.0
+        samples = self.resample(samples)
+        if self.normalize:
+            samples = self.apply_gain(samples)
+        return (np.clip(samples, -1.0, 32767 / 32768) * 32768.0).astype(np.int16).tobytes()
@@ -0,0 +1,120 @@
+"""Real-time factor of Vosk decoding with and without the audio front-end.
+
+Usage (from the backend/ directory):
+    python benchmarks/bench_audio_frontend.py                  # WAVs in benchmarks/fixtures/, else synthetic ones
+    python benchmarks/bench_audio_frontend.py rec1.wav rec2.wav
+
+Fixtures should be mono/stereo 16-bit WAVs recorded at the microphone's native
+rate (44.1/48 kHz). "before" decodes at that rate, as the backend used to;
+"after" runs AudioFrontEnd first and decodes at 16 kHz. RTF = processing time /
+audio duration (lower is better). Without a Vosk model only the front-end is timed.
+With no fixtures at all, synthetic 44.1 and 48 kHz recordings (noise bursts and
+silence, see wav_audio.write_test_wav) are generated, so the RTF is always
+reported; transcripts are only meaningful for real recordings.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from audio_frontend import AudioFrontEnd, MODEL_SAMPLERATE
+from wav_audio import write_test_wav
+
+BLOCK_MS = 100 # Matches LISTEN_BLOCK_MS in app.py
+SYNTHETIC_RATES = (44100, 48000)
+
+
+def read_wav(path):
+    """Returns (int16 mono samples, samplerate)."""
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAVs are supported")
+        rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        if wav.getnchannels() > 1:
+            samples = samples.reshape(-1, wav.getnchannels()).mean(axis=1).astype(np.int16)
+    return samples, rate
+
+
+def iter_blocks(samples, rate):
+    size = int(rate * BLOCK_MS / 1000)
+    for i in range(0, len(samples), size):
+        yield samples[i:i + size].tobytes()
+
+
+def decode(model, samples, rate, front_end=None):
+    """Decodes block by block, like /listen does. Returns (seconds, transcript)."""
+    import vosk
+    recognizer = vosk.KaldiRecognizer(model, front_end.output_rate if front_end else rate)
+    start = time.perf_counter()
+    for block in iter_blocks(samples, rate):
+        if front_end:
+            block = front_end.process(block)
+        recognizer.AcceptWaveform(block)
+    text = json.loads(recognizer.FinalResult()).get('text', '')
+    return time.perf_counter() - start, text
+
+
+def time_front_end(samples, rate):
+    front_end = AudioFrontEnd(rate, MODEL_SAMPLERATE)
+    start = time.perf_counter()
+    for block in iter_blocks(samples, rate):
+        front_end.process(block)
+    return time.perf_counter() - start
+
+
+def synthetic_fixtures(directory):
+    """Writes one synthetic recording per native microphone rate. Returns their paths."""
+    paths = []
+    for rate in SYNTHETIC_RATES:
+        path = os.path.join(directory, f"synthetic_{rate}.wav")
+        write_test_wav(path, samplerate=rate, speech_seconds=4.0, silence_seconds=6.0)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('wavs', nargs='*', help="WAV fixtures (default: benchmarks/fixtures/*.wav)")
+    parser.add_argument('--model', default=os.path.join(BACKEND_DIR, "vosk_model", "model"), help="Vosk model directory")
+    args = parser.parse_args()
+
+    paths = args.wavs or sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "*.wav")))
+    if not paths:
+        print("No WAV fixtures given or in benchmarks/fixtures/; using synthetic 44.1/48 kHz recordings.\n")
+        scratch = tempfile.TemporaryDirectory(prefix="zenith-audio-") # Removed when the benchmark exits
+        paths = synthetic_fixtures(scratch.name)
+
+    model = None
+    if os.path.exists(args.model):
+        import vosk
+        vosk.SetLogLevel(-1)
+        model = vosk.Model(args.model)
+    else:
+        print(f"Vosk model not found at {args.model}; timing the front-end only.\n")
+
+    print(f"{'fixture':<28}{'rate':>7}{'audio s':>9}{'front-end RTF':>15}{'RTF before':>12}{'RTF after':>11}")
+    for path in paths:
+        samples, rate = read_wav(path)
+        duration = len(samples) / rate
+        fe_rtf = time_front_end(samples, rate) / duration
+        before = after = "-"
+        if model:
+            before_s, before_text = decode(model, samples, rate)
+            after_s, after_text = decode(model, samples, rate, AudioFrontEnd(rate, MODEL_SAMPLERATE))
+            before, after = f"{before_s / duration:.3f}", f"{after_s / duration:.3f}"
+        print(f"{os.path.basename(path)[:27]:<28}{rate:>7}{duration:>9.2f}{fe_rtf:>15.4f}{before:>12}{after:>11}")
+        if model:
+            print(f"    before: '{before_text}'\n    after:  '{after_text}'")
+
+
+if __name__ == '__main__':
+    main()
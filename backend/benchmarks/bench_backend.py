@@ -0,0 +1,262 @@
+"""Offline load benchmark: the HTTP endpoints under concurrency, without a Gemini key or microphone.
+
+Usage (from the backend/ directory):
+    python benchmarks/bench_backend.py [--scenarios ask,clipboard,image,router] [--concurrency 8]
+        [--requests 50] [--server flask|asgi] [--ttft-ms 300] [--tokens-per-second 80]
+        [--answer-tokens 120] [--json results.json] [--baseline previous.json] [--max-regression 0.25]
+
+Starts benchmarks/offline_server.py (fake streaming Gemini, WAV file as
+microphone, scratch data directory) in a separate process, waits for /ready,
+then runs each scenario: --requests requests from --concurrency client threads,
+after a few unrecorded warm-up requests. Reported per scenario: throughput of
+successful requests, p50/p99 latency (until the response is complete) and
+p50/p99 TTFT (until the first line of the answer arrives).
+
+Scenarios:
+  ask              /ask_stream with a new question each time (cache bypassed)
+  clipboard        /process_clipboard with ~3 KB of text
+  clipboard_large  /process_clipboard with ~40 KB of text (map-reduce path)
+  image            /analyze_image with a 1600x1200 PNG (needs Pillow)
+  listen           /listen, one request at a time (one microphone; needs a Vosk model)
+  router           /ask_stream with commands: note, note searches, site searches, unknown apps
+
+With --baseline (a --json file from an earlier run), exits with status 1 if a
+scenario's p99 latency or p99 TTFT grew, or its throughput fell, by more than
+--max-regression (a fraction). That is the check to run in CI.
+"""
+import argparse
+import base64
+import http.client
+import io
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_SCENARIOS = "ask,clipboard,clipboard_large,image,listen,router"
+WARMUP_REQUESTS = 3
+REQUEST_TIMEOUT = 120.0 # seconds
+
+
+# --- Scenarios ---
+def make_text(size, seed):
+    paragraph = (f"Log excerpt {seed}: the service restarted after a configuration change, "
+                 "requests were retried and latency returned to normal within a minute. ")
+    return "\n\n".join(paragraph * 3 for _ in range(size // (len(paragraph) * 3) + 1))[:size]
+
+
+def make_image_data_uri():
+    from PIL import Image
+    image = Image.linear_gradient('L').resize((1600, 1200)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+ROUTER_QUERIES = (
+    "note: benchmark note number {i}",
+    "what did I note about benchmark",
+    "show my notes",
+    "search youtube benchmark video {i}",
+    "open benchmark missing app {i}",
+)
+
+
+def build_scenarios():
+    """name -> request(i) returning (path, JSON body)."""
+    image_uri = None
+
+    def image_request(i):
+        nonlocal image_uri
+        if image_uri is None:
+            image_uri = make_image_data_uri()
+        return '/analyze_image', {'query': f"Describe this image ({i}).", 'image_data': image_uri, 'no_cache': True}
+
+    return {
+        'ask': lambda i: ('/ask_stream', {'query': f"Benchmark question number {i}: what is a good name for a cat?", 'no_cache': True}),
+        'clipboard': lambda i: ('/process_clipboard', {'text': make_text(3000, i), 'no_cache': True}),
+        'clipboard_large': lambda i: ('/process_clipboard', {'text': make_text(40000, i), 'no_cache': True}),
+        'image': image_request,
+        'listen': lambda i: ('/listen', {}),
+        'router': lambda i: ('/ask_stream', {'query': ROUTER_QUERIES[i % len(ROUTER_QUERIES)].format(i=i), 'no_cache': True}),
+    }
+
+
+# --- HTTP ---
+def send(port, path, body):
+    """Sends one request. Returns (ok, seconds to first line of the body, seconds to the end)."""
+    started_at = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+    try:
+        connection.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        first_line = response.readline()
+        first_at = time.perf_counter()
+        rest = response.read()
+        ok = response.status < 400 and b"ERROR:" not in first_line + rest
+        return ok, first_at - started_at, time.perf_counter() - started_at
+    except (OSError, http.client.HTTPException):
+        return False, None, time.perf_counter() - started_at
+    finally:
+        connection.close()
+
+
+def get_json(port, path):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- Load generation ---
+def percentile(values, p):
+    """Nearest-rank percentile, in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)] * 1000, 1)
+
+
+def run_scenario(port, request_for, requests, concurrency):
+    for i in range(WARMUP_REQUESTS):
+        send(port, *request_for(-1 - i))
+    results, lock, next_index = [], threading.Lock(), iter(range(requests))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            result = send(port, *request_for(i))
+            with lock:
+                results.append(result)
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    succeeded = [r for r in results if r[0]]
+    return {
+        "requests": requests, "concurrency": concurrency, "errors": requests - len(succeeded),
+        "throughput": round(len(succeeded) / elapsed, 2),
+        "latency_p50_ms": percentile([r[2] for r in succeeded], 50),
+        "latency_p99_ms": percentile([r[2] for r in succeeded], 99),
+        "ttft_p50_ms": percentile([r[1] for r in succeeded], 50),
+        "ttft_p99_ms": percentile([r[1] for r in succeeded], 99),
+    }
+
+
+def start_server(args, port):
+    command = [sys.executable, os.path.join(BENCH_DIR, "offline_server.py"), "--port", str(port), "--server", args.server,
+               "--ttft-ms", str(args.ttft_ms), "--tokens-per-second", str(args.tokens_per_second),
+               "--answer-tokens", str(args.answer_tokens), "--audio-speed", str(args.audio_speed)]
+    if args.wav:
+        command += ["--wav", args.wav]
+    if args.vosk_model:
+        command += ["--vosk-model", args.vosk_model]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR)
+    deadline = time.perf_counter() + args.startup_timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"Offline server exited with status {process.returncode}.")
+        status, body = get_json(port, "/ready")
+        if status == 200:
+            return process, body["components"]
+        time.sleep(0.1)
+    process.terminate()
+    sys.exit("Offline server did not become ready in time.")
+
+
+# --- Regression check ---
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("latency_p99_ms", "ttft_p99_ms"):
+            if result[key] and base[key] and result[key] > base[key] * (1 + tolerance):
+                found.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if base["throughput"] and result["throughput"] < base["throughput"] * (1 - tolerance):
+            found.append(f"{name}: throughput {base['throughput']} -> {result['throughput']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="measured requests per scenario")
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="fake Gemini time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--wav", help="16-bit PCM WAV used as microphone input (default: synthetic)")
+    parser.add_argument("--audio-speed", type=float, default=1.0)
+    parser.add_argument("--vosk-model", help="Vosk model directory (default: the app's vosk_model/model)")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    port = free_port()
+    process, components = start_server(args, port)
+    scenarios = build_scenarios()
+    results = {}
+    try:
+        print(f"{'scenario':<16}{'conc':>5}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'ttft p50':>10}{'ttft p99':>10}")
+        for name in args.scenarios.split(","):
+            if name not in scenarios:
+                sys.exit(f"Unknown scenario '{name}'. Choose from: {DEFAULT_SCENARIOS}")
+            if name == 'listen' and components["vosk"]["state"] != "ready":
+                print(f"{name:<16}skipped: {components['vosk']['error']}")
+                continue
+            if name == 'image' and components["imaging"]["state"] != "ready":
+                print(f"{name:<16}skipped: {components['imaging']['error']}")
+                continue
+            concurrency = 1 if name == 'listen' else args.concurrency
+            result = results[name] = run_scenario(port, scenarios[name], args.requests, concurrency)
+            print(f"{name:<16}{concurrency:>5}{result['throughput']:>9}{result['errors']:>8}{result['latency_p50_ms']!s:>9}"
+                  f"{result['latency_p99_ms']!s:>9}{result['ttft_p50_ms']!s:>10}{result['ttft_p99_ms']!s:>10}")
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"server": args.server, "scenarios": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            found = regressions(results, json.load(f)["scenarios"], args.max_regression)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} against {os.path.basename(args.baseline)}.")
+
+
+if __name__ == "__main__":
+    main()
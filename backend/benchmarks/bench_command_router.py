@@ -0,0 +1,130 @@
+"""Micro-benchmark: compiled CommandRouter vs. the original linear prefix scan.
+
+Usage (from the backend/ directory):
+    python benchmarks/bench_command_router.py [--sizes 8,100,1000,10000] [--queries 2000]
+
+For each template count, the same synthetic query mix is classified by both
+implementations; their decisions are checked for equality before timing.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from command_router import CommandRouter
+
+BASE_TEMPLATES = {
+    "youtube": "https://www.youtube.com/results?search_query={query}",
+    "google": "https://www.google.com/search?q={query}",
+    "bing": "https://www.bing.com/search?q={query}",
+    "duckduckgo": "https://duckduckgo.com/?q={query}",
+    "amazon": "https://www.amazon.com/s?k={query}",
+    "wikipedia": "https://en.wikipedia.org/w/index.php?search={query}",
+    "github": "https://github.com/search?q={query}",
+    "stack overflow": "https://stackoverflow.com/search?q={query}",
+}
+
+
+def legacy_route(query, templates):
+    """Decision logic of the original handle_internal_command, minus side effects."""
+    query_lower = query.lower()
+    if query_lower.startswith(("note:", "remember:")):
+        prefix_len = 5 if query_lower.startswith("note:") else 9
+        return ('note', query[prefix_len:].strip())
+    elif query_lower.startswith(("open ", "search ", "google ", "find ")):
+        target = query[query.find(" ") + 1:].strip()
+        if not target:
+            return ('invalid',)
+        for site_key in templates:
+            patterns_to_check = [f"open {site_key} ", f"search {site_key} for ", f"search {site_key} "]
+            if site_key == "google":
+                patterns_to_check.append("google ")
+            for pattern in patterns_to_check:
+                if query_lower.startswith(pattern):
+                    search_query = query[len(pattern):].strip()
+                    if search_query:
+                        return ('site_search', site_key, search_query)
+        if query_lower.startswith("open "):
+            return ('open', target)
+        return ('web_search', target)
+    return None
+
+
+def router_route(router, query):
+    route = router.route(query)
+    if route is None:
+        return None
+    if route.kind == 'note':
+        return ('note', route.target)
+    if route.kind == 'invalid':
+        return ('invalid',)
+    if route.kind == 'site_search':
+        return ('site_search', route.site, route.search_query)
+    return (route.kind, route.target)
+
+
+def make_templates(count):
+    templates = dict(BASE_TEMPLATES)
+    i = 0
+    while len(templates) < count:
+        # Include multi-word keys and keys sharing prefixes with real ones
+        templates[random.choice(["site", "you", "git", "stack", "shop"]) + f"{i}" + random.choice(["", " docs", " search"])] = f"https://example{i}.com/?q={{query}}"
+        i += 1
+    return templates
+
+
+def make_queries(templates, count):
+    sites = list(templates)
+    shapes = [
+        lambda s: f"open {s} funny cats",
+        lambda s: f"search {s} for electron",
+        lambda s: f"search {s} flask tutorial",
+        lambda s: f"Search {s.upper()} For Mixed Case",
+        lambda s: "google latest ai news",
+        lambda s: "open notepad",
+        lambda s: "open google.com",
+        lambda s: f"open {s}",
+        lambda s: "find cheap flights",
+        lambda s: "note: meeting at 10",
+        lambda s: "what is the capital of france?",
+        lambda s: "search for nothing in particular",
+    ]
+    return [random.choice(shapes)(random.choice(sites)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="8,100,1000,10000", help="Comma-separated template counts")
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+    random.seed(42)
+
+    print(f"{'templates':>10}{'legacy us/query':>18}{'router us/query':>18}{'speedup':>10}")
+    for size in (int(n) for n in args.sizes.split(",")):
+        templates = make_templates(size)
+        queries = make_queries(templates, args.queries)
+        build_start = time.perf_counter()
+        router = CommandRouter(templates)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        for query in queries:
+            expected, actual = legacy_route(query, templates), router_route(router, query)
+            if expected != actual:
+                sys.exit(f"Mismatch for {query!r}: legacy={expected} router={actual}")
+
+        start = time.perf_counter()
+        for query in queries:
+            legacy_route(query, templates)
+        legacy_us = (time.perf_counter() - start) / len(queries) * 1e6
+        start = time.perf_counter()
+        for query in queries:
+            router.route(query)
+        router_us = (time.perf_counter() - start) / len(queries) * 1e6
+        print(f"{size:>10}{legacy_us:>18.2f}{router_us:>18.2f}{legacy_us / router_us:>9.1f}x   (build {build_ms:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark: how much of a query log the local answer stage keeps off the network, and what it costs.
+
+Usage (from the backend/ directory):
+    python benchmarks/bench_local_answers.py [--log benchmarks/sample_queries.txt] [--repeat 200] [--show-gemini]
+
+Each query (one per line; '#' lines are ignored) is classified like
+/ask_stream does it: command router first, then local answers, otherwise
+Gemini. Reported: the share of queries per outcome and local intent, the share
+that no longer needs a Gemini call, and the time the local stage adds per
+query (every query the router does not take pays it, answered or not).
+--show-gemini lists the queries still sent to Gemini, to find new intents.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+from command_router import CommandRouter
+from local_answers import default_local_answers
+
+SITE_KEYS = ("youtube", "google", "bing", "duckduckgo", "amazon", "wikipedia", "github", "stack overflow")
+KNOWN_APPS = {"notepad": "notepad.exe", "chrome": "chrome.exe", "spotify": "spotify.exe", "calculator": "calc.exe"}
+KNOWN_WEBSITES = {"youtube": "https://www.youtube.com", "github": "https://github.com"}
+
+
+def read_queries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(p / 100 * len(ordered)), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=os.path.join(BENCH_DIR, "sample_queries.txt"), help="query log, one query per line")
+    parser.add_argument("--repeat", type=int, default=200, help="timing repetitions per query")
+    parser.add_argument("--show-gemini", action="store_true")
+    args = parser.parse_args()
+
+    router = CommandRouter({key: "https://example.com/?q={query}" for key in SITE_KEYS})
+    local_answers = default_local_answers(lambda: (KNOWN_APPS, KNOWN_WEBSITES))
+    local_answers.answer("what time is it in tokyo") # Loads the time zone names once, as the first such query would
+
+    queries = read_queries(args.log)
+    outcomes, intents, to_gemini, stage_us = Counter(), Counter(), [], []
+    for query in queries:
+        if router.route(query):
+            outcomes['command'] += 1
+            continue
+        started_at = time.perf_counter()
+        for _ in range(args.repeat):
+            result = local_answers.answer(query)
+        stage_us.append((time.perf_counter() - started_at) / args.repeat * 1e6)
+        if result:
+            outcomes['local'] += 1
+            intents[result[0]] += 1
+        else:
+            outcomes['gemini'] += 1
+            to_gemini.append(query)
+
+    total = len(queries)
+    print(f"{total} queries from {os.path.basename(args.log)}")
+    for outcome in ('command', 'local', 'gemini'):
+        print(f"  {outcome:<10}{outcomes[outcome]:>5}  {outcomes[outcome] / total:6.1%}")
+    for intent, count in intents.most_common():
+        print(f"    local/{intent:<22}{count:>4}")
+    non_command = total - outcomes['command']
+    if non_command:
+        print(f"Gemini calls avoided: {outcomes['local']} of {non_command} non-command queries ({outcomes['local'] / non_command:.1%}); "
+              f"network path share {outcomes['gemini'] / total:.1%} of all queries, down from {non_command / total:.1%}")
+        print(f"Local stage per query: mean {sum(stage_us) / len(stage_us):.1f} us, "
+              f"p50 {percentile(stage_us, 50):.1f} us, p99 {percentile(stage_us, 99):.1f} us")
+    if args.show_gemini:
+        print("\nStill sent to Gemini:")
+        for query in to_gemini:
+            print(f"  {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark: indexed NotesStore search vs. a linear scan of notes.txt, and batched appends.
+
+Usage (from the backend/ directory):
+    python benchmarks/bench_notes_store.py [--notes 200000] [--queries 200] [--writers 8]
+
+Builds a synthetic notes.txt in a temporary directory, then measures the
+initial import, re-opening an up-to-date index, search latency for rare,
+common and multi-word queries (first page and a deep page) against scanning
+the file for the same words, and note-taking throughput with and without fsync.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from notes_store import NotesStore, parse_notes, search_terms
+
+VOCABULARY = ("meeting call buy milk eggs dentist appointment project deadline wifi password birthday gift "
+              "flight hotel invoice budget recipe pasta garden plant book movie gym car service tax report "
+              "draft email client review bug deploy server backup photo trip museum concert ticket").split()
+
+
+def make_notes_file(path, count, seed=7):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            words = rng.choices(VOCABULARY, k=rng.randint(4, 12))
+            if i % 1000 == 0:
+                words.append(f"rareword{i // 1000}")
+            day, second = divmod(i, 86400)
+            f.write(f"[2023-{1 + day // 28 % 12:02d}-{1 + day % 28:02d} {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}] "
+                    f"{' '.join(words)}\n")
+
+
+def linear_scan(path, query, limit):
+    """What answering a note query costs without an index: read and scan the whole file."""
+    terms = search_terms(query)
+    with open(path, 'r', encoding='utf-8') as f:
+        matches = [text for _, text in parse_notes(f.read()) if all(term in text.casefold() for term in terms)]
+    return len(matches), matches[-limit:]
+
+
+def time_queries(fn, queries):
+    timings = []
+    for query in queries:
+        started_at = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def bench_writes(directory, fsync, writers, per_writer):
+    notes_file = os.path.join(directory, f"writes_{int(fsync)}.txt")
+    store = NotesStore(notes_file, notes_file + ".db", fsync=fsync)
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=lambda: [store.add(f"note {n}") for n in range(per_writer)]) for _ in range(writers)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    elapsed = time.perf_counter() - started_at
+    stats = store.stats()
+    return writers * per_writer / elapsed, stats["notes_written"] / max(stats["batches_written"], 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=5, help="linear scans are slow; time fewer")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--notes-per-writer", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        notes_file = os.path.join(directory, "notes.txt")
+        db_file = os.path.join(directory, "notes.db")
+        make_notes_file(notes_file, args.notes)
+        print(f"{args.notes} notes, {os.path.getsize(notes_file) / 1e6:.1f} MB")
+
+        started_at = time.perf_counter()
+        store = NotesStore(notes_file, db_file)
+        print(f"initial import: {time.perf_counter() - started_at:.2f}s")
+        started_at = time.perf_counter()
+        store = NotesStore(notes_file, db_file)
+        print(f"re-open (index up to date): {(time.perf_counter() - started_at) * 1000:.1f} ms")
+
+        rng = random.Random(1)
+        query_sets = {
+            "rare word": [f"rareword{rng.randrange(args.notes // 1000)}" for _ in range(args.queries)],
+            "common word": [rng.choice(VOCABULARY) for _ in range(args.queries)],
+            "three words": [" ".join(rng.sample(VOCABULARY, 3)) for _ in range(args.queries)],
+        }
+        print(f"\n{'query':<14}{'index p50 ms':>14}{'p95 ms':>9}{'page 50 p50':>13}{'scan p50 ms':>13}")
+        for name, queries in query_sets.items():
+            p50, p95 = time_queries(lambda q: store.search(q, limit=10), queries)
+            deep_p50, _ = time_queries(lambda q: store.search(q, limit=10, offset=490), queries)
+            scan_p50, _ = time_queries(lambda q: linear_scan(notes_file, q, 10), queries[:args.scan_queries])
+            print(f"{name:<14}{p50:>14.2f}{p95:>9.2f}{deep_p50:>13.2f}{scan_p50:>13.1f}")
+
+        print(f"\n{args.writers} writers x {args.notes_per_writer} notes (each add waits until saved)")
+        for fsync in (True, False):
+            rate, batch = bench_writes(directory, fsync, args.writers, args.notes_per_writer)
+            print(f"fsync={'on ' if fsync else 'off'}: {rate:8.0f} notes/s, {batch:.1f} notes per batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark: journaled registry updates vs. rewriting the whole JSON file per update.
+
+Usage (from the backend/ directory):
+    python benchmarks/bench_registry_store.py [--sizes 100,10000,100000] [--updates 200]
+
+For each registry size, times `--updates` single-entry updates three ways:
+  rewrite   - the original save_json_data: json.dump(indent=4) of the full dict, on the request thread
+  set       - JournaledStore.set, i.e. what the request thread pays now
+  journaled - set + an immediate flush per update (no debounce), including periodic compaction;
+              an upper bound on the background writer's cost
+All variants fsync, so the comparison is like for like.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from registry_store import JournaledStore
+
+
+def make_registry(size):
+    return {f"app {i}": f"C:\\Program Files\\Vendor {i}\\app{i}.exe" for i in range(size)}
+
+
+def legacy_save(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({str(k).lower(): v for k, v in data.items()}, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def per_update_ms(fn, updates):
+    started_at = time.perf_counter()
+    for i in range(updates):
+        fn(i)
+    return (time.perf_counter() - started_at) * 1000 / updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,10000,100000")
+    parser.add_argument("--updates", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'entries':>9}{'rewrite ms':>12}{'set ms':>10}{'journaled ms':>14}   (per update, mean of {args.updates})")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            data = make_registry(size)
+            legacy_path = os.path.join(directory, "legacy.json")
+            rewrite = per_update_ms(lambda i: (data.__setitem__(f"new {i}", "x.exe"), legacy_save(legacy_path, data)), args.updates)
+
+            store_path = os.path.join(directory, "known_apps.json")
+            legacy_save(store_path, make_registry(size))
+            store = JournaledStore(store_path, flush_delay=3600) # Keep the background writer idle
+            store.load()
+            set_only = per_update_ms(lambda i: store.set(f"new {i}", "x.exe"), args.updates)
+            store.flush()
+            journaled = per_update_ms(lambda i: (store.set(f"more {i}", "x.exe"), store.flush()), args.updates)
+            print(f"{size:>9}{rewrite:>12.3f}{set_only:>10.4f}{journaled:>14.3f}   ({store.compactions} compactions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Startup benchmark: time-to-first-ping and time-to-ready of the backend.
+
+Usage (from the backend/ directory, with nothing else listening on port 5111):
+    python benchmarks/bench_startup.py [--runs 5] [--modes eager,background] [--server app.py]
+
+Each run starts a fresh backend process with ZENITH_STARTUP_MODE set, then
+polls /ping and /ready. "eager" loads Gemini and Vosk before serving (the
+original behaviour); "background" serves first and warms them up afterwards.
+Times are measured from process spawn.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_URL = "http://127.0.0.1:5111"
+POLL_INTERVAL = 0.01 # seconds
+
+
+def port_in_use(port=5111):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def get_status(path):
+    """Returns (HTTP status, JSON body), or (None, None) while the server is not accepting connections."""
+    try:
+        with urllib.request.urlopen(BASE_URL + path, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def measure(server, mode, timeout):
+    env = dict(os.environ, ZENITH_STARTUP_MODE=mode)
+    started_at = time.perf_counter()
+    process = subprocess.Popen([sys.executable, server], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_ping = ready = components = None
+    try:
+        while time.perf_counter() - started_at < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{server} exited with code {process.returncode} (is GEMINI_API_KEY set?)")
+            if first_ping is None:
+                status, _ = get_status("/ping")
+                if status == 200:
+                    first_ping = time.perf_counter() - started_at
+            if first_ping is not None:
+                status, body = get_status("/ready")
+                if status == 200:
+                    ready = time.perf_counter() - started_at
+                    components = body["components"]
+                    break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        process.terminate()
+        process.wait()
+    if ready is None:
+        raise RuntimeError(f"{server} was not ready within {timeout}s")
+    return first_ping, ready, components
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="eager,background")
+    parser.add_argument("--server", default="app.py", help="app.py or asgi_app.py")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for readiness per run")
+    args = parser.parse_args()
+
+    if port_in_use():
+        sys.exit("Port 5111 is already in use; stop the running backend first.")
+
+    print(f"{args.server}, {args.runs} runs per mode (median seconds from spawn)")
+    print(f"{'mode':<12}{'first ping':>12}{'ready':>10}   components")
+    for mode in args.modes.split(","):
+        pings, readies = [], []
+        for _ in range(args.runs):
+            first_ping, ready, components = measure(args.server, mode, args.timeout)
+            pings.append(first_ping)
+            readies.append(ready)
+        summary = ", ".join(f"{name}={c['state']}" + (f" {c['seconds']:.2f}s" if c["seconds"] is not None else "")
+                            for name, c in components.items())
+        print(f"{mode:<12}{statistics.median(pings):>12.3f}{statistics.median(readies):>10.3f}   {summary}")
+
+
+if __name__ == "__main__":
+    main()
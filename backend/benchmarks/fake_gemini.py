@@ -0,0 +1,88 @@
+"""Local stand-in for the Gemini model, for benchmarks that must run offline.
+
+Implements the parts of google.generativeai.GenerativeModel the backend uses:
+generate_content / generate_content_async (streamed or not) and
+start_chat().send_message / send_message_async. Answers are filler words,
+produced after `ttft` seconds at `tokens_per_second`, in chunks of
+`chunk_tokens` like the real streaming API.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+FILLER = ("zenith benchmark answer text with enough ordinary words to look like a reply "
+          "from a language model that is thinking about the question").split()
+
+
+class FakeChunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.prompt_feedback = None
+        self.usage_metadata = usage_metadata
+
+
+class FakeGeminiModel:
+    def __init__(self, ttft=0.3, tokens_per_second=80.0, answer_tokens=120, chunk_tokens=8):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+
+    def _plan(self, prompt):
+        """[(delay before chunk, chunk)] for one answer; the last chunk carries usage metadata."""
+        self.calls += 1
+        words = [FILLER[i % len(FILLER)] for i in range(self.answer_tokens)]
+        steps = []
+        for start in range(0, len(words), self.chunk_tokens):
+            part = words[start:start + self.chunk_tokens]
+            delay = self.ttft if start == 0 else len(part) / self.tokens_per_second
+            steps.append((delay, " ".join(part) + " "))
+        prompt_tokens = len(str(prompt)) // 4 + 1
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=len(words),
+                                total_token_count=prompt_tokens + len(words))
+        return steps, usage
+
+    def _chunks(self, steps, usage):
+        return [FakeChunk(text, usage if i == len(steps) - 1 else None) for i, (_, text) in enumerate(steps)]
+
+    # --- Sync API ---
+    def generate_content(self, prompt, stream=False, request_options=None):
+        steps, usage = self._plan(prompt)
+        if stream:
+            return self._stream(steps, usage)
+        time.sleep(sum(delay for delay, _ in steps))
+        return FakeChunk("".join(text for _, text in steps), usage)
+
+    def _stream(self, steps, usage):
+        for (delay, _), chunk in zip(steps, self._chunks(steps, usage)):
+            time.sleep(delay)
+            yield chunk
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    # --- Async API ---
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        steps, usage = self._plan(prompt)
+        if stream:
+            return self._astream(steps, usage)
+        await asyncio.sleep(sum(delay for delay, _ in steps))
+        return FakeChunk("".join(text for _, text in steps), usage)
+
+    async def _astream(self, steps, usage):
+        for (delay, _), chunk in zip(steps, self._chunks(steps, usage)):
+            await asyncio.sleep(delay)
+            yield chunk
+
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = history or []
+
+    def send_message(self, message, stream=False):
+        return self.model.generate_content(message, stream=stream)
+
+    async def send_message_async(self, message, stream=False):
+        return await self.model.generate_content_async(message, stream=stream)
@@ -0,0 +1,94 @@
+"""Runs the backend without a Gemini key, microphone or user data, for benchmarks.
+
+Usage (from the backend/ directory; normally started by bench_backend.py):
+    python benchmarks/offline_server.py [--port 5199] [--server flask|asgi] [--ttft-ms 300]
+        [--tokens-per-second 80] [--answer-tokens 120] [--wav audio.wav] [--audio-speed 1.0]
+        [--vosk-model PATH]
+
+Gemini is replaced by benchmarks/fake_gemini.py and the microphone by a WAV
+file played in a loop (a synthetic one if --wav is not given). /listen also
+needs a Vosk model (--vosk-model, default: the app's vosk_model/model); without
+one, voice stays unavailable like on a machine without the model. Notes and
+registries live in a scratch directory (known websites are copied, known apps
+start empty) and opening browsers is disabled, so command benchmarks have no
+side effects. Per-request logging is off unless --log-level info.
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5199)
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--wav", help="16-bit PCM WAV played as microphone input")
+    parser.add_argument("--audio-speed", type=float, default=1.0, help="playback speed relative to real time")
+    parser.add_argument("--vosk-model", default=os.path.join(BACKEND_DIR, "vosk_model", "model"))
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="zenith-bench-")
+    shutil.copy(os.path.join(BACKEND_DIR, "known_websites.json"), data_dir)
+    with open(os.path.join(data_dir, "known_apps.json"), 'w', encoding='utf-8') as f:
+        f.write("{}") # Nothing to launch
+    os.environ["ZENITH_DATA_DIR"] = data_dir
+    os.environ["ZENITH_STARTUP_MODE"] = "eager"
+
+    import app as zenith
+    logging.getLogger().setLevel(args.log_level.upper())
+    logging.getLogger('werkzeug').setLevel(args.log_level.upper())
+    from fake_gemini import FakeGeminiModel
+    from wav_audio import WavInputStream, read_wav, write_test_wav
+
+    def init_fake_gemini():
+        zenith.gemini_model = FakeGeminiModel(ttft=args.ttft_ms / 1000, tokens_per_second=args.tokens_per_second,
+                                              answer_tokens=args.answer_tokens)
+
+    wav_path = args.wav
+    if not wav_path:
+        wav_path = os.path.join(data_dir, "speech.wav")
+        write_test_wav(wav_path)
+
+    def init_wav_vosk():
+        if not os.path.exists(args.vosk_model):
+            raise FileNotFoundError(f"Vosk model not found at {args.vosk_model}. /listen is not benchmarked.")
+        rate = read_wav(wav_path)[1]
+        model = zenith.vosk.Model(args.vosk_model)
+        zenith.recognizer_pool = zenith.audio_capture.RecognizerPool(model, zenith.audio_frontend.MODEL_SAMPLERATE,
+                                                                     size=zenith.RECOGNIZER_POOL_SIZE)
+        zenith.capture_service = zenith.audio_capture.CaptureService(
+            rate, buffer_seconds=zenith.CAPTURE_BUFFER_SECONDS,
+            stream_factory=lambda **kwargs: WavInputStream(wav_path, speed=args.audio_speed, **kwargs))
+        zenith.vosk_model, zenith.samplerate = model, rate
+
+    zenith.warmup.register('gemini', init_fake_gemini)
+    zenith.warmup.register('vosk', init_wav_vosk)
+    zenith.webbrowser.open = lambda url, new=0: True
+
+    try:
+        zenith.load_startup_data()
+        zenith.start_warmup()
+        print(f"Offline backend ({args.server}) on port {args.port}, data in {data_dir}", flush=True)
+        if args.server == "asgi":
+            import uvicorn
+            import asgi_app
+            uvicorn.run(asgi_app.asgi_app, host='127.0.0.1', port=args.port, log_level=args.log_level)
+        else:
+            zenith.app.run(host='127.0.0.1', port=args.port, debug=False, threaded=True)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""WAV file playback in place of the microphone, for offline /listen benchmarks.
+
+WavInputStream has the sounddevice.InputStream interface CaptureService uses:
+it calls `callback(indata, frames, time_info, status)` from its own thread with
+int16 blocks of the file, paced like a live device (or `speed` times faster),
+looping at the end.
+"""
+import threading
+import time
+import wave
+
+import numpy as np
+
+
+def read_wav(path):
+    """Returns (int16 mono samples, sample rate). Multi-channel files use the first channel."""
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        return samples[::wav.getnchannels()].copy(), wav.getframerate()
+
+
+def write_test_wav(path, samplerate=16000, speech_seconds=1.2, silence_seconds=1.5, seed=0):
+    """Writes a loop of a loud noise burst (counts as speech for the VAD) followed by silence."""
+    rng = np.random.default_rng(seed)
+    burst = (rng.standard_normal(int(samplerate * speech_seconds)) * 3000).clip(-32768, 32767).astype(np.int16)
+    silence = np.zeros(int(samplerate * silence_seconds), dtype=np.int16)
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(samplerate)
+        wav.writeframes(np.concatenate([burst, silence]).tobytes())
+
+
+class WavInputStream:
+    def __init__(self, path, callback, samplerate, channels=1, dtype='int16', blocksize=800, speed=1.0):
+        samples, file_rate = read_wav(path)
+        if file_rate != samplerate:
+            raise ValueError(f"{path} is {file_rate} Hz, capture expects {samplerate} Hz")
+        self.samples = samples
+        self.callback = callback
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.speed = speed
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._play, name="wav-input", daemon=True)
+        self._thread.start()
+
+    def _play(self):
+        position, next_at = 0, time.monotonic()
+        block_seconds = self.blocksize / self.samplerate / self.speed
+        while not self._stop.is_set():
+            block = np.take(self.samples, range(position, position + self.blocksize), mode='wrap')
+            position = (position + self.blocksize) % len(self.samples)
+            self.callback(block.reshape(-1, 1), self.blocksize, None, None)
+            next_at += block_seconds
+            self._stop.wait(max(next_at - time.monotonic(), 0))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        pass
@@ -0,0 +1,101 @@
+"""Map-reduce analysis of large clipboard texts.
+
+A long log or document is split into chunks on structural boundaries
+(paragraphs, then lines, then sentences), each chunk is summarized by its own
+Gemini call on a bounded worker pool (map), and the final answer is streamed
+from a prompt built on the chunk summaries (reduce). The map stage reports
+progress as chunks complete, so the user sees activity before the answer
+starts. Short texts do not come here; they keep the single-call path.
+"""
+import asyncio
+import re
+from concurrent.futures import as_completed
+
+from context_builder import CHARS_PER_TOKEN
+
+# Coarsest first; a piece still too long after the last one is cut at a fixed size
+SEPARATORS = (r"\n\s*\n", r"\n", r"(?<=[.!?])\s+")
+FAILED_SUMMARY = "[This part could not be summarized.]"
+
+
+def split_text(text, max_tokens):
+    """Splits `text` into chunks of at most ~`max_tokens`, preferring paragraph, line and sentence breaks."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for piece in _split_pieces(text, max_chars, 0):
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def _split_pieces(text, max_chars, level):
+    if len(text) <= max_chars:
+        return [text]
+    if level == len(SEPARATORS):
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    parts = re.split(f"({SEPARATORS[level]})", text) # Captured separators land at odd indices
+    pieces = []
+    for i in range(0, len(parts), 2):
+        piece = parts[i] + (parts[i + 1] if i + 1 < len(parts) else "") # Keep each separator with its text
+        pieces.extend(_split_pieces(piece, max_chars, level + 1))
+    return pieces
+
+
+def map_prompt(chunk, index, total):
+    return (f"The following is part {index + 1} of {total} of a long text the user copied to the clipboard.\n\n"
+            f"'''\n{chunk}\n'''\n\n"
+            "Summarize this part in a few sentences or bullet points. Keep key facts, names, numbers, "
+            "errors and conclusions. Do not add an introduction.")
+
+
+def reduce_prompt(summaries, total_chars):
+    parts = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+    return (f"The user copied a long text ({total_chars} characters) to the clipboard. It was split into "
+            f"{len(summaries)} parts, summarized below in order.\n\n{parts}\n\n"
+            "Based on these summaries: what is this text about? Summarize it or explain any key points.")
+
+
+def map_chunks(executor, summarize, chunks):
+    """Runs summarize(prompt) for every chunk on `executor`. Yields ('progress', chunks done) as chunks
+       complete, then ('summaries', list in chunk order). Pending chunks are cancelled if the consumer
+       stops early (client disconnect).
+    """
+    futures = {executor.submit(summarize, map_prompt(chunk, i, len(chunks))): i for i, chunk in enumerate(chunks)}
+    summaries = [FAILED_SUMMARY] * len(chunks)
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                summaries[futures[future]] = future.result() or FAILED_SUMMARY
+            except Exception:
+                pass # summarize logs its own failures; the part is marked as missing in the reduce prompt
+            yield 'progress', done
+        yield 'summaries', summaries
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+async def amap_chunks(semaphore, asummarize, chunks):
+    """Async counterpart of map_chunks; `semaphore` bounds concurrent calls across requests."""
+    async def run(prompt):
+        async with semaphore:
+            return await asummarize(prompt)
+
+    tasks = [asyncio.ensure_future(run(map_prompt(chunk, i, len(chunks)))) for i, chunk in enumerate(chunks)]
+    try:
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            try:
+                await task
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            yield 'progress', done
+        yield 'summaries', [(t.result() if not t.exception() else None) or FAILED_SUMMARY for t in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
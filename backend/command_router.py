@@ -0,0 +1,104 @@
+"""Command router for internal commands (note / note search / open / search / site search).
+
+The router is compiled once from the site-search templates and classifies a
+query in a single pass: the verb is read from the first token and site keys
+are matched with a character trie, so the cost depends on the query length
+rather than on the number of templates. Call `rebuild()` when the templates
+change. Matching rules (and their precedence) are those of the original
+prefix scan in handle_internal_command.
+"""
+import re
+from collections import namedtuple
+
+# kind: 'note' | 'note_search' | 'site_search' | 'open' | 'web_search' | 'invalid'
+Route = namedtuple('Route', ['kind', 'verb', 'target', 'site', 'search_query'])
+
+NOTE_PREFIXES = ("note:", "remember:")
+# "what did I note about X", "search my notes for X", "show my notes" (target may be empty: recent notes)
+NOTE_QUERY_STARTS = ("what did i ", "search ", "find ", "show ", "list ")
+NOTE_QUERY = re.compile(
+    r"^(?:what did i (?:note|write down|save|remember)|(?:search|find|show|list)(?: me)?(?: my)?(?: recent| latest)? notes)\b"
+    r"(?:\s+(?:about|on|regarding|for|with)\b)?\s*(.*?)[\s?.!]*$", re.IGNORECASE | re.DOTALL)
+COMMAND_VERBS = ("open", "search", "google", "find")
+
+# Site-search pattern precedence within one site (lower wins), as in the original scan:
+# "open {site} ", "search {site} for ", "search {site} ", "google " (google only)
+PATTERN_OPEN, PATTERN_SEARCH_FOR, PATTERN_SEARCH, PATTERN_GOOGLE = range(4)
+
+
+class CommandRouter:
+    def __init__(self, site_templates):
+        self.rebuild(site_templates)
+
+    def rebuild(self, site_templates):
+        """Recompiles the site trie. Sites keep their template order for match precedence."""
+        trie = {}
+        order = {}
+        for index, site_key in enumerate(site_templates):
+            node = trie
+            for char in site_key:
+                node = node.setdefault(char, {})
+            node[None] = site_key # Terminal marker
+            order[site_key] = index
+        self._trie = trie
+        self._order = order
+
+    def _sites_prefixing(self, text, start):
+        """Yields (site_key, end) for every site key followed by a space at text[start:]; end is after that space."""
+        node = self._trie
+        for pos in range(start, len(text)):
+            if None in node and text[pos] == " ":
+                yield node[None], pos + 1
+            node = node.get(text[pos])
+            if node is None:
+                return
+
+    def _match_site_search(self, query, query_lower, verb):
+        """Returns (site_key, search_query) for the highest-precedence site-search pattern, or None."""
+        candidates = [] # (site order, pattern precedence, site key, end of pattern)
+        if verb == "open":
+            for site_key, end in self._sites_prefixing(query_lower, 5):
+                candidates.append((self._order[site_key], PATTERN_OPEN, site_key, end))
+        elif verb == "search":
+            for site_key, end in self._sites_prefixing(query_lower, 7):
+                if query_lower.startswith("for ", end):
+                    candidates.append((self._order[site_key], PATTERN_SEARCH_FOR, site_key, end + 4))
+                candidates.append((self._order[site_key], PATTERN_SEARCH, site_key, end))
+        elif verb == "google" and "google" in self._order:
+            candidates.append((self._order["google"], PATTERN_GOOGLE, "google", 7))
+
+        for _, _, site_key, end in sorted(candidates):
+            search_query = query[end:].strip()
+            if search_query:
+                return site_key, search_query
+        return None
+
+    def route(self, query):
+        """Classifies a query. Returns a Route, or None if it is not an internal command."""
+        query_lower = query.lower()
+
+        if query_lower.startswith(NOTE_PREFIXES):
+            prefix_len = 5 if query_lower.startswith("note:") else 9
+            return Route('note', "note", query[prefix_len:].strip(), None, None)
+
+        if query_lower.startswith(NOTE_QUERY_STARTS):
+            match = NOTE_QUERY.match(query)
+            if match:
+                return Route('note_search', query_lower.split(" ", 1)[0], match.group(1), None, None)
+
+        space_index = query_lower.find(" ")
+        verb = query_lower[:space_index] if space_index != -1 else None
+        if verb not in COMMAND_VERBS:
+            return None
+
+        target = query[query.find(" ") + 1:].strip()
+        if not target:
+            return Route('invalid', verb, "", None, None)
+
+        site_match = self._match_site_search(query, query_lower, verb)
+        if site_match:
+            site_key, search_query = site_match
+            return Route('site_search', verb, target, site_key, search_query)
+        if verb == "open":
+            return Route('open', verb, target, None, None)
+        return Route('web_search', verb, target, None, None)
@@ -0,0 +1,189 @@
+"""Token-budgeted conversation context for Gemini requests.
+
+Instead of a fixed number of recent messages, history is packed newest-first
+into a token budget, measured with a fast local estimate (no tokenizer call).
+An oversized message (e.g. a pasted clipboard dump) is cut down to its head
+and tail rather than crowding out everything else.
+
+Messages that no longer fit are replaced by a rolling summary. Summaries are
+cached by a hash of the conversation prefix they cover and computed on a
+background thread: a request uses the summary of the longest prefix already
+summarized, and if that is out of date, schedules the next one, which starts
+from the previous summary and only reads the newly dropped messages.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4            # Rough average for English text with Gemini's tokenizer
+MESSAGE_OVERHEAD_TOKENS = 4    # Role and framing per message
+MIN_PARTIAL_TOKENS = 64        # Don't bother including a truncated message smaller than this
+SUMMARY_ACK = "Understood, I'll keep that context in mind."
+
+# summary: 'current' | 'stale' (older prefix, refresh scheduled) | 'pending' (none yet) | None (nothing dropped)
+ContextStats = namedtuple('ContextStats', ['messages_received', 'messages_sent', 'tokens_full', 'tokens_sent', 'summary'])
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Keeps the head and tail of `text` within roughly `max_tokens`."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n[... {len(text) - head - tail} characters omitted ...]\n{text[-tail:]}"
+
+
+def gemini_turn(role, text):
+    return {'role': role, 'parts': [{'text': text}]}
+
+
+def prefix_hashes(messages):
+    """Hash chain over (role, text) pairs: element i identifies the prefix messages[:i + 1]."""
+    hashes, digest = [], b""
+    for role, text in messages:
+        digest = hashlib.sha256(digest + role.encode() + b"\x00" + text.encode('utf-8')).digest()
+        hashes.append(digest)
+    return hashes
+
+
+class ContextBuilder:
+    def __init__(self, budget_tokens=2000, summary_tokens=300, summarize=None, cache_size=256):
+        """`summarize(previous_summary, messages)` returns a summary string of the previous summary
+           (None for the first) plus [(role, text)] messages. Without it, dropped messages are just dropped.
+        """
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.cache_size = cache_size
+        self._summaries = OrderedDict() # prefix hash -> summary text
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer") if summarize else None
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+        self.summaries_computed = 0
+        self.summary_failures = 0
+        self.summary_hits = 0
+
+    @property
+    def summary_budget(self):
+        return min(self.summary_tokens, self.budget_tokens // 3) # Never let the summary crowd out recent turns
+
+    # --- Packing ---
+    def build(self, chat_history):
+        """Returns (Gemini history, ContextStats) for frontend chat history ({'sender', 'content'} dicts)."""
+        messages = []
+        for msg in chat_history:
+            content = msg.get('content', '')
+            # Ensure content is not empty and is a string before adding
+            if isinstance(content, str) and content.strip():
+                messages.append(("user" if msg.get('sender') == 'user' else "model", content))
+        costs = [estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS for _, text in messages]
+        tokens_full = sum(costs)
+
+        if tokens_full <= self.budget_tokens:
+            window, start, summary_state, summary_turns = messages, 0, None, []
+        else:
+            window_budget = self.budget_tokens - (self.summary_budget if self.summarize else 0)
+            window, start = self._pack(messages, costs, window_budget)
+            summary_turns, summary_state = self._summary_turns(messages[:start], window)
+
+        history = summary_turns + [gemini_turn(role, text) for role, text in window]
+        tokens_sent = sum(estimate_tokens(turn['parts'][0]['text']) + MESSAGE_OVERHEAD_TOKENS for turn in history)
+        stats = ContextStats(len(messages), len(window), tokens_full, tokens_sent, summary_state)
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += tokens_sent
+            self.tokens_saved += max(tokens_full - tokens_sent, 0)
+        return history, stats
+
+    def _pack(self, messages, costs, budget):
+        """Takes messages newest-first while they fit. Returns (window, index of the first message kept)."""
+        window, remaining, start = [], budget, len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            role, text = messages[index]
+            if costs[index] <= remaining:
+                window.append((role, text))
+                remaining -= costs[index]
+                start = index
+                continue
+            # Too big: include a truncated copy if it is the newest message or a useful amount still fits
+            if not window or remaining - MESSAGE_OVERHEAD_TOKENS >= MIN_PARTIAL_TOKENS:
+                window.append((role, truncate_to_tokens(text, max(remaining - MESSAGE_OVERHEAD_TOKENS, MIN_PARTIAL_TOKENS))))
+                start = index
+            break
+        window.reverse()
+        return window, start
+
+    # --- Rolling summaries ---
+    def _summary_turns(self, dropped, window):
+        if not dropped or not self.summarize:
+            return [], None
+        hashes = prefix_hashes(dropped)
+        known_length, summary = 0, None
+        with self._lock:
+            for length in range(len(hashes), 0, -1):
+                summary = self._summaries.get(hashes[length - 1])
+                if summary is not None:
+                    self._summaries.move_to_end(hashes[length - 1])
+                    known_length = length
+                    break
+        if known_length < len(dropped):
+            self._schedule(hashes[-1], summary, dropped[known_length:])
+        if summary is None:
+            return [], 'pending'
+        with self._lock:
+            self.summary_hits += 1
+        text = "Summary of our earlier conversation:\n" + truncate_to_tokens(summary, self.summary_budget)
+        turns = [gemini_turn("user", text)]
+        if window and window[0][0] == "user": # Keep user/model turns alternating
+            turns.append(gemini_turn("model", SUMMARY_ACK))
+        return turns, 'current' if known_length == len(dropped) else 'stale'
+
+    def _schedule(self, prefix_hash, previous_summary, new_messages):
+        with self._lock:
+            if prefix_hash in self._in_flight:
+                return
+            self._in_flight.add(prefix_hash)
+        self._executor.submit(self._compute, prefix_hash, previous_summary, new_messages)
+
+    def _compute(self, prefix_hash, previous_summary, new_messages):
+        try:
+            summary = self.summarize(previous_summary, new_messages)
+            if summary:
+                with self._lock:
+                    self._summaries[prefix_hash] = summary.strip()
+                    while len(self._summaries) > self.cache_size:
+                        self._summaries.popitem(last=False)
+                    self.summaries_computed += 1
+        except Exception as e:
+            logger.warning(f"History summary failed: {e}")
+            with self._lock:
+                self.summary_failures += 1
+        finally:
+            with self._lock:
+                self._in_flight.discard(prefix_hash)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget_tokens": self.budget_tokens,
+                "requests": self.requests,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": self.tokens_saved,
+                "avg_tokens_saved": round(self.tokens_saved / self.requests, 1) if self.requests else 0.0,
+                "summaries_cached": len(self._summaries),
+                "summaries_computed": self.summaries_computed,
+                "summary_hits": self.summary_hits,
+                "summary_failures": self.summary_failures,
+            }
@@ -0,0 +1,424 @@
+"""Resilient calls to the Gemini model, shared by all endpoints.
+
+Every generation goes through GeminiClient, which adds around the model:
+- a priority queue: at most `max_concurrent` calls run at once, and waiting
+  interactive requests (typed or spoken questions, images) are admitted
+  before bulk clipboard work and background history summaries;
+- deadlines: each call (all its attempts together) must finish within
+  `call_timeout`, which is also the SDK request timeout of every attempt, and
+  a stream must deliver its first chunk within `first_chunk_timeout` (retries
+  included; enforced while waiting, not passed to the SDK, whose timeout
+  covers the whole streamed response); a call that cannot get a slot within
+  `queue_timeout` is not made;
+- retries with jittered exponential backoff for transient errors (rate
+  limits, 5xx, timeouts), only before the first chunk, so no text is sent twice;
+- optional hedging: if a stream has produced nothing after `hedge_after`
+  seconds, an identical second request is started and the first to answer
+  wins (the other is abandoned);
+- a circuit breaker: after `failure_threshold` consecutive transient failures
+  calls fail fast with GeminiUnavailableError for `reset_timeout` seconds,
+  then one trial call decides whether to close it again.
+
+The model is looked up on each call (`get_model`), so it can be set up (or
+replaced, e.g. by benchmarks) after the client is created.
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0 # Questions, voice commands, images: someone is watching the answer appear
+PRIORITY_BULK = 1        # Clipboard analysis, including the chunk summaries of large texts
+PRIORITY_BACKGROUND = 2  # History summaries nobody waits for
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk', PRIORITY_BACKGROUND: 'background'}
+
+# Matched by class name so this module does not import the SDK (google.api_core.exceptions)
+TRANSIENT_ERROR_NAMES = {"TooManyRequests", "ResourceExhausted", "InternalServerError", "ServiceUnavailable",
+                         "GatewayTimeout", "DeadlineExceeded", "Aborted", "RetryError"}
+
+GEMINI_ATTEMPTS = metrics.registry.counter('zenith_gemini_attempts_total', "Gemini calls by attempt outcome.", ('outcome',))
+GEMINI_HEDGES = metrics.registry.counter('zenith_gemini_hedges_total', "Hedged stream requests by which request answered first.", ('winner',))
+GEMINI_QUEUE_SECONDS = metrics.registry.histogram('zenith_gemini_queue_seconds', "Time waiting for a Gemini call slot.", ('priority',))
+
+
+class GeminiUnavailableError(Exception):
+    """The call was not attempted: the circuit breaker is open or no call slot freed up in time."""
+
+
+def is_transient(error):
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed' # 'closed' | 'open' | 'half_open'
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go ahead. After reset_timeout an open breaker lets one trial call through."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state, self._trial_running = 'half_open', False
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return self.state == 'closed'
+
+    def retry_after(self):
+        """Seconds until calls are tried again, or 0 if they are allowed now."""
+        with self._lock:
+            if self.state != 'open':
+                return 0
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("Gemini circuit breaker closed.")
+            self.state, self.failures = 'closed', 0
+
+    def release_trial(self):
+        """Ends a call that finished without an outcome (cancelled), so it cannot hold the half-open trial forever."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                logger.warning(f"Gemini circuit breaker open after {self.failures} failures; failing fast for {self.reset_timeout:.0f}s.")
+                self.state, self.opened_at = 'open', time.monotonic()
+
+
+class PriorityGate:
+    """Limits concurrent calls; freed slots go to the waiting call with the best (lowest) priority, then FIFO.
+       Threads and coroutines (any event loop) can wait on the same gate.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._waiting = [] # heap of (priority, seq, threading.Event | (loop, future))
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enter(self, priority, make_waiter):
+        """Takes a free slot (returns None) or queues and returns the waiting entry."""
+        with self._lock:
+            if self.active < self.limit and not self._waiting:
+                self.active += 1
+                return None
+            entry = (priority, next(self._seq), make_waiter())
+            heapq.heappush(self._waiting, entry)
+            return entry
+
+    def _withdraw(self, entry):
+        """Removes a waiter that gave up. Returns False if it had been handed a slot in the meantime."""
+        with self._lock:
+            if entry not in self._waiting:
+                return False
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            return True
+
+    def acquire(self, priority, timeout):
+        entry = self._enter(priority, threading.Event)
+        if entry is None or entry[2].wait(timeout) or not self._withdraw(entry):
+            return True
+        return False
+
+    async def aacquire(self, priority, timeout):
+        loop = asyncio.get_running_loop()
+        entry = self._enter(priority, lambda: (loop, loop.create_future()))
+        if entry is None:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(entry[2][1]), timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if not self._withdraw(entry):
+                self.release() # Handed a slot just as we gave up: pass it on
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def release(self):
+        with self._lock:
+            if not self._waiting:
+                self.active -= 1
+                return
+            waiter = heapq.heappop(self._waiting)[2] # The slot passes straight to the next caller
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+    def queued(self):
+        with self._lock:
+            return len(self._waiting)
+
+
+def close_abandoned(future):
+    """Closes the stream of an attempt nobody waits for anymore, once it has started."""
+    if future.exception() is None:
+        getattr(future.result()[0], 'close', lambda: None)()
+
+
+class GeminiClient:
+    def __init__(self, get_model, max_concurrent=8, queue_timeout=30.0, call_timeout=60.0, first_chunk_timeout=20.0,
+                 retries=2, backoff=0.5, max_backoff=4.0, hedge_after=0.0, breaker=None):
+        self.get_model = get_model
+        self.gate = PriorityGate(max_concurrent)
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.first_chunk_timeout = first_chunk_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after # 0 = no hedging
+        self.breaker = breaker or CircuitBreaker()
+        # Streams wait for their first chunk here, so the deadline holds even while the SDK blocks
+        self._first_chunk_executor = ThreadPoolExecutor(max_workers=max_concurrent * 2, thread_name_prefix="gemini-call")
+
+    def request_options(self, deadline):
+        return {"timeout": max(min(self.call_timeout, deadline - time.monotonic()), 1.0)}
+
+    def backoff_delay(self, attempt):
+        """Full jitter: uniform between 0 and the exponential backoff for this attempt."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @contextlib.contextmanager
+    def _admitted(self):
+        """One attempt, if the breaker lets it through. Its outcome is recorded by the caller (_record / _retry_wait);
+           an attempt that ends without one (cancelled, client gone) releases the breaker's trial slot instead.
+        """
+        if not self.breaker.allow():
+            GEMINI_ATTEMPTS.inc(outcome='rejected')
+            raise GeminiUnavailableError(f"AI service unavailable; retrying in {self.breaker.retry_after():.0f}s")
+        outcome_recorded = False
+        try:
+            yield
+            outcome_recorded = True
+        except Exception:
+            outcome_recorded = True
+            raise
+        finally:
+            if not outcome_recorded:
+                self.breaker.release_trial()
+
+    def _record(self, error):
+        """Feeds an attempt's outcome to the breaker and metrics. Returns True if it is worth retrying."""
+        if error is None:
+            GEMINI_ATTEMPTS.inc(outcome='ok')
+            self.breaker.record_success()
+            return False
+        if is_transient(error):
+            GEMINI_ATTEMPTS.inc(outcome='transient')
+            self.breaker.record_failure()
+            return True
+        GEMINI_ATTEMPTS.inc(outcome='error')
+        self.breaker.record_success() # The service answered; the request itself was bad
+        return False
+
+    def _retry_wait(self, attempt, error, deadline):
+        """Seconds to wait before retrying after `error`, or None to give up."""
+        if not self._record(error) or attempt >= self.retries or self.breaker.retry_after():
+            return None
+        delay = self.backoff_delay(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        logger.warning(f"Gemini call failed ({type(error).__name__}: {error}); retry {attempt + 1}/{self.retries} in {delay:.2f}s.")
+        return delay
+
+    # --- Threaded callers ---
+    def _acquire(self, priority):
+        started_at = time.perf_counter()
+        if not self.gate.acquire(priority, self.queue_timeout):
+            raise GeminiUnavailableError("Too many AI requests in progress")
+        GEMINI_QUEUE_SECONDS.observe(time.perf_counter() - started_at, priority=PRIORITY_NAMES[priority])
+
+    def generate(self, contents, priority=PRIORITY_INTERACTIVE):
+        """Non-streamed generate_content with retries; returns the response."""
+        self._acquire(priority)
+        try:
+            deadline = time.monotonic() + self.call_timeout
+            for attempt in itertools.count():
+                with self._admitted():
+                    try:
+                        response = self.get_model().generate_content(contents, request_options=self.request_options(deadline))
+                    except Exception as e:
+                        delay = self._retry_wait(attempt, e, deadline)
+                        if delay is None:
+                            raise
+                    else:
+                        self._record(None)
+                        return response
+                time.sleep(delay)
+        finally:
+            self.gate.release()
+
+    def stream(self, contents, priority=PRIORITY_INTERACTIVE):
+        """Streamed generate_content: yields response chunks. Failures after the first chunk are raised as they happen."""
+        self._acquire(priority)
+        try:
+            chunks, first = self._open_stream(contents)
+            if first is None:
+                return
+            yield first
+            yield from chunks
+        finally:
+            self.gate.release()
+
+    def _open_stream(self, contents):
+        """Starts a stream and waits for its first chunk, retrying and hedging. Returns (chunk iterator, first chunk)."""
+        call_deadline = time.monotonic() + self.call_timeout # SDK timeout of each attempt: covers the whole stream
+        first_chunk_deadline = time.monotonic() + self.first_chunk_timeout
+        for attempt in itertools.count():
+            with self._admitted():
+                try:
+                    result = self._first_chunk(contents, first_chunk_deadline, call_deadline)
+                except Exception as e:
+                    delay = self._retry_wait(attempt, e, first_chunk_deadline)
+                    if delay is None:
+                        raise
+                else:
+                    self._record(None)
+                    return result
+            time.sleep(delay)
+
+    def _start_attempt(self, contents, call_deadline):
+        chunks = iter(self.get_model().generate_content(contents, stream=True, request_options=self.request_options(call_deadline)))
+        return chunks, next(chunks, None)
+
+    def _first_chunk(self, contents, deadline, call_deadline):
+        """First chunk of the first attempt to answer before `deadline`; attempts themselves run until call_deadline."""
+        attempts = [self._first_chunk_executor.submit(self._start_attempt, contents, call_deadline)]
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after > 0 else None
+        pending, error = set(attempts), None
+        try:
+            while pending:
+                wake_at = min(deadline, hedge_at) if hedge_at else deadline
+                done, pending = wait(pending, timeout=max(wake_at - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if len(attempts) > 1:
+                            GEMINI_HEDGES.inc(winner='hedge' if future is attempts[1] else 'original')
+                        return future.result()
+                    error = future.exception()
+                if hedge_at and time.monotonic() >= hedge_at and pending:
+                    logger.info(f"No Gemini output after {self.hedge_after:.1f}s; sending a hedged request.")
+                    attempts.append(self._first_chunk_executor.submit(self._start_attempt, contents, call_deadline))
+                    pending.add(attempts[-1])
+                    hedge_at = None
+                elif pending and time.monotonic() >= deadline:
+                    raise TimeoutError(f"No response from Gemini within {self.first_chunk_timeout:.0f}s")
+            raise error
+        finally:
+            for future in pending:
+                future.add_done_callback(close_abandoned) # The losing or timed-out attempts
+
+    # --- Async callers ---
+    async def _aacquire(self, priority):
+        started_at = time.perf_counter()
+        if not await self.gate.aacquire(priority, self.queue_timeout):
+            raise GeminiUnavailableError("Too many AI requests in progress")
+        GEMINI_QUEUE_SECONDS.observe(time.perf_counter() - started_at, priority=PRIORITY_NAMES[priority])
+
+    async def agenerate(self, contents, priority=PRIORITY_INTERACTIVE):
+        """Async counterpart of generate()."""
+        await self._aacquire(priority)
+        try:
+            deadline = time.monotonic() + self.call_timeout
+            for attempt in itertools.count():
+                with self._admitted():
+                    try:
+                        response = await self.get_model().generate_content_async(contents, request_options=self.request_options(deadline))
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        delay = self._retry_wait(attempt, e, deadline)
+                        if delay is None:
+                            raise
+                    else:
+                        self._record(None)
+                        return response
+                await asyncio.sleep(delay)
+        finally:
+            self.gate.release()
+
+    async def astream(self, contents, priority=PRIORITY_INTERACTIVE):
+        """Async counterpart of stream(). Cancelling the consumer cancels the upstream call."""
+        await self._aacquire(priority)
+        try:
+            call_deadline = time.monotonic() + self.call_timeout
+            first_chunk_deadline = time.monotonic() + self.first_chunk_timeout
+            for attempt in itertools.count():
+                with self._admitted():
+                    try:
+                        chunks, first = await self._afirst_chunk(contents, first_chunk_deadline, call_deadline)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        delay = self._retry_wait(attempt, e, first_chunk_deadline)
+                        if delay is None:
+                            raise
+                    else:
+                        self._record(None)
+                        break
+                await asyncio.sleep(delay)
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            self.gate.release()
+
+    async def _astart_attempt(self, contents, call_deadline):
+        response = await self.get_model().generate_content_async(contents, stream=True, request_options=self.request_options(call_deadline))
+        chunks = response.__aiter__()
+        try:
+            return chunks, await chunks.__anext__()
+        except StopAsyncIteration:
+            return chunks, None
+
+    async def _afirst_chunk(self, contents, deadline, call_deadline):
+        attempts = [asyncio.create_task(self._astart_attempt(contents, call_deadline))]
+        hedge_at = time.monotonic() + self.hedge_after if self.hedge_after > 0 else None
+        pending, error = set(attempts), None
+        try:
+            while pending:
+                wake_at = min(deadline, hedge_at) if hedge_at else deadline
+                done, pending = await asyncio.wait(pending, timeout=max(wake_at - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(attempts) > 1:
+                            GEMINI_HEDGES.inc(winner='hedge' if task is attempts[1] else 'original')
+                        return task.result()
+                    error = task.exception()
+                if hedge_at and time.monotonic() >= hedge_at and pending:
+                    logger.info(f"No Gemini output after {self.hedge_after:.1f}s; sending a hedged request.")
+                    attempts.append(asyncio.create_task(self._astart_attempt(contents, call_deadline)))
+                    pending.add(attempts[-1])
+                    hedge_at = None
+                elif pending and time.monotonic() >= deadline:
+                    raise TimeoutError(f"No response from Gemini within {self.first_chunk_timeout:.0f}s")
+            raise error
+        finally:
+            for task in pending:
+                task.cancel() # The losing or timed-out attempts
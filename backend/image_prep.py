@@ -0,0 +1,77 @@
+"""Image preprocessing for /analyze_image.
+
+Webcam captures arrive as full-resolution JPEG data URIs. Before they go to
+Gemini they are downscaled to a maximum edge and re-encoded compactly, and a
+perceptual hash (dHash) identifies near-identical frames so earlier answers
+can be reused.
+"""
+import base64
+import io
+import threading
+from collections import deque
+
+from PIL import Image
+
+HASH_SIZE = 8 # dHash grid; 8x8 -> 64-bit hash
+
+
+def decode_data_uri(data_uri):
+    """Returns the raw bytes of a data URI ("data:image/jpeg;base64,...")."""
+    header, encoded = data_uri.split(",", 1)
+    return base64.b64decode(encoded)
+
+
+def prepare_image(image_bytes, max_edge=1024, quality=85):
+    """Downscales so the longest edge is at most `max_edge` and re-encodes as JPEG.
+       Returns (PIL image, JPEG bytes). Raises PIL.UnidentifiedImageError for non-images.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return image, output.getvalue()
+
+
+def perceptual_hash(image):
+    """64-bit difference hash: robust to re-encoding, small lighting changes and sensor noise."""
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            value = (value << 1) | (left > pixels[row * (HASH_SIZE + 1) + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class PerceptualHashIndex:
+    """Maps a frame's hash to a recently seen hash within `max_distance` bits, if any.
+
+    Near-identical frames then share one canonical hash, which can be used in
+    an exact-match cache key. Only the most recent `capacity` hashes are kept.
+    """
+
+    def __init__(self, max_distance=6, capacity=256):
+        self.max_distance = max_distance
+        self._recent = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def canonical(self, image_hash):
+        with self._lock:
+            best = None
+            for known in self._recent:
+                distance = hamming_distance(known, image_hash)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, known)
+            if best is not None:
+                return best[1]
+            self._recent.append(image_hash)
+            return image_hash
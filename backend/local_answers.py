@@ -0,0 +1,364 @@
+"""Local answers for questions that need no language model.
+
+Queries the command router does not handle are checked against a registry of
+intents before going to Gemini: the time and date (also in other time zones),
+time zone conversions, arithmetic, unit conversions and "what apps do you
+know". Each intent is a precompiled regex on the normalized query plus a
+handler that builds the answer; a handler returns None to pass (e.g. an
+unknown unit), and the query goes on to the next intent and finally to
+Gemini. `hints` are substrings of which at least one must occur for the regex
+to be tried at all, so a question that matches nothing costs a few substring
+checks per intent.
+
+Math is evaluated by walking the parsed expression (numbers, + - * / // % **,
+parentheses, a few math functions and constants), never with eval().
+"""
+import ast
+import datetime
+import math
+import operator
+import re
+from collections import namedtuple
+
+Intent = namedtuple('Intent', ['name', 'pattern', 'handler', 'hints'])
+
+MAX_QUERY_CHARS = 200
+MAX_RESULT_BITS = 4096 # Integer results larger than this are refused (e.g. 9**9**9)
+
+
+class LocalAnswers:
+    def __init__(self):
+        self._intents = []
+
+    def register(self, name, pattern, handler, hints=()):
+        """Adds an intent; intents are tried in registration order. handler(match) -> answer text or None."""
+        self._intents.append(Intent(name, re.compile(pattern), handler, tuple(hints)))
+
+    def answer(self, query):
+        """Returns (intent name, answer text), or None if the query is not answerable locally."""
+        text = " ".join(query.lower().split()).rstrip("?.! ")
+        if not text or len(text) > MAX_QUERY_CHARS:
+            return None
+        for intent in self._intents:
+            if intent.hints and not any(hint in text for hint in intent.hints):
+                continue
+            match = intent.pattern.match(text)
+            if match:
+                response = intent.handler(match)
+                if response is not None:
+                    return intent.name, response
+        return None
+
+
+# --- Safe Math ---
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MATH_FUNCTIONS = {
+    'sqrt': math.sqrt, 'abs': abs, 'round': round, 'floor': math.floor, 'ceil': math.ceil,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'ln': math.log, 'log': math.log10, 'exp': math.exp,
+}
+MATH_CONSTANTS = {'pi': math.pi, 'e': math.e}
+# Spoken operators, applied in order before parsing
+MATH_WORDS = [
+    (re.compile(r"\bsquare root of\s*([\d.]+|\([^()]*\))"), r"sqrt(\1)"),
+    (re.compile(r"(\d(?:\.\d+)?)\s*(?:%|percent) of\b"), r"\1/100*"),
+    (re.compile(r"\bdivided by\b"), "/"), (re.compile(r"\bmultiplied by\b|\btimes\b|(?<=[\d)])\s*x\s*(?=[\d(])"), "*"),
+    (re.compile(r"\bplus\b"), "+"), (re.compile(r"\bminus\b"), "-"), (re.compile(r"\bmod(?:ulo)?\b"), "%"),
+    (re.compile(r"\bto the power of\b|\^"), "**"), (re.compile(r"(?<=\d),(?=\d{3}\b)"), ""), # 1,000 -> 1000
+]
+HAS_OPERATOR = re.compile(r"[-+*/%]|\*\*|\b(?:" + "|".join(MATH_FUNCTIONS) + r")\(")
+# Dashes that join numbers without being a minus: dates (2024-10-17, 10-17-2024, 10-07), phone numbers (555-1234)
+NOT_SUBTRACTION = re.compile(r"\d+-\d+-\d+|\b\d{3}-\d{4}\b|\d-0\d")
+
+
+def check_size(value):
+    if isinstance(value, int) and value.bit_length() > MAX_RESULT_BITS:
+        raise ValueError("result too large")
+    return value
+
+
+def eval_node(node):
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in MATH_CONSTANTS:
+        return MATH_CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](eval_node(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = eval_node(node.left), eval_node(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) * math.log2(abs(left) + 2) > MAX_RESULT_BITS:
+            raise ValueError("result too large")
+        return check_size(BINARY_OPERATORS[type(node.op)](left, right))
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in MATH_FUNCTIONS
+            and not node.keywords and 1 <= len(node.args) <= 2):
+        return MATH_FUNCTIONS[node.func.id](*(eval_node(arg) for arg in node.args))
+    raise ValueError("unsupported expression")
+
+
+def safe_eval(expression):
+    """Value of an arithmetic expression. Raises ValueError (or ArithmeticError) for anything else."""
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError("not an expression") from e
+    return eval_node(tree.body)
+
+
+def format_number(value):
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return f"{int(value):,}"
+        return f"{value:,.10g}"
+    return f"{value:,}" if abs(value) < 10 ** 15 else str(value)
+
+
+def answer_math(match):
+    expression = match.group('expr')
+    if NOT_SUBTRACTION.search(expression):
+        return None
+    for pattern, replacement in MATH_WORDS:
+        expression = pattern.sub(replacement, expression)
+    if not HAS_OPERATOR.search(expression):
+        return None # "what is 42", "what is e": nothing to compute
+    try:
+        result = safe_eval(expression)
+    except (ValueError, TypeError, ArithmeticError):
+        return None
+    if isinstance(result, complex) or (isinstance(result, float) and not math.isfinite(result)):
+        return None # inf, nan, (-8)**0.5: better left to Gemini than answered wrong
+    return f"{match.group('expr').strip()} = **{format_number(result)}**"
+
+
+# --- Units ---
+UNITS = {} # name -> (dimension, factor to the dimension's base unit)
+
+def add_units(dimension, factor, *names):
+    for name in names:
+        UNITS[name] = (dimension, factor)
+
+add_units('length', 0.001, "mm", "millimeter", "millimetre")
+add_units('length', 0.01, "cm", "centimeter", "centimetre")
+add_units('length', 1.0, "m", "meter", "metre")
+add_units('length', 1000.0, "km", "kilometer", "kilometre")
+add_units('length', 0.0254, "in", "inch", "inche")
+add_units('length', 0.3048, "ft", "foot", "feet")
+add_units('length', 0.9144, "yd", "yard")
+add_units('length', 1609.344, "mi", "mile")
+add_units('length', 1852.0, "nmi", "nautical mile")
+add_units('mass', 1e-6, "mg", "milligram")
+add_units('mass', 0.001, "g", "gram")
+add_units('mass', 1.0, "kg", "kilo", "kilogram")
+add_units('mass', 1000.0, "t", "tonne", "metric ton")
+add_units('mass', 0.028349523125, "oz", "ounce")
+add_units('mass', 0.45359237, "lb", "lbs", "pound")
+add_units('mass', 6.35029318, "st", "stone")
+add_units('volume', 0.001, "ml", "milliliter", "millilitre")
+add_units('volume', 1.0, "l", "liter", "litre")
+add_units('volume', 3.785411784, "gal", "gallon")
+add_units('volume', 0.946352946, "qt", "quart")
+add_units('volume', 0.473176473, "pt", "pint")
+add_units('volume', 0.2365882365, "cup")
+add_units('volume', 0.0295735295625, "fl oz", "fluid ounce")
+add_units('volume', 0.01478676478125, "tbsp", "tablespoon")
+add_units('volume', 0.00492892159375, "tsp", "teaspoon")
+add_units('time', 0.001, "ms", "millisecond")
+add_units('time', 1.0, "s", "sec", "second")
+add_units('time', 60.0, "min", "minute")
+add_units('time', 3600.0, "h", "hr", "hour")
+add_units('time', 86400.0, "day")
+add_units('time', 604800.0, "week")
+add_units('speed', 1.0, "m/s", "meters per second")
+add_units('speed', 1 / 3.6, "km/h", "kph", "kmh", "kilometers per hour")
+add_units('speed', 0.44704, "mph", "miles per hour")
+add_units('speed', 0.514444, "knot", "kn")
+add_units('data', 0.125, "bit")
+add_units('data', 1.0, "b", "byte")
+add_units('data', 1e3, "kb", "kilobyte")
+add_units('data', 1e6, "mb", "megabyte")
+add_units('data', 1e9, "gb", "gigabyte")
+add_units('data', 1e12, "tb", "terabyte")
+add_units('data', 1024.0, "kib", "kibibyte")
+add_units('data', 1024.0 ** 2, "mib", "mebibyte")
+add_units('data', 1024.0 ** 3, "gib", "gibibyte")
+
+TEMPERATURE_UNITS = {"c": "°C", "celsius": "°C", "°c": "°C", "f": "°F", "fahrenheit": "°F", "°f": "°F", "k": "K", "kelvin": "K"}
+TO_KELVIN = {"°C": lambda v: v + 273.15, "°F": lambda v: (v - 32) * 5 / 9 + 273.15, "K": lambda v: v}
+FROM_KELVIN = {"°C": lambda v: v - 273.15, "°F": lambda v: (v - 273.15) * 9 / 5 + 32, "K": lambda v: v}
+
+
+def lookup_unit(name):
+    """(dimension, factor) for a unit name, accepting plurals ("miles") and "degrees"/"square" free forms."""
+    name = name.strip().removeprefix("a ").removeprefix("an ").removeprefix("degrees ").removeprefix("degree ")
+    if name in TEMPERATURE_UNITS:
+        return 'temperature', TEMPERATURE_UNITS[name]
+    return UNITS.get(name) or (UNITS.get(name[:-1]) if name.endswith("s") else None)
+
+
+def convert_units(value, source, target):
+    """Converted value, or None if the units are unknown or measure different things."""
+    source_unit, target_unit = lookup_unit(source), lookup_unit(target)
+    if not source_unit or not target_unit or source_unit[0] != target_unit[0]:
+        return None
+    if source_unit[0] == 'temperature':
+        return FROM_KELVIN[target_unit[1]](TO_KELVIN[source_unit[1]](value))
+    return value * source_unit[1] / target_unit[1]
+
+
+def unit_label(name):
+    name = name.strip()
+    return TEMPERATURE_UNITS.get(name.removeprefix("degrees "), name)
+
+
+def answer_unit_conversion(match):
+    value = float((match.group('value') or "1").replace(",", ""))
+    converted = convert_units(value, match.group('source'), match.group('target'))
+    if converted is None:
+        return None
+    return f"{format_number(value)} {unit_label(match.group('source'))} = **{format_number(round(converted, 6))}** {unit_label(match.group('target'))}"
+
+
+def answer_how_many(match):
+    value = float((match.group('value') or "1").replace(",", ""))
+    converted = convert_units(value, match.group('source'), match.group('target'))
+    if converted is None:
+        return None
+    return f"There are **{format_number(round(converted, 6))}** {match.group('target')} in {format_number(value)} {match.group('source').strip()}."
+
+
+# --- Time & Time Zones ---
+# Abbreviations with fixed offsets (hours); they need no time zone database
+ZONE_ABBREVIATIONS = {
+    "utc": 0, "gmt": 0, "z": 0, "bst": 1, "cet": 1, "cest": 2, "eet": 2, "eest": 3, "msk": 3, "ist": 5.5,
+    "sgt": 8, "hkt": 8, "jst": 9, "kst": 9, "aest": 10, "aedt": 11, "nzst": 12, "nzdt": 13,
+    "est": -5, "edt": -4, "cst": -6, "cdt": -5, "mst": -7, "mdt": -6, "pst": -8, "pdt": -7, "akst": -9, "hst": -10,
+}
+# Place names that are not the city part of an IANA zone name
+ZONE_ALIASES = {
+    "india": "Asia/Kolkata", "mumbai": "Asia/Kolkata", "delhi": "Asia/Kolkata", "new delhi": "Asia/Kolkata",
+    "bangalore": "Asia/Kolkata", "bengaluru": "Asia/Kolkata", "japan": "Asia/Tokyo", "china": "Asia/Shanghai",
+    "beijing": "Asia/Shanghai", "uk": "Europe/London", "england": "Europe/London", "germany": "Europe/Berlin",
+    "france": "Europe/Paris", "spain": "Europe/Madrid", "italy": "Europe/Rome", "russia": "Europe/Moscow",
+    "australia": "Australia/Sydney", "new zealand": "Pacific/Auckland", "korea": "Asia/Seoul", "brazil": "America/Sao_Paulo",
+    "san francisco": "America/Los_Angeles", "seattle": "America/Los_Angeles", "california": "America/Los_Angeles",
+    "boston": "America/New_York", "washington": "America/New_York", "miami": "America/New_York", "nyc": "America/New_York",
+    "texas": "America/Chicago", "dallas": "America/Chicago", "houston": "America/Chicago", "uae": "Asia/Dubai",
+}
+_zone_names = None # "new york" -> "America/New_York", built on first use
+
+
+def find_zone(place):
+    """tzinfo for a place name or zone abbreviation, or None. Place names need the tz database (tzdata on Windows)."""
+    global _zone_names
+    place = place.strip().removeprefix("the ")
+    if place in ZONE_ABBREVIATIONS:
+        return datetime.timezone(datetime.timedelta(hours=ZONE_ABBREVIATIONS[place]), place.upper())
+    try:
+        import zoneinfo
+        if _zone_names is None:
+            _zone_names = {name.rsplit("/", 1)[-1].replace("_", " ").lower(): name for name in zoneinfo.available_timezones()}
+        name = ZONE_ALIASES.get(place) or _zone_names.get(place)
+        return zoneinfo.ZoneInfo(name) if name else None
+    except (ImportError, zoneinfo.ZoneInfoNotFoundError):
+        return None
+
+
+def format_time(moment):
+    return f"{moment:%I:%M %p}".lstrip("0")
+
+
+def format_date(moment):
+    return f"{moment:%A}, {moment.day} {moment:%B %Y}"
+
+
+def zone_label(place, moment):
+    return moment.tzname() if place.strip() in ZONE_ABBREVIATIONS else f"{place.strip().title()} ({moment.tzname()})"
+
+
+def answer_time(match):
+    return f"It's **{format_time(datetime.datetime.now())}**."
+
+
+def answer_date(match):
+    return f"Today is **{format_date(datetime.datetime.now())}**."
+
+
+def answer_time_in_zone(match):
+    zone = find_zone(match.group('place'))
+    if zone is None:
+        return None
+    now = datetime.datetime.now(zone)
+    return f"It's **{format_time(now)}** on {format_date(now)} in {zone_label(match.group('place'), now)}."
+
+
+def answer_zone_conversion(match):
+    source, target = find_zone(match.group('source')), find_zone(match.group('target'))
+    if source is None or target is None:
+        return None
+    hour, minute = int(match.group('hour')), int(match.group('minute') or 0)
+    meridiem = match.group('meridiem')
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    today = datetime.datetime.now(source)
+    moment = today.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    converted = moment.astimezone(target)
+    day_shift = (converted.date() - moment.date()).days
+    shift = {1: " (next day)", -1: " (previous day)"}.get(day_shift, "")
+    return (f"{format_time(moment)} {zone_label(match.group('source'), moment)} is "
+            f"**{format_time(converted)}**{shift} {zone_label(match.group('target'), converted)}.")
+
+
+# --- Registry ---
+WHAT_IS = r"(?:what(?:'s| is)?(?: the)? |tell me(?: the)? )?"
+NUMBER = r"(?P<value>-?\d[\d,]*(?:\.\d+)?)"
+
+def default_local_answers(known_names):
+    """The built-in intents. known_names() -> (known apps dict, known websites dict) for "what apps do you know"."""
+
+    def answer_known_names(match):
+        apps, websites = known_names()
+        wants, also = match.group('what'), match.group('also')
+        parts = []
+        if not wants.startswith(("website", "site")) or also:
+            parts.append(f"**Apps:** {', '.join(sorted(apps)) or 'none yet'}")
+        if wants.startswith(("website", "site")) or also:
+            parts.append(f"**Websites:** {', '.join(sorted(websites)) or 'none yet'}")
+        return "I can open these by name:\n\n" + "\n\n".join(parts) + "\n\nSay \"open <name>\"; for anything else I'll ask where it is."
+
+    local_answers = LocalAnswers()
+    local_answers.register('time_in_zone',
+                           WHAT_IS + r"(?:current |local )?time(?: is it)?(?: now| right now)? in (?P<place>[a-z .'-]+)$",
+                           answer_time_in_zone, hints=("time in", "time is it in", "now in"))
+    local_answers.register('time',
+                           r"(?:" + WHAT_IS + r"(?:current |local )?time(?: is it)?|time|what time is it)(?: now| right now)?$",
+                           answer_time, hints=("time",))
+    local_answers.register('date',
+                           r"(?:" + WHAT_IS + r"(?:today'?s |current )?date(?: today)?|what day is (?:it|today)(?: today)?|what is today)$",
+                           answer_date, hints=("date", "day"))
+    local_answers.register('time_zone_conversion',
+                           r"(?:convert |what(?:'s| is) )?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>am|pm)? (?:in )?(?P<source>[a-z .]+?)"
+                           r" (?:to|in|into) (?P<target>[a-z .]+?)(?: time)?$",
+                           answer_zone_conversion, hints=(" to ", " in ", " into "))
+    local_answers.register('unit_conversion',
+                           r"(?:convert |what(?:'s| is) )?" + NUMBER + r"\s*(?P<source>[a-z°/ ]+?) (?:to|in|into|as) (?P<target>[a-z°/ ]+)$",
+                           answer_unit_conversion, hints=(" to ", " in ", " into ", " as "))
+    local_answers.register('unit_conversion',
+                           r"how many (?P<target>[a-z°/ ]+?) (?:are )?(?:there )?in (?:an? |" + NUMBER + r" ?)?(?P<source>[a-z°/ ]+)$",
+                           answer_how_many, hints=("how many",))
+    local_answers.register('known_names',
+                           r"(?:what|which) (?P<what>apps|applications|programs|websites|sites)(?P<also> and (?:apps|websites|sites))?"
+                           r" (?:do you know|can you open|are (?:known|saved|registered))$",
+                           answer_known_names, hints=("apps", "applications", "programs", "sites"))
+    local_answers.register('known_names', r"(?:list|show)(?: me)? (?:the |your |my )?(?:known )?(?P<what>apps|websites)(?P<also>)$",
+                           answer_known_names, hints=("apps", "websites"))
+    local_answers.register('math',
+                           r"(?:what(?:'s| is)(?: the)?|calculate|compute|evaluate|solve)?\s*(?P<expr>[-+*/^%().,\d\s a-z]*\d[-+*/^%().,\d\s a-z]*?)\s*=?$",
+                           answer_math)
+    return local_answers
+
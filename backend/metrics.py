@@ -0,0 +1,214 @@
+"""In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Counters and histograms are cheap enough to leave on: an observation is a
+dict lookup, a bisect over the bucket bounds and a few additions under the
+metric's lock. Metrics are created once at import time through `registry`;
+asking for an existing name returns the same metric, so several modules can
+share one (e.g. zenith_persistence_seconds).
+
+Per-request profiling: code timed with `timed(..., profile_as="name")` also
+records the stage into the current profile, if one was started for the
+request (see start_profile). The server turns a profile into a Server-Timing
+header for requests that send `X-Zenith-Profile: 1`.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILE_HEADER = "X-Zenith-Profile"
+
+_profile = contextvars.ContextVar('zenith_profile', default=None) # [(stage, seconds)] of the current request
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {} # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, format_labels(self.labelnames, key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value) # Buckets are upper bounds (le), inclusive
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._series.items())
+        samples = []
+        for key, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                samples.append((self.name + "_bucket", format_labels(self.labelnames, key, [("le", format_value(bound))]), cumulative))
+            samples.append((self.name + "_sum", format_labels(self.labelnames, key), series[-1]))
+            samples.append((self.name + "_count", format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class CallbackMetric:
+    """A value read at scrape time from existing counters, e.g. ResponseCache.stats()."""
+
+    def __init__(self, name, help_text, kind, read, labelname=None):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.read = read # () -> number, or {label value: number} when labelname is set
+        self.labelname = labelname
+
+    def samples(self):
+        value = self.read()
+        if self.labelname is None:
+            return [(self.name, "", value)]
+        return [(self.name, format_labels((self.labelname,), (label,)), v) for label, v in sorted(value.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets)
+
+    def callback(self, name, help_text, kind, read, labelname=None):
+        return self._get_or_create(CallbackMetric, name, help_text, kind, read, labelname)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {format_value(value)}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Timing ---
+class Timer:
+    """Context manager: observes the elapsed time on a histogram and records it as a profile stage."""
+
+    def __init__(self, histogram, profile_as, labels):
+        self.histogram = histogram
+        self.profile_as = profile_as
+        self.labels = labels
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started_at
+        self.histogram.observe(elapsed, **self.labels)
+        if self.profile_as:
+            record_stage(self.profile_as, elapsed)
+        return False
+
+
+def timed(histogram, profile_as=None, **labels):
+    return Timer(histogram, profile_as, labels)
+
+
+# --- Per-request profiles ---
+def start_profile():
+    """Starts collecting stages in the current context (request thread or task). Returns a token for finish_profile."""
+    return _profile.set([])
+
+
+def finish_profile(token):
+    """Stops collecting and returns the [(stage, seconds)] recorded since start_profile."""
+    stages = _profile.get()
+    _profile.reset(token)
+    return stages or []
+
+
+def record_stage(stage, seconds):
+    stages = _profile.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+def profile_requested(headers):
+    return headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+
+
+def server_timing(stages, total_seconds):
+    """Server-Timing header value for profiled stages plus the total; repeated stages are summed."""
+    totals = {}
+    for stage, seconds in stages:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    totals["total"] = total_seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in totals.items())
@@ -0,0 +1,174 @@
+"""Fuzzy, indexed lookup over known app and website names.
+
+Resolves typos ("notpad"), voice-transcription variants ("note pad",
+"vs code") and partial names ("calc") to known entries. Lookups use:
+  * an exact table on the compacted name (lowercase, no spaces/punctuation),
+  * an alias table (initials of multi-word names, e.g. "vsc"),
+  * a sorted table of compacted names for prefix matches,
+  * a character-trigram inverted index for typo candidates, re-scored with
+    edit distance.
+Lookups touch only the postings of the query's trigrams, so they stay fast
+with tens of thousands of entries.
+"""
+import bisect
+import re
+from collections import Counter, namedtuple
+
+Match = namedtuple('Match', ['name', 'kind', 'score'])
+
+DEFAULT_CUTOFF = 0.75 # Minimum score to act on a match without asking
+SUGGESTION_CUTOFF = 0.5 # Minimum score to offer a match as a suggestion
+AMBIGUITY_MARGIN = 0.05 # Top two distinct matches closer than this are ambiguous
+MAX_FUZZY_CANDIDATES = 12 # Trigram candidates re-scored with edit distance
+
+
+def compact_name(text):
+    """Lowercase alphanumerics only: 'Note Pad' -> 'notepad', 'VS-Code' -> 'vscode'."""
+    return re.sub(r'[\W_]+', '', text.lower())
+
+
+def name_initials(text):
+    words = re.findall(r'[^\W_]+', text.lower())
+    return "".join(word[0] for word in words) if len(words) > 1 else ""
+
+
+def trigrams(compact):
+    padded = f"  {compact} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, giving up (returns limit + 1) once it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    def __init__(self, cutoff=DEFAULT_CUTOFF):
+        self.cutoff = cutoff
+        self.clear()
+
+    def clear(self):
+        self._entries = {} # (name, kind) -> compact name
+        self._exact = {} # compact name -> set of (name, kind)
+        self._aliases = {} # initials -> set of (name, kind)
+        self._postings = {} # trigram -> set of compact names
+        self._sorted = [] # sorted distinct compact names, for prefix search
+
+    def build(self, apps, websites):
+        """Rebuilds the index from the known_apps / known_websites dicts."""
+        self.clear()
+        for name in apps:
+            self.add(name, 'app', _resort=False)
+        for name in websites:
+            self.add(name, 'website', _resort=False)
+        self._sorted = sorted(self._exact)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, name, kind, _resort=True):
+        key = (name, kind)
+        if key in self._entries:
+            return
+        compact = compact_name(name)
+        if not compact:
+            return
+        self._entries[key] = compact
+        is_new_compact = compact not in self._exact
+        self._exact.setdefault(compact, set()).add(key)
+        initials = name_initials(name)
+        if initials:
+            self._aliases.setdefault(initials, set()).add(key)
+        if is_new_compact:
+            for gram in trigrams(compact):
+                self._postings.setdefault(gram, set()).add(compact)
+            if _resort:
+                bisect.insort(self._sorted, compact)
+
+    def remove(self, name, kind):
+        key = (name, kind)
+        compact = self._entries.pop(key, None)
+        if compact is None:
+            return
+        initials = name_initials(name)
+        if initials and initials in self._aliases:
+            self._aliases[initials].discard(key)
+            if not self._aliases[initials]: del self._aliases[initials]
+        self._exact[compact].discard(key)
+        if not self._exact[compact]:
+            del self._exact[compact]
+            for gram in trigrams(compact):
+                self._postings[gram].discard(compact)
+                if not self._postings[gram]: del self._postings[gram]
+            index = bisect.bisect_left(self._sorted, compact)
+            if index < len(self._sorted) and self._sorted[index] == compact:
+                del self._sorted[index]
+
+    def _score_compacts(self, query):
+        """Returns {compact name: score} for exact, prefix and trigram candidates."""
+        scores = {}
+        if query in self._exact:
+            scores[query] = 1.0
+
+        # Prefix ("calc" -> "calculator"); cap the scan so very short queries stay cheap
+        start = bisect.bisect_left(self._sorted, query)
+        for compact in self._sorted[start:start + MAX_FUZZY_CANDIDATES]:
+            if not compact.startswith(query):
+                break
+            if compact != query:
+                scores[compact] = max(scores.get(compact, 0.0), 0.7 + 0.25 * len(query) / len(compact))
+
+        # Typos: gather candidates from the rarest half of the query's trigrams (a close match shares
+        # most trigrams, so it appears in at least one of them), rank by shared count, then re-score
+        # the best with edit distance. Common trigrams like "  s" are never scanned.
+        query_grams = trigrams(query)
+        rare_grams = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+        shared = Counter()
+        for postings in rare_grams[:len(rare_grams) // 2 + 1]:
+            shared.update(postings)
+        for compact, _ in shared.most_common(MAX_FUZZY_CANDIDATES):
+            if compact in scores and scores[compact] >= 1.0:
+                continue
+            longest = max(len(compact), len(query))
+            limit = max(1, longest // 3)
+            distance = edit_distance(query, compact, limit)
+            if distance > limit:
+                continue
+            dice = 2.0 * len(query_grams & trigrams(compact)) / (len(query_grams) + len(compact) + 2)
+            similarity = 0.7 * (1.0 - distance / longest) + 0.3 * min(1.0, dice)
+            scores[compact] = max(scores.get(compact, 0.0), similarity)
+        return scores
+
+    def lookup(self, text, limit=5, min_score=SUGGESTION_CUTOFF):
+        """Returns up to `limit` Matches ranked by score (ties: apps first, then name)."""
+        query = compact_name(text)
+        if not query:
+            return []
+        matches = {}
+        for compact, score in self._score_compacts(query).items():
+            for name, kind in self._exact.get(compact, ()):
+                matches[(name, kind)] = score
+        for name, kind in self._aliases.get(query, ()):
+            matches[(name, kind)] = max(matches.get((name, kind), 0.0), 0.9)
+        ranked = sorted((Match(name, kind, round(score, 3)) for (name, kind), score in matches.items() if score >= min_score),
+                        key=lambda m: (-m.score, m.kind != 'app', m.name))
+        return ranked[:limit]
+
+    def best(self, text):
+        """Returns the top Match if it clears the cutoff and is not ambiguous, otherwise None."""
+        ranked = self.lookup(text, limit=2, min_score=self.cutoff)
+        if not ranked:
+            return None
+        if len(ranked) > 1 and ranked[0].name != ranked[1].name and ranked[0].score - ranked[1].score < AMBIGUITY_MARGIN:
+            return None
+        return ranked[0]
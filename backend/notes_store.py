@@ -0,0 +1,226 @@
+"""Indexed, searchable notes store.
+
+notes.txt stays the human-readable record of notes ("[timestamp] text" lines)
+and the source of truth. Every note is also kept in an SQLite database with an
+FTS5 full-text index, so searching does not scan the file. The database records
+how many bytes of notes.txt it has indexed: on open, anything appended since
+(e.g. by an older version or by hand) is imported, and a file that shrank is
+re-imported from scratch. The database can be deleted at any time.
+
+New notes go through a single writer thread. Whatever has queued up while the
+previous batch was being written is committed as one batch: one append to
+notes.txt (optionally fsync'd) and one database transaction.
+"""
+import datetime
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+Note = namedtuple('Note', ['id', 'created_at', 'text'])
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+NOTE_LINE = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] ?(.*)$')
+# Ignored in search queries unless the query has nothing else ("what did I note about my ...")
+STOPWORDS = frozenset("a an and about any are as at did do for from i in is it me my of on or the to was what with".split())
+MAX_BATCH = 512
+IMPORT_CHUNK = 5000 # notes per transaction when importing notes.txt
+
+PERSISTENCE_SECONDS = metrics.registry.histogram('zenith_persistence_seconds', "Time spent writing or querying persisted data.", ('store', 'op'))
+
+
+def parse_notes(text):
+    """Yields (created_at, text) from notes.txt content. Lines without a timestamp continue the previous note."""
+    created_at, parts = None, []
+    for line in text.splitlines():
+        match = NOTE_LINE.match(line)
+        if match:
+            if parts:
+                yield created_at, "\n".join(parts)
+            created_at, parts = match.group(1), [match.group(2)]
+        elif line.strip():
+            parts.append(line)
+    if parts:
+        yield created_at, "\n".join(parts)
+
+
+def search_terms(query):
+    words = re.findall(r"\w+", query.casefold())
+    return [w for w in words if w not in STOPWORDS] or words
+
+
+class _PendingNote:
+    def __init__(self, created_at, text):
+        self.created_at = created_at
+        self.text = text
+        self.done = threading.Event()
+        self.saved = False
+
+
+class NotesStore:
+    def __init__(self, notes_file, db_path, fsync=True):
+        self.notes_file = notes_file
+        self.db_path = db_path
+        self.fsync = fsync
+        self.batches = 0
+        self.notes_written = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL") # notes.txt is the durable copy; the index can catch up from it
+        self._db.execute("CREATE TABLE IF NOT EXISTS notes (id INTEGER PRIMARY KEY, created_at TEXT, text TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(text, content='notes', content_rowid='id')")
+            self.full_text = True
+        except sqlite3.OperationalError:
+            logger.warning("SQLite FTS5 unavailable; note search falls back to substring matching.")
+            self.full_text = False
+        self._db.commit()
+        self.sync_from_file()
+        self._writer = threading.Thread(target=self._write_loop, name="notes-writer", daemon=True)
+        self._writer.start()
+
+    # --- Import ---
+    def _indexed_bytes(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'indexed_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def _insert(self, notes):
+        """Inserts (created_at, text) pairs; caller holds the lock and commits."""
+        for created_at, text in notes:
+            cursor = self._db.execute("INSERT INTO notes (created_at, text) VALUES (?, ?)", (created_at, text))
+            if self.full_text:
+                self._db.execute("INSERT INTO notes_fts (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+
+    def _set_indexed_bytes(self, offset):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('indexed_bytes', ?)", (offset,))
+
+    def sync_from_file(self):
+        """Indexes whatever notes.txt holds beyond what the database has already seen. Returns notes imported."""
+        if not os.path.exists(self.notes_file):
+            return 0
+        with self._lock:
+            offset = self._indexed_bytes()
+            if os.path.getsize(self.notes_file) < offset:
+                logger.info(f"{os.path.basename(self.notes_file)} shrank; rebuilding the notes index.")
+                self._db.execute("DELETE FROM notes")
+                if self.full_text:
+                    self._db.execute("INSERT INTO notes_fts (notes_fts) VALUES ('delete-all')")
+                offset = 0
+            with open(self.notes_file, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            complete = data.rfind(b"\n") + 1 # Leave a partially written last line for next time
+            if complete == 0:
+                self._db.commit()
+                return 0
+            batch, imported = [], 0
+            for note in parse_notes(data[:complete].decode('utf-8', errors='replace')):
+                batch.append(note)
+                if len(batch) >= IMPORT_CHUNK:
+                    self._insert(batch); imported += len(batch); batch = []
+            self._insert(batch); imported += len(batch)
+            self._set_indexed_bytes(offset + complete)
+            self._db.commit()
+        if imported:
+            logger.info(f"Indexed {imported} notes from {os.path.basename(self.notes_file)}.")
+        return imported
+
+    # --- Writes ---
+    def add(self, text, wait=True, timeout=10.0):
+        """Queues a note for the writer thread. With `wait`, returns True once it is on disk."""
+        text = text.strip().encode('utf-8', errors='replace').decode('utf-8') # Lone surrogates (valid in JSON) become '?'
+        pending = _PendingNote(datetime.datetime.now().strftime(TIMESTAMP_FORMAT), text)
+        self._queue.put(pending)
+        if not wait:
+            return True
+        return pending.done.wait(timeout) and pending.saved
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH: # Group commit: take everything queued while the last batch was written
+                try: batch.append(self._queue.get_nowait())
+                except queue.Empty: break
+            try:
+                with metrics.timed(PERSISTENCE_SECONDS, store='notes', op='commit'):
+                    self._write_batch(batch)
+                for pending in batch: pending.saved = True
+            except Exception as e: # Only this batch fails; the writer keeps serving later notes
+                logger.error(f"Error writing {len(batch)} note(s): {e}", exc_info=True)
+            finally:
+                for pending in batch: pending.done.set()
+
+    def _write_batch(self, batch):
+        data = "".join(f"[{p.created_at}] {p.text}{os.linesep}" for p in batch).encode('utf-8')
+        with self._lock:
+            with open(self.notes_file, 'ab') as f:
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                end = f.tell()
+            self.batches += 1
+            self.notes_written += len(batch)
+            # The notes are saved now. If the index offset was current it also covers the new lines;
+            # otherwise (or if indexing fails) the index catches up from notes.txt on next open.
+            try:
+                if self._indexed_bytes() == end - len(data):
+                    self._insert((p.created_at, p.text) for p in batch)
+                    self._set_indexed_bytes(end)
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.warning(f"Notes index update failed: {e}")
+
+    # --- Queries ---
+    def search(self, query, limit=10, offset=0):
+        """Returns (total matches, [Note]) for notes containing all query words (word prefixes match),
+           newest first. Falls back to any word if no note has all of them. An empty query lists recent notes.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return self.recent(limit, offset)
+        total, notes = self._search(terms, " AND ", limit, offset)
+        if total == 0 and len(terms) > 1:
+            total, notes = self._search(terms, " OR ", limit, offset)
+        return total, notes
+
+    def _search(self, terms, operator, limit, offset):
+        with self._lock:
+            if self.full_text:
+                expression = operator.join(f'"{term}"*' for term in terms)
+                total = self._db.execute("SELECT count(*) FROM notes_fts WHERE notes_fts MATCH ?", (expression,)).fetchone()[0]
+                rows = self._db.execute(
+                    "SELECT notes.id, notes.created_at, notes.text FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+                    "WHERE notes_fts MATCH ? ORDER BY notes_fts.rowid DESC LIMIT ? OFFSET ?", # rowid order stops at LIMIT; rank would sort every match
+                    (expression, limit, offset)).fetchall()
+            else:
+                where = operator.join("text LIKE ?" for _ in terms)
+                params = [f"%{term}%" for term in terms]
+                total = self._db.execute(f"SELECT count(*) FROM notes WHERE {where}", params).fetchone()[0]
+                rows = self._db.execute(f"SELECT id, created_at, text FROM notes WHERE {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                                        params + [limit, offset]).fetchall()
+        return total, [Note(*row) for row in rows]
+
+    def recent(self, limit=10, offset=0):
+        """Returns (total notes, [Note]) newest first."""
+        with self._lock:
+            total = self._db.execute("SELECT count(*) FROM notes").fetchone()[0]
+            rows = self._db.execute("SELECT id, created_at, text FROM notes ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return total, [Note(*row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT count(*) FROM notes").fetchone()[0]
+        return {"notes": count, "full_text": self.full_text, "fsync": self.fsync,
+                "batches_written": self.batches, "notes_written": self.notes_written}
@@ -0,0 +1,188 @@
+"""Journaled persistence for the known_apps / known_websites registries.
+
+Each registry is a JSON snapshot (the familiar, hand-editable known_apps.json)
+plus an append-only journal of changes next to it (known_apps.json.journal, one
+JSON line per change). Updates change the in-memory dict at once; a background
+thread appends them to the journal after a short debounce, so a burst of
+updates costs one small write instead of a full rewrite each. Once the journal
+grows as long as the registry itself it is compacted: the snapshot is written to a temporary file
+and atomically renamed over the old one, then the journal is emptied.
+
+Loading reads the snapshot and replays the journal. Replaying is idempotent
+and a torn last journal line (crash mid-append) is ignored, so a crash at any
+point leaves either the old or the new state, never a truncated registry.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FLUSH_DELAY = 0.5      # seconds to wait for more updates before writing the journal
+COMPACT_AFTER = 200    # journal entries that trigger a snapshot rewrite (at least one per registry entry)
+
+PERSISTENCE_SECONDS = metrics.registry.histogram('zenith_persistence_seconds', "Time spent writing or querying persisted data.", ('store', 'op'))
+
+
+def normalize_keys(data):
+    return {str(k).lower(): v for k, v in data.items()}
+
+
+class JournaledStore:
+    def __init__(self, snapshot_path, flush_delay=FLUSH_DELAY, compact_after=COMPACT_AFTER, fsync=True):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + ".journal"
+        self.flush_delay = flush_delay
+        self.compact_after = compact_after
+        self.fsync = fsync
+        self.data = {}
+        self.journal_entries = 0
+        self.journal_writes = 0
+        self.compactions = 0
+        self._pending = [] # Changes not yet in the journal: ("set", key, value) / ("del", key)
+        self._lock = threading.Lock()       # Guards data and _pending
+        self._io_lock = threading.Lock()    # Serializes journal/snapshot writes
+        self._wake = threading.Event()
+        self._writer = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.snapshot_path)
+
+    # --- Loading ---
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            logger.info(f"{self.name} not found. Creating.")
+            self._write_snapshot({})
+            return {}
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                return normalize_keys(json.load(f))
+        except (json.JSONDecodeError, AttributeError) as e:
+            # Keep the unreadable file for the user instead of overwriting it at the next compaction
+            backup_path = self.snapshot_path + ".corrupt"
+            logger.error(f"JSON Decode Error loading {self.name}: {e}. Moved it to {os.path.basename(backup_path)}.")
+            os.replace(self.snapshot_path, backup_path)
+            return {}
+
+    def _replay_journal(self, data):
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring incomplete entry in {os.path.basename(self.journal_path)}.")
+                    continue
+                if change[0] == "set":
+                    data[change[1]] = change[2]
+                else:
+                    data.pop(change[1], None)
+                replayed += 1
+        return replayed
+
+    def load(self):
+        """Loads snapshot + journal and starts the background writer. Returns the live dict."""
+        try:
+            data = self._read_snapshot()
+            self.journal_entries = self._replay_journal(data)
+        except OSError as e:
+            logger.error(f"Error loading {self.name}: {e}", exc_info=True)
+            data = {}
+        with self._lock:
+            self.data.clear()
+            self.data.update(data)
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+            logger.info(f"{self.name}: replayed {self.journal_entries} journal entries.")
+            with self._io_lock:
+                self._compact() # Start from a clean journal, so a torn last line cannot swallow the next append
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name=f"journal-{self.name}", daemon=True)
+            self._writer.start()
+        return self.data
+
+    # --- Updates ---
+    def set(self, key, value):
+        with self._lock:
+            self.data[key] = value
+            self._pending.append(("set", key, value))
+        self._wake.set()
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self.data:
+                return
+            del self.data[key]
+            self._pending.append(("del", key))
+        self._wake.set()
+
+    # --- Writing ---
+    def _write_loop(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.flush_delay) # Debounce: let a burst of updates collect
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes pending changes to the journal now, compacting if it has grown long."""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                try:
+                    with metrics.timed(PERSISTENCE_SECONDS, store=self.name, op='journal_append'), open(self.journal_path, 'a', encoding='utf-8') as f:
+                        f.write("".join(json.dumps(change) + "\n" for change in pending))
+                        f.flush()
+                        if self.fsync:
+                            os.fsync(f.fileno())
+                    self.journal_entries += len(pending)
+                    self.journal_writes += 1
+                except OSError as e:
+                    logger.error(f"Error writing {os.path.basename(self.journal_path)}: {e}", exc_info=True)
+                    with self._lock:
+                        self._pending[:0] = pending # Retry with the next flush
+                    return
+            if self.journal_entries >= max(self.compact_after, len(self.data)): # Keeps compaction O(1) amortized per update
+                self._compact()
+
+    def _write_snapshot(self, data):
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path) # Atomic: readers see the old or the new file, never a partial one
+
+    def _compact(self):
+        """Rewrites the snapshot from memory and empties the journal. Caller holds _io_lock."""
+        with self._lock:
+            data = dict(self.data)
+        try:
+            with metrics.timed(PERSISTENCE_SECONDS, store=self.name, op='compact'):
+                self._write_snapshot(data)
+            # A crash here replays the journal onto the new snapshot, which is harmless (changes are idempotent)
+            open(self.journal_path, 'w').close()
+            self.journal_entries = 0
+            self.compactions += 1
+            logger.info(f"Compacted {self.name} ({len(data)} entries).")
+        except OSError as e:
+            logger.error(f"Error compacting {self.name}: {e}", exc_info=True)
+
+    def close(self):
+        """Flushes pending changes and compacts, e.g. at shutdown."""
+        self.flush()
+        with self._io_lock:
+            if self.journal_entries:
+                self._compact()
+
+    def stats(self):
+        return {"entries": len(self.data), "journal_entries": self.journal_entries, "pending": len(self._pending),
+                "journal_writes": self.journal_writes, "compactions": self.compactions}
@@ -0,0 +1,141 @@
+"""Cache for streamed Gemini answers.
+
+Keys combine the request kind, the normalized query text and a hash of the
+formatted history sent with it, so a cached answer is only reused for the same
+question in the same conversational context. Entries are evicted LRU-first
+and expire after a TTL. An optional SQLite file keeps entries across restarts.
+Answers are stored as the exact stream lines that were sent, so a hit can be
+replayed through the same chunked response format.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query."""
+    return " ".join(text.split()).casefold()
+
+
+def make_cache_key(kind, query, gemini_history):
+    history_hash = hashlib.sha256(json.dumps(gemini_history, sort_keys=True).encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{kind}\x00{normalize_query(query)}\x00{history_hash}".encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=3600, db_path=None, max_disk_entries=5000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._entries = OrderedDict() # key -> (stored_at, lines)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL, lines TEXT)")
+                self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - ttl,))
+                self._db.commit()
+                logger.info(f"Response cache backed by {os.path.basename(db_path)}.")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open response cache database '{db_path}': {e}. Using memory only.")
+                self._db = None
+
+    def _load_from_disk(self, key):
+        row = self._db.execute("SELECT stored_at, lines FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def get(self, key):
+        """Returns the cached stream lines for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                try:
+                    entry = self._load_from_disk(key)
+                except (sqlite3.Error, ValueError) as e:
+                    logger.warning(f"Response cache read failed: {e}")
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is None or now - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, lines):
+        stored_at = time.time()
+        with self._lock:
+            self._entries[key] = (stored_at, list(lines))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.stores += 1
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, stored_at, json.dumps(lines)))
+                    self._db.execute("DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+                                     (self.max_disk_entries,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Response cache write failed: {e}")
+
+    def record_events(self, key, events):
+        """Passes typed stream events (stream_protocol) through, storing the answer once the stream completes
+           without an error or safety block. Deltas are stored as plain text stream lines, so a hit can be
+           replayed in either format; progress and usage events are not stored.
+        """
+        collected = []
+        for event in events:
+            if event.type in ('error', 'blocked'):
+                collected = None
+            elif collected is not None and event.type == 'delta':
+                collected.append(event.data + "\n")
+            yield event
+        # Not reached if the client disconnects mid-stream, so partial answers are never stored
+        if collected:
+            self.put(key, collected)
+
+    async def arecord_events(self, key, events):
+        """Async counterpart of record_events()."""
+        collected = []
+        async for event in events:
+            if event.type in ('error', 'blocked'):
+                collected = None
+            elif collected is not None and event.type == 'delta':
+                collected.append(event.data + "\n")
+            yield event
+        if collected:
+            self.put(key, collected)
+
+    def replay(self, lines):
+        """Yields cached lines in the same format they were originally streamed in."""
+        yield from lines
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": self._db is not None,
+            }
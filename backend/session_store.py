@@ -0,0 +1,89 @@
+"""Server-side conversation sessions.
+
+The renderer owns the chat history, but re-sending its recent window with
+every request repeats the same messages (often long clipboard texts) over and
+over. Instead the backend mirrors each conversation's history under a
+client-chosen id, and a request only carries the messages the backend has not
+seen yet, typically the previous answer and the new question.
+
+Request fields:
+    conversation_id  id of the conversation (a new one after "clear chat")
+    history_offset   position of history[0] in the client's full history
+    history_delta    true if `history` continues what the backend already holds;
+                     false (or missing) if it is a complete context window
+
+A delta the backend cannot apply (session evicted, backend restarted, or a gap)
+is refused, and the client re-sends its full context window instead.
+Sessions are evicted least-recently-used first.
+"""
+import threading
+from collections import OrderedDict
+
+
+class Session:
+    def __init__(self, base, messages):
+        self.base = base # Position of messages[0] in the client's history
+        self.messages = messages
+
+    @property
+    def end(self):
+        return self.base + len(self.messages)
+
+
+class SessionStore:
+    def __init__(self, max_sessions=64, max_messages=200):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions = OrderedDict() # conversation id -> Session
+        self._lock = threading.Lock()
+        self.deltas = 0
+        self.resets = 0
+        self.seeds = 0
+        self.evictions = 0
+        self.messages_received = 0
+        self.messages_reused = 0
+
+    def sync(self, conversation_id, offset, messages, delta):
+        """Applies a request's history to its session and returns the session's full message list,
+           or None if `messages` is a delta the store cannot apply.
+        """
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+            if delta:
+                if session is None or not session.base <= offset <= session.end:
+                    self.resets += 1
+                    return None
+                # Anything the server holds from `offset` on is replaced, so a client-side edit or retry is harmless
+                reused = offset - session.base
+                session.messages = session.messages[:reused] + list(messages)
+                self.deltas += 1
+                self.messages_reused += reused
+            else:
+                session = Session(offset, list(messages))
+                self.seeds += 1
+            self.messages_received += len(messages)
+
+            if len(session.messages) > self.max_messages:
+                # Trim in one large step so the retained prefix (and its cached summary) stays stable for a while
+                drop = len(session.messages) - self.max_messages // 2
+                session.messages = session.messages[drop:]
+                session.base += drop
+            self._sessions[conversation_id] = session
+            self._sessions.move_to_end(conversation_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            return list(session.messages)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "delta_requests": self.deltas,
+                "full_requests": self.seeds,
+                "resets": self.resets,
+                "evictions": self.evictions,
+                "messages_received": self.messages_received,
+                "messages_reused": self.messages_reused,
+            }
@@ -0,0 +1,146 @@
+"""Single-flight coalescing of identical in-flight Gemini streams.
+
+A double-click, a retry after a failed fetch or the same clipboard sent twice
+would otherwise start a second generation for a prompt that is already being
+answered. Requests with the same key (the response cache key: kind, query and
+history hash, or image hash) share one stream instead: the first one starts it,
+later ones replay the events produced so far and then receive new events as
+they arrive. Each subscriber reads at its own pace from the shared event list.
+
+The stream is closed (threaded server) or its task cancelled (async server)
+only when the last subscriber has gone, so one client pressing Stop does not
+cut off another. A finished stream is forgotten at once; an identical request
+after that is a cache hit or a new generation.
+
+Threaded subscribers (follow) and async ones (afollow) never share a stream,
+even for the same key: a stream is pulled by its threaded subscribers or pumped
+by a task, not both. Under the async server, Flask routes behind the WSGI
+bridge (e.g. /batch) follow threaded streams of their own.
+"""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """One shared stream: the events produced so far and who is reading them."""
+
+    def __init__(self, key, source):
+        self.key = key
+        self.source = source # Event iterator (threaded server) or async iterator (async server)
+        self.events = []
+        self.done = False
+        self.subscribers = 0
+        self.lock = threading.Lock() # Threaded server: held by the subscriber pulling the next event
+        self.task = None             # Async server: task pumping source into events
+        self.changed = None          # Async server: set (and replaced) whenever events grow or the stream ends
+
+    def wake(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {} # key -> Flight
+        self._lock = threading.Lock()
+        self.started = 0
+        self.joined = 0
+
+    def _join(self, key, make_source):
+        """Returns (flight, joined) with the caller counted as a subscriber."""
+        with self._lock:
+            flight = self._flights.get(key)
+            joined = flight is not None
+            if joined:
+                self.joined += 1
+            else:
+                flight = self._flights[key] = Flight(key, make_source())
+                self.started += 1
+            flight.subscribers += 1
+        if joined:
+            logger.info(f"Joined an in-flight stream for an identical request ({flight.subscribers} subscribers).")
+        return flight, joined
+
+    def _finish(self, flight):
+        with self._lock:
+            flight.done = True
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def _leave(self, flight):
+        """Drops a subscriber. Returns True if it was the last one of an unfinished stream, which is then forgotten."""
+        with self._lock:
+            flight.subscribers -= 1
+            abandoned = flight.subscribers == 0 and not flight.done
+            if abandoned and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        return abandoned
+
+    def follow(self, key, make_source):
+        """Events of the stream for `key`: a running one, or make_source() started now.
+           Nothing is started until the first event is requested.
+        """
+        flight, _ = self._join(('thread', key), make_source)
+        index = 0
+        try:
+            while True:
+                if index < len(flight.events):
+                    yield flight.events[index]
+                    index += 1
+                    continue
+                if flight.done:
+                    return
+                with flight.lock: # Whoever needs the next event first pulls it for everyone
+                    if index < len(flight.events) or flight.done:
+                        continue
+                    try:
+                        flight.events.append(next(flight.source))
+                    except StopIteration:
+                        self._finish(flight)
+                    except BaseException:
+                        if getattr(flight.source, 'gi_frame', None) is None: # The source itself failed and is over
+                            self._finish(flight)
+                        raise
+        finally:
+            if self._leave(flight):
+                flight.source.close() # Last subscriber gone: stops the upstream generation
+
+    async def afollow(self, key, make_source):
+        """Async counterpart of follow(); make_source() returns an async iterator, pumped by its own task."""
+        flight, joined = self._join(('async', key), make_source)
+        if not joined:
+            flight.changed = asyncio.Event()
+            flight.task = asyncio.create_task(self._pump(flight))
+        index = 0
+        try:
+            while True:
+                if index < len(flight.events):
+                    yield flight.events[index]
+                    index += 1
+                elif flight.done:
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            if self._leave(flight):
+                flight.task.cancel() # Last subscriber gone: cancels the upstream call
+
+    async def _pump(self, flight):
+        try:
+            async for event in flight.source:
+                flight.events.append(event)
+                flight.wake()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Shared stream failed: {e}", exc_info=True)
+        finally:
+            self._finish(flight)
+            flight.wake()
+
+    def stats(self):
+        with self._lock:
+            return {"started": self.started, "joined": self.joined, "in_flight": len(self._flights)}
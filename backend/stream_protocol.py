@@ -0,0 +1,239 @@
+"""Framed streaming protocol for Gemini answers.
+
+By default answers stream as text/plain: each Gemini chunk followed by a
+newline, with ERROR: and PROGRESS: lines in-band. A client that sends
+`"stream_format": "ndjson"` (or `"sse"`) in the request body gets typed events
+instead, and answer text arrives exactly as generated:
+
+    {"type": "delta", "text": "..."}
+    {"type": "progress", "done": 3, "total": 12}         (large clipboard texts)
+    {"type": "blocked", "reason": "SAFETY"}
+    {"type": "error", "message": "..."}
+    {"type": "usage", "prompt_tokens": 812, "output_tokens": 240, "total_tokens": 1052}
+    {"type": "done", "ok": true, "cache": "miss", "ttft_ms": 420.5, "duration_ms": 2210.0, "deltas": 9, "chars": 1180}
+
+NDJSON sends one JSON object per line; SSE sends `event: <type>` and
+`data: <json>` frames. `done` is always the last event of a complete stream;
+ttft_ms is the time from receiving the request to the first answer text.
+
+Deltas are coalesced: the first one is sent at once (it sets the time to first
+token), later ones are held until COALESCE_CHARS have collected or
+COALESCE_MS have passed since the last send. Any other event, and an explicit
+`flush` event from the producer, sends what is held first. The async server
+enforces the time limit with a timer; the threaded server checks it as chunks
+arrive.
+"""
+import asyncio
+import json
+import time
+from collections import namedtuple
+
+# type: 'delta' (data: text) | 'progress' ((done, total)) | 'blocked' (reason) | 'error' (message)
+#       | 'usage' (dict) | 'flush' (None; producer hint, never sent)
+StreamEvent = namedtuple('StreamEvent', ['type', 'data'])
+
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def requested_format(data):
+    """Returns 'ndjson' / 'sse' if the request body asks for a framed stream, else None (plain text)."""
+    stream_format = (data or {}).get('stream_format')
+    return stream_format if stream_format in MIMETYPES else None
+
+
+def usage_event(usage_metadata):
+    """Usage event from a Gemini response's usage_metadata, or None if it is missing."""
+    if not usage_metadata or not usage_metadata.total_token_count:
+        return None
+    return StreamEvent('usage', {"prompt_tokens": usage_metadata.prompt_token_count,
+                                 "output_tokens": usage_metadata.candidates_token_count,
+                                 "total_tokens": usage_metadata.total_token_count})
+
+
+# --- Plain text stream ---
+def legacy_lines(events, blocked_line, failed_line):
+    """Renders events as the original newline-delimited text stream."""
+    for event in events:
+        if event.type == 'delta':
+            yield event.data + "\n"
+        elif event.type == 'progress':
+            yield f"PROGRESS: {event.data[0]}/{event.data[1]}\n"
+        elif event.type == 'blocked':
+            yield blocked_line.format(reason=event.data)
+        elif event.type == 'error':
+            yield failed_line.format(error=event.data)
+
+
+async def alegacy_lines(events, blocked_line, failed_line):
+    async for event in events:
+        if event.type == 'delta':
+            yield event.data + "\n"
+        elif event.type == 'progress':
+            yield f"PROGRESS: {event.data[0]}/{event.data[1]}\n"
+        elif event.type == 'blocked':
+            yield blocked_line.format(reason=event.data)
+        elif event.type == 'error':
+            yield failed_line.format(error=event.data)
+
+
+def cached_events(lines):
+    """Events for an answer stored by the response cache (lines of the plain text stream)."""
+    for line in lines:
+        yield StreamEvent('delta', line[:-1] if line.endswith("\n") else line)
+
+
+# --- Coalescing ---
+class Coalescer:
+    """Delta batching state shared by coalesce() and acoalesce()."""
+
+    def __init__(self, max_chars, max_delay):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self.held = []
+        self.held_chars = 0
+        self.last_sent = None # None until the first delta went out
+
+    def add(self, text):
+        """Holds `text`; returns a delta event to send now, or None."""
+        self.held.append(text)
+        self.held_chars += len(text)
+        if self.last_sent is None or self.held_chars >= self.max_chars or self.remaining() <= 0:
+            return self.take()
+        return None
+
+    def remaining(self):
+        """Seconds until held text is due."""
+        return self.max_delay - (time.perf_counter() - self.last_sent)
+
+    def take(self):
+        if not self.held:
+            return None
+        event = StreamEvent('delta', "".join(self.held))
+        self.held, self.held_chars, self.last_sent = [], 0, time.perf_counter()
+        return event
+
+
+def coalesce(events, max_chars, max_delay):
+    """Batches delta events (see module docstring). max_chars <= 0 disables batching."""
+    if max_chars <= 0:
+        yield from events
+        return
+    batch = Coalescer(max_chars, max_delay)
+    for event in events:
+        if event.type == 'delta':
+            ready = batch.add(event.data)
+            if ready:
+                yield ready
+            continue
+        held = batch.take()
+        if held:
+            yield held
+        if event.type != 'flush':
+            yield event
+    held = batch.take()
+    if held:
+        yield held
+
+
+async def acoalesce(events, max_chars, max_delay):
+    """Async coalesce(); held text is also sent when the time limit passes while waiting for the next event."""
+    if max_chars <= 0:
+        async for event in events:
+            yield event
+        return
+    batch = Coalescer(max_chars, max_delay)
+    iterator = events.__aiter__()
+    next_event = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(iterator.__anext__())
+            if batch.held:
+                await asyncio.wait({next_event}, timeout=max(batch.remaining(), 0))
+                if not next_event.done():
+                    yield batch.take() # Time limit passed; keep waiting for the same event
+                    continue
+            try:
+                event = await next_event
+            except StopAsyncIteration:
+                break
+            finally:
+                next_event = None
+            if event.type == 'delta':
+                ready = batch.add(event.data)
+                if ready:
+                    yield ready
+                continue
+            held = batch.take()
+            if held:
+                yield held
+            if event.type != 'flush':
+                yield event
+        held = batch.take()
+        if held:
+            yield held
+    finally:
+        if next_event is not None:
+            next_event.cancel()
+
+
+# --- Framing ---
+def encode(event_type, payload, stream_format):
+    body = json.dumps({"type": event_type, **payload})
+    if stream_format == 'sse':
+        return f"event: {event_type}\ndata: {body}\n\n"
+    return body + "\n"
+
+
+class StreamStamps:
+    """Per-stream timing and size counters reported in the done event."""
+
+    def __init__(self, started_at, cache):
+        self.started_at = started_at
+        self.cache = cache
+        self.first_delta_at = None
+        self.deltas = 0
+        self.chars = 0
+        self.ok = True
+
+    def encode(self, event, stream_format):
+        if event.type == 'delta':
+            if self.first_delta_at is None:
+                self.first_delta_at = time.perf_counter()
+            self.deltas += 1
+            self.chars += len(event.data)
+            return encode('delta', {"text": event.data}, stream_format)
+        if event.type == 'progress':
+            return encode('progress', {"done": event.data[0], "total": event.data[1]}, stream_format)
+        if event.type in ('blocked', 'error'):
+            self.ok = False
+            return encode(event.type, {("reason" if event.type == 'blocked' else "message"): event.data}, stream_format)
+        if event.type == 'usage':
+            return encode('usage', event.data, stream_format)
+        return None
+
+    def done(self, stream_format):
+        ttft_ms = round((self.first_delta_at - self.started_at) * 1000, 1) if self.first_delta_at else None
+        return encode('done', {"ok": self.ok, "cache": self.cache, "ttft_ms": ttft_ms,
+                               "duration_ms": round((time.perf_counter() - self.started_at) * 1000, 1),
+                               "deltas": self.deltas, "chars": self.chars}, stream_format)
+
+
+def frame(events, stream_format, started_at, cache="miss"):
+    """Serializes events as NDJSON or SSE, ending with the done event."""
+    stamps = StreamStamps(started_at, cache)
+    for event in events:
+        encoded = stamps.encode(event, stream_format)
+        if encoded:
+            yield encoded
+    yield stamps.done(stream_format)
+
+
+async def aframe(events, stream_format, started_at, cache="miss"):
+    stamps = StreamStamps(started_at, cache)
+    async for event in events:
+        encoded = stamps.encode(event, stream_format)
+        if encoded:
+            yield encoded
+    yield stamps.done(stream_format)
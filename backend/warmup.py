@@ -0,0 +1,101 @@
+"""Deferred imports and background warm-up for faster backend startup.
+
+Importing the Gemini SDK, loading the Vosk model and opening audio libraries
+takes seconds, and none of it is needed to answer /ping or run an internal
+command. Heavy modules are bound to LazyModule stand-ins that import on first
+use, and slow components are initialized on background threads after the
+server has bound its port. Requests that need a component wait for it.
+"""
+import importlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name) # Thread-safe: the import system locks per module
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}' ({'loaded' if self._module is not None else 'not loaded'})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+class Warmup:
+    """Runs named loader functions (one thread each) and tracks their state.
+
+    States: pending -> loading -> ready | unavailable. A loader signals that its
+    component is unavailable by raising; the error is logged and reported.
+    """
+
+    def __init__(self):
+        self._components = OrderedDict() # name -> {"loader", "state", "seconds", "error"}
+        self._condition = threading.Condition()
+        self._started = False
+        self.started_at = None
+
+    def register(self, name, loader):
+        self._components[name] = {"loader": loader, "state": "pending", "seconds": None, "error": None}
+
+    def _run(self, name):
+        component = self._components[name]
+        with self._condition:
+            component["state"] = "loading"
+        started_at = time.monotonic()
+        try:
+            component["loader"]()
+            state, error = "ready", None
+            logger.info(f"Warm-up: {name} ready in {time.monotonic() - started_at:.2f}s.")
+        except Exception as e:
+            state, error = "unavailable", str(e)
+            logger.error(f"Warm-up: {name} unavailable: {e}")
+            logger.debug(f"Warm-up: {name} traceback", exc_info=True)
+        with self._condition:
+            component.update(state=state, error=error, seconds=round(time.monotonic() - started_at, 3))
+            self._condition.notify_all()
+
+    def start(self, background=True):
+        """Starts loading every registered component. Safe to call more than once."""
+        with self._condition:
+            if self._started:
+                return
+            self._started = True
+            self.started_at = time.monotonic()
+        for name in self._components:
+            if background:
+                threading.Thread(target=self._run, args=(name,), name=f"warmup-{name}", daemon=True).start()
+            else:
+                self._run(name)
+
+    def wait(self, name, timeout=None):
+        """Blocks until `name` has finished loading (starting warm-up if needed). True if it is ready."""
+        self.start()
+        component = self._components[name]
+        with self._condition:
+            self._condition.wait_for(lambda: component["state"] in ("ready", "unavailable"), timeout)
+            return component["state"] == "ready"
+
+    @property
+    def settled(self):
+        """True once no component is still pending or loading."""
+        with self._condition:
+            return all(c["state"] in ("ready", "unavailable") for c in self._components.values())
+
+    def status(self):
+        with self._condition:
+            return {name: {"state": c["state"], "seconds": c["seconds"], "error": c["error"]}
+                    for name, c in self._components.items()}
@@ -35,7 +35,9 @@ const CHAT_HISTORY_KEY = 'zenithAssistantChatHistory';
 const THEME_STORAGE_KEY = 'zenith-theme';
 const AUTO_SEND_VOICE_KEY = 'zenith-autoSendVoice';
 const PING_INTERVAL = 5000; // ms
-const CONTEXT_MESSAGE_COUNT = 6; // Number of messages (3 user + 3 assistant) for context
+const CONTEXT_MESSAGE_COUNT = 20; // Messages sent for context; the backend packs them into its token budget
+const STREAM_FORMAT = 'ndjson'; // Framed Gemini streams (typed events); the backend's default is plain text lines
+const BATCH_SEPARATOR = ';'; // "open notepad; open youtube; search github flask" runs each part at once through /batch
 
 // --- State Variables ---
 let isListening = false;
@@ -49,6 +51,8 @@ let awaitingAppPathFor = null; // Holds name of app needing path input
 let backendConnected = false;
 let pingIntervalId = null;
 let autoSendVoiceInput = true; // Default value, loaded from storage
+let conversationId = newConversationId(); // Backend keeps this conversation's history, so requests send only new messages
+let serverHistoryCount = 0; // Leading chatHistory messages the backend session already holds
 
 // --- Initialization ---
 document.addEventListener('DOMContentLoaded', () => {
@@ -162,7 +166,9 @@ function loadChatHistory() { try{ const s=localStorage.getItem(CHAT_HISTORY_KEY)
 function saveChatHistory() { try{ localStorage.setItem(CHAT_HISTORY_KEY,JSON.stringify(chatHistory)); } catch(e){ console.error("Hist save err:",e); showStatus("Err saving hist", 4000); }}
 function addMessageToHistory(sender, content, type = 'text', imageUrl = null) { const message={sender,content,type}; if(type==='image'&&imageUrl) message.imageUrl=imageUrl; chatHistory.push(message); saveChatHistory(); return message; }
 function renderChatHistory() { chatContainer.innerHTML=''; chatHistory.forEach(msg=>renderMessage(msg.sender, msg.content, msg.imageUrl, msg.type==='error')); scrollToBottom(); }
-function clearChat() { chatHistory=[]; addMessageToHistory('assistant', 'Chat cleared. Ready for your next question!'); renderChatHistory(); queryInput.value=''; autoResizeTextarea.call(queryInput); showStatus("Chat cleared"); if(awaitingAppPathFor){ awaitingAppPathFor=null; setGeneratingState(false,false); } }
+function newConversationId() { return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`; }
+function buildHistoryPayload(fullWindow = false) { const delta = !fullWindow && serverHistoryCount > 0 && serverHistoryCount <= chatHistory.length; const offset = delta ? serverHistoryCount : Math.max(0, chatHistory.length - CONTEXT_MESSAGE_COUNT); return { conversation_id: conversationId, history_offset: offset, history_delta: delta, history: chatHistory.slice(offset) }; }
+function clearChat() { chatHistory=[]; conversationId=newConversationId(); serverHistoryCount=0; addMessageToHistory('assistant', 'Chat cleared. Ready for your next question!'); renderChatHistory(); queryInput.value=''; autoResizeTextarea.call(queryInput); showStatus("Chat cleared"); if(awaitingAppPathFor){ awaitingAppPathFor=null; setGeneratingState(false,false); } }
 
 // --- Message Rendering ---
 function renderMessage(sender, content, imageUrl = null, isError = false) {
@@ -210,30 +216,55 @@ async function processQueryOrCommand(inputText, isClipboard = false) {
     // Create placeholder message immediately
     currentAssistantMessageElement = renderMessage('assistant', '', null, false); currentAssistantMessageElement.classList.add('thinking');
     const contentSpan = currentAssistantMessageElement?.querySelector('span'); if(contentSpan) contentSpan.textContent='';
-    const endpoint = isClipboard ? '/process_clipboard' : '/ask_stream';
-    const payload = { history: chatHistory.slice(-CONTEXT_MESSAGE_COUNT) }; // Use constant for history length
-    if(isClipboard) { payload.text = inputText; } else { payload.query = inputText; }
+    const batchQueries = isClipboard ? [] : splitBatchQueries(inputText);
+    const endpoint = isClipboard ? '/process_clipboard' : batchQueries.length ? '/batch' : '/ask_stream';
+    let payload = buildHistoryPayload(); // Only messages the backend session hasn't seen yet
+    if(isClipboard) { payload.text = inputText; } else if(batchQueries.length) { payload.queries = batchQueries; } else { payload.query = inputText; } payload.stream_format = STREAM_FORMAT;
+    const post = () => fetch(`${PYTHON_BACKEND_URL}${endpoint}`, {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify(payload), signal:abortController.signal });
 
     try {
-        const response = await fetch(`${PYTHON_BACKEND_URL}${endpoint}`, {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify(payload), signal:abortController.signal });
+        let response = await post();
+        if (response.status === 409) { payload = { ...payload, ...buildHistoryPayload(true) }; response = await post(); } // Session expired (e.g. backend restart): resend the context window
+        if (response.ok) serverHistoryCount = payload.history_offset + payload.history.length;
         const contentType = response.headers.get("content-type");
         currentAssistantMessageElement?.classList.remove('thinking'); // Remove thinking animation
 
-        if (contentType?.includes("application/json")) { // Command handled by backend
+        if (batchQueries.length && response.ok) { await processBatchStream(response.body, contentSpan, batchQueries); // One result per query
+        } else if (contentType?.includes("application/json")) { // Command handled by backend
              const data = await response.json(); console.log("JSON Response:", data);
              if(!response.ok) throw new Error(data.error || `Req Fail: ${response.status}`);
              if(data.status === "handled" || data.status === "success") { if(contentSpan) contentSpan.innerHTML=marked.parse(data.response); addMessageToHistory('assistant', data.response); }
-             else if(data.status === "app_not_found") { awaitingAppPathFor = data.app_name; setGeneratingState(false, true); const msg=data.error_hint?`${data.error_hint}\n`:""; const pTxt=`${msg}Path for **${data.app_name}**?`; if(contentSpan) contentSpan.innerHTML=marked.parse(pTxt); addMessageToHistory('assistant', pTxt); queryInput.placeholder=`Enter full path for ${data.app_name}...`; return; }
+             else if(data.status === "app_not_found") { awaitingAppPathFor = data.app_name; setGeneratingState(false, true); const msg=data.error_hint?`${data.error_hint}\n`:""; const sug=data.suggestions?.length?`Did you mean: ${data.suggestions.map(n=>`**${n}**`).join(', ')}?\n`:""; const pTxt=`${msg}${sug}Path for **${data.app_name}**?`; if(contentSpan) contentSpan.innerHTML=marked.parse(pTxt); addMessageToHistory('assistant', pTxt); queryInput.placeholder=`Enter full path for ${data.app_name}...`; return; }
              else throw new Error(data.response || data.error || "Unknown JSON response");
+        } else if (contentType?.includes("application/x-ndjson")) { await processEventStream(response.body, contentSpan); // Framed Gemini stream
         } else if (contentType?.includes("text/plain")) { // Gemini stream response
             await processStreamResponse(response.body, contentSpan);
         } else { throw new Error(`Unexpected response type: ${contentType}`); }
     } catch (error) { handleFetchError(error, isClipboard ? "clipboard proc" : "query/command");
     } finally { if (!awaitingAppPathFor) { setGeneratingState(false, false); currentAssistantMessageElement = null; abortController = null; } }
 }
+function splitBatchQueries(inputText) { // Single-line input with several ';'-separated parts; notes may contain ';' themselves
+    if(inputText.includes('\n') || /^\s*(note|remember)\b/i.test(inputText)) return [];
+    const parts=inputText.split(BATCH_SEPARATOR).map(p=>p.trim()); return parts.length>1 && parts.every(p=>p) ? parts : [];
+}
+async function processBatchStream(responseBody, contentSpan, queries) { // /batch: NDJSON result lines in completion order, shown in query order
+    const lines=queries.map(q=>`- **${q}**: ...`); const reader=responseBody.getReader(); const decoder=new TextDecoder(); let pending="";
+    const render=()=>{ if(contentSpan){contentSpan.innerHTML=marked.parse(lines.join('\n')); scrollToBottom();} }; render();
+    const handleResult=(ev)=>{ if(ev.type==='done'){ console.log(`Batch done: ${ev.items} items, ${ev.errors} errors, ${ev.duration_ms} ms`); return; }
+        const text = ev.status==='handled' ? ev.response : ev.status==='app_not_found' ? `I don't know where **${ev.app_name}** is yet. Open it on its own to set its path.` : `Error: ${ev.error || ev.status}`;
+        lines[ev.index]=`- **${ev.query}**: ${text.includes('\n') ? '\n\n'+text.split('\n').map(l=>'    '+l).join('\n') : text}`; render(); };
+    while(true){ const{done,value}=await reader.read(); if(done)break; pending+=decoder.decode(value,{stream:true}); const parts=pending.split('\n'); pending=parts.pop(); for(const line of parts){ if(line.trim()) handleResult(JSON.parse(line)); }}
+    if(pending.trim()) handleResult(JSON.parse(pending)); if(currentAssistantMessageElement)addMessageToHistory('assistant',lines.join('\n'));
+}
+function showStreamError(eMsg) { console.error("Backend Stream Error:",eMsg); if(currentAssistantMessageElement)currentAssistantMessageElement.remove(); renderMessage('assistant',`Stream Error: ${eMsg}`,null,true); addMessageToHistory('assistant',`Stream Error: ${eMsg}`,'error'); currentAssistantMessageElement=null; throw new Error(eMsg); }
+async function processEventStream(responseBody, contentSpan) { // Framed stream (stream_format:'ndjson'): one JSON event per line
+    let accumulated="", pending=""; const reader=responseBody.getReader(); const decoder=new TextDecoder();
+    const handleEvent=(ev)=>{ if(ev.type==='delta'){ accumulated+=ev.text; if(contentSpan){contentSpan.innerHTML=marked.parse(accumulated); scrollToBottom();} } else if(ev.type==='progress'){ showStatus(`Reading long text: part ${ev.done} of ${ev.total}...`, 5000); } else if(ev.type==='blocked'){ showStreamError(`Content blocked by safety filter (${ev.reason})`); } else if(ev.type==='error'){ showStreamError(ev.message); } else if(ev.type==='done'){ console.log(`Stream done (${ev.cache}): first text ${ev.ttft_ms} ms, total ${ev.duration_ms} ms, ${ev.deltas} chunks`); } };
+    try{ while(true){ const{done,value}=await reader.read(); if(done)break; pending+=decoder.decode(value,{stream:true}); const lines=pending.split('\n'); pending=lines.pop(); for(const line of lines){ if(line.trim()) handleEvent(JSON.parse(line)); }} if(pending.trim()) handleEvent(JSON.parse(pending)); if(currentAssistantMessageElement)addMessageToHistory('assistant',accumulated);} catch(streamError){console.error("Stream Error:",streamError);throw streamError;}
+}
 async function processStreamResponse(responseBody, contentSpan) {
     let accumulated=""; const reader=responseBody.getReader(); const decoder=new TextDecoder();
-    try{ while(true){ const{done,value}=await reader.read(); if(done)break; const chunk=decoder.decode(value,{stream:true}); const lines=chunk.split('\n'); for(const line of lines){ if(line.startsWith("ERROR:")){ const eMsg=line.substring(6).trim(); console.error("Backend Stream Error:",eMsg); if(currentAssistantMessageElement)currentAssistantMessageElement.remove(); renderMessage('assistant',`Stream Error: ${eMsg}`,null,true); addMessageToHistory('assistant',`Stream Error: ${eMsg}`,'error'); currentAssistantMessageElement=null; throw new Error(eMsg); } else if(line){ accumulated+=line; if(contentSpan){contentSpan.innerHTML=marked.parse(accumulated); scrollToBottom();}}}} if(currentAssistantMessageElement)addMessageToHistory('assistant',accumulated);} catch(streamError){console.error("Stream Error:",streamError);throw streamError;}
+    try{ while(true){ const{done,value}=await reader.read(); if(done)break; const chunk=decoder.decode(value,{stream:true}); const lines=chunk.split('\n'); for(const line of lines){ if(line.startsWith("ERROR:")){ showStreamError(line.substring(6).trim()); } else if(line.startsWith("PROGRESS:")){ const [partsDone,partsTotal]=line.substring(9).trim().split('/'); showStatus(`Reading long text: part ${partsDone} of ${partsTotal}...`, 5000); } else if(line){ accumulated+=line; if(contentSpan){contentSpan.innerHTML=marked.parse(accumulated); scrollToBottom();}}}} if(currentAssistantMessageElement)addMessageToHistory('assistant',accumulated);} catch(streamError){console.error("Stream Error:",streamError);throw streamError;}
 }
 
 // --- Send App Path ---
@@ -262,9 +293,11 @@ async function sendImageAnalysisQuery(query, imageDataURL) {
     if(isGenerating||isListening||awaitingAppPathFor||!backendConnected) return;
     addMessageToHistory('user',query,'image',imageDataURL); renderMessage('user',query,imageDataURL);
     setGeneratingState(true,false); currentAssistantMessageElement=renderMessage('assistant','',null,false); currentAssistantMessageElement.classList.add('thinking'); abortController=new AbortController();
-    try { const payload = {query:query,image_data:imageDataURL /* history omitted */};
+    try { const payload = {query:query,image_data:imageDataURL,stream_format:STREAM_FORMAT /* history omitted */};
         const response=await fetch(`${PYTHON_BACKEND_URL}/analyze_image`, {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload),signal:abortController.signal});
-        currentAssistantMessageElement?.classList.remove('thinking'); const data=await response.json(); if(!response.ok) throw new Error(data.error || `Image fail`);
+        currentAssistantMessageElement?.classList.remove('thinking');
+        const imageContentType=response.headers.get("content-type"); if(response.ok && imageContentType?.includes("application/x-ndjson")){ await processEventStream(response.body, currentAssistantMessageElement?.querySelector('span')); return; } if(response.ok && imageContentType?.includes("text/plain")){ await processStreamResponse(response.body, currentAssistantMessageElement?.querySelector('span')); return; } // Streamed answer
+        const data=await response.json(); if(!response.ok) throw new Error(data.error || `Image fail`);
         const responseText = data.response || "Could not analyze image."; if(currentAssistantMessageElement) currentAssistantMessageElement.querySelector('span').innerHTML=marked.parse(responseText); else currentAssistantMessageElement = renderMessage('assistant', responseText); addMessageToHistory('assistant',responseText);
     } catch(error){ handleFetchError(error, "image analysis");
     } finally { if(!awaitingAppPathFor) { setGeneratingState(false, false); currentAssistantMessageElement=null; abortController=null; } }
@@ -277,9 +310,9 @@ function handleStopGeneration() { if(isGenerating && abortController) abortContr
 async function handleMicToggle() {
     if(isGenerating||awaitingAppPathFor||!backendConnected) return; if(isListening) return;
     isListening=true; micButton.classList.add('listening'); micButton.disabled=true; disableOtherInputs(true); showStatus("Listening...", 5000);
-    try { const response=await fetch(`${PYTHON_BACKEND_URL}/listen`,{method:'POST'});
+    try { const response=await fetch(`${PYTHON_BACKEND_URL}/listen`,{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({stream:true})});
         if(!response.ok){ const e=await response.json().catch(()=>({error:`Listen fail: ${response.status}`})); throw new Error(e.error); }
-        const data=await response.json();
+        const data=await readListenStream(response.body);
         const transcript = data.transcript?.trim();
         if(transcript){
             console.log("Transcript:", transcript);
@@ -302,6 +335,16 @@ async function handleMicToggle() {
     } catch(error){ handleFetchError(error, "speech recognition");
     } finally { isListening=false; micButton.classList.remove('listening'); micButton.disabled=false; disableOtherInputs(false); statusIndicator.classList.remove('show'); }
 }
+// Reads NDJSON events from /listen: shows partial transcripts live, resolves with the final one
+async function readListenStream(responseBody) {
+    const reader=responseBody.getReader(); const decoder=new TextDecoder(); let buffered=""; let result={transcript:""};
+    while(true){ const{done,value}=await reader.read(); if(done)break; buffered+=decoder.decode(value,{stream:true}); const lines=buffered.split('\n'); buffered=lines.pop();
+        for(const line of lines){ if(!line.trim())continue; const evt=JSON.parse(line);
+            if(evt.error) throw new Error(evt.error);
+            if(evt.partial!==undefined){ queryInput.value=evt.partial; autoResizeTextarea.call(queryInput); showStatus(`Listening... ${evt.partial}`, 5000); }
+            if(evt.transcript!==undefined) result=evt; } }
+    return result;
+}
 
 
 // --- Webcam ---